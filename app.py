@@ -2,60 +2,101 @@
 """
 Baze Internship Database System
 Main Flask Application
+
+create_app() builds a configured app with its own connection pools,
+writers, queues and caches, registered in app.extensions; wsgi.py makes
+the one gunicorn serves. Under gunicorn with preload_app (see
+gunicorn.conf.py) it runs once in the master, so workers share the loaded
+modules, blueprints and compiled templates copy-on-write. Connections,
+worker threads and executors are created lazily by the process that first
+uses them.
 """
 
 import os
-import sqlite3
-from flask import Flask, g, render_template, redirect, url_for, flash
+import sys
+import click
+from flask import Flask, current_app, g, render_template, redirect, url_for
+from flask.cli import AppGroup
 from flask_login import LoginManager, current_user
-from werkzeug.security import generate_password_hash
 from datetime import datetime
 
 # Import configuration
 from config import config
+from database.connection import ConnectionManager, db_manager, get_db
+from database.tracing import SQLTracer
+from models.user import UserCache
+from utils.audit import AuditWriter, rollover_activity_logs
+from utils.auth import LastLoginWriter, PasswordVerifier, hash_password
+from utils.directory import Directory
+from utils.fragments import FragmentCache
+from utils.email import MailQueue, mail_queue
+from utils.uploads import RenditionWorker
 
-# Create Flask app
-app = Flask(__name__)
-
-# Load configuration
-config_name = os.getenv('FLASK_ENV', 'development')
-app.config.from_object(config[config_name])
-config[config_name].init_app(app)
-
-# Initialize Flask-Login
+# Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 
-# Database connection
-def get_db():
-    """Get database connection"""
-    if 'db' not in g:
-        g.db = sqlite3.connect(
-            app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', ''),
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
-    return g.db
-
-def close_db(error=None):
-    """Close database connection"""
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+# CLI commands, added to every app create_app() builds
+cli = AppGroup('bids')
+
+def create_app(config_name=None):
+    """Build the application"""
+    config_name = config_name or os.getenv('FLASK_ENV', 'development')
+    app = Flask(__name__)
+    app.config.from_object(config[config_name])
+    config[config_name].init_app(app)
+    
+    login_manager.init_app(app)
+    
+    # Everything below is per app and found through app.extensions, so two
+    # apps in one process (tests, scripts) never share a database
+    
+    # Database connection pools (connections are opened on first use and
+    # returned on teardown)
+    ConnectionManager(app)
+    
+    # Cached user records and profiles for load_user
+    UserCache(app)
+    
+    # Audit trail writer (flushed on shutdown)
+    AuditWriter(app)
+    
+    # Login path: bounded password hashing and batched last_login writes
+    PasswordVerifier(app)
+    LastLoginWriter(app)
+    
+    # Outbound email queue (workers start on first enqueue)
+    MailQueue(app)
+    
+    # Image thumbnails for uploaded workspace photos
+    RenditionWorker(app)
+    
+    # SQL timings, slow-query log and Server-Timing for sampled requests
+    SQLTracer(app)
+    
+    # Student and supervisor typeahead (loaded on first lookup)
+    Directory(app)
+    
+    # Rendered dashboard sections keyed on data versions
+    FragmentCache(app)
+    
+    register_blueprints(app)
+    register_handlers(app)
+    for command in cli.commands.values():
+        app.cli.add_command(command)
+    return app
+
+def warm_up(app):
+    """Compile every template now, so preforked workers share them"""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
 
 # Initialize database on first run
 def init_db():
-    """Initialize the database"""
-    with app.app_context():
-        db = get_db()
-        with app.open_resource('database/schema.sql', mode='r') as f:
-            db.executescript(f.read())
-        db.commit()
-
-# Register teardown handler
-app.teardown_appcontext(close_db)
+    """Initialize the database (or bring an existing one up to date)"""
+    from database.migrations import migrate
+    return migrate(get_db())
 
 # User loader for Flask-Login
 @login_manager.user_loader
@@ -72,36 +113,43 @@ def register_blueprints(app):
     from routes.hod import hod_bp
     from routes.supervisor import supervisor_bp
     from routes.admin import admin_bp
+    from routes.files import files_bp
     
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(student_bp, url_prefix='/student')
     app.register_blueprint(hod_bp, url_prefix='/hod')
     app.register_blueprint(supervisor_bp, url_prefix='/supervisor')
     app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(files_bp, url_prefix='/files')
+
+def register_handlers(app):
+    """Register error handlers, context processors and top-level pages"""
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, internal_error)
+    app.context_processor(inject_globals)
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/about', 'about', about)
 
-# Register error handlers
-@app.errorhandler(404)
+# Error handlers
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def internal_error(error):
-    db = get_db()
-    db.rollback()
+    db = g.get('db')
+    if db is not None:
+        db.rollback()
     return render_template('errors/500.html'), 500
 
 # Context processors
-@app.context_processor
 def inject_globals():
     """Inject global variables into templates"""
     return {
-        'university_name': app.config['UNIVERSITY_NAME'],
-        'academic_year': app.config['ACADEMIC_YEAR'],
+        'university_name': current_app.config['UNIVERSITY_NAME'],
+        'academic_year': current_app.config['ACADEMIC_YEAR'],
         'current_year': datetime.now().year
     }
 
 # Routes
-@app.route('/')
 def index():
     """Home page"""
     if current_user.is_authenticated:
@@ -116,19 +164,18 @@ def index():
             return redirect(url_for('admin.dashboard'))
     return render_template('index.html')
 
-@app.route('/about')
 def about():
     """About page"""
     return render_template('about.html')
 
 # CLI commands
-@app.cli.command()
+@cli.command()
 def initdb():
     """Initialize the database."""
     init_db()
     print('Initialized the database.')
 
-@app.cli.command()
+@cli.command()
 def create_admin():
     """Create an admin user."""
     from models.user import User
@@ -147,15 +194,255 @@ def create_admin():
     cursor = db.cursor()
     cursor.execute(
         'INSERT INTO users (email, password_hash, full_name, user_type) VALUES (?, ?, ?, ?)',
-        (email, generate_password_hash(password), full_name, 'admin')
+        (email, hash_password(password), full_name, 'admin')
     )
     db.commit()
     print(f'Admin user {email} created successfully!')
 
+@cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', type=int, default=500, help='Rows per transaction.')
+@click.option('--workers', type=int, default=None, help='Password hashing processes.')
+def import_users(path, chunk_size, workers):
+    """Bulk import students/supervisors from a CSV or JSONL file."""
+    from database.importer import import_users as run_import
+    
+    def progress(report):
+        print(f'  {report.rows} rows read, {report.users} created '
+              f'({report.throughput:.0f} rows/s)')
+    
+    report = run_import(db_manager, path, chunk_size=chunk_size,
+                        workers=workers, progress=progress)
+    for line_no, message in sorted(report.errors):
+        print(f'  line {line_no}: {message}')
+    print(report.summary())
+
+@cli.command()
+@click.option('--days', type=int, default=None,
+              help='Archive rows older than this many days.')
+def rollover_audit(days):
+    """Move old activity logs into monthly archive tables."""
+    if days is None:
+        days = current_app.config['AUDIT_RETENTION_DAYS']
+    moved = rollover_activity_logs(db_manager, days)
+    for table, count in moved.items():
+        print(f'{table}: {count} rows archived')
+    print(f'Archived {sum(moved.values())} activity log rows older than {days} days.')
+
+@cli.command()
+def rebuild_attendance_summary():
+    """Recompute the attendance summary table from attendance."""
+    from models.attendance import Attendance
+    
+    with db_manager.transaction() as conn:
+        count = Attendance.rebuild_summary(conn)
+    print(f'Rebuilt attendance summary ({count} student placements).')
+
+@cli.command()
+@click.option('--through', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Last day to fill (default yesterday).')
+@click.option('--days', type=int, default=7,
+              help='Only look back this many days; 0 covers whole placements.')
+@click.option('--department', default=None, help='Only fill one department.')
+def autofill_attendance(through, days, department):
+    """Mark unmarked weekdays of active and completed placements absent."""
+    from datetime import date, timedelta
+    from models.attendance import Attendance
+    
+    through = through.date() if through else date.today() - timedelta(days=1)
+    since = through - timedelta(days=days - 1) if days > 0 else None
+    with db_manager.transaction() as conn:
+        count = Attendance.autofill_absent(conn, through, since, department)
+    window = f'{since} to {through}' if since else f'placement start to {through}'
+    print(f'Marked {count} missing weekdays absent ({window}).')
+
+@cli.command()
+@click.option('--date', 'today', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Run as if on this day (default today); the week before it is checked.')
+@click.option('--check', 'checks', multiple=True,
+              type=click.Choice(['missing_log', 'attendance_gap', 'unreviewed_log']),
+              help='Only run these checks (repeatable).')
+@click.option('--force', is_flag=True, help='Run again for a week already checked.')
+def check_compliance(today, checks, force):
+    """Remind students and supervisors who are behind, and escalate to HODs."""
+    from models.compliance import CHECKS, Compliance
+    
+    results = Compliance.run(today.date() if today else None, checks or CHECKS, force)
+    for run in results:
+        if run.skipped:
+            print(f'{run.check_name}: already run for {run.period}, skipped.')
+            continue
+        print(f'{run.check_name} ({run.period}): {run.placements} placements behind, '
+              f'{run.reminders} reminders, {run.escalations} escalations, '
+              f'{run.emails} emails queued in {run.seconds * 1000:.0f} ms.')
+
+@cli.command()
+@click.option('--days', type=int, default=None,
+              help='Delete read notifications older than this many days.')
+def compact_notifications(days):
+    """Remove old read notifications and recount unread ones."""
+    from models.notification import Notification
+    
+    if days is None:
+        days = current_app.config['NOTIFICATION_RETENTION_DAYS']
+    with db_manager.transaction() as conn:
+        deleted = Notification.compact(conn, days)
+        Notification.rebuild_counters(conn)
+    print(f'Deleted {deleted} read notifications older than {days} days.')
+
+@cli.command()
+def send_mail():
+    """Send every queued email that is due, then exit."""
+    sent = mail_queue.drain()
+    print(f'Processed {sent} queued emails.')
+    print(mail_queue.stats())
+
+@cli.command()
+@click.argument('department')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None,
+              help='ZIP file to write (default: <department>-summaries.zip).')
+@click.option('--status', default=None, help='Only placements with this status.')
+@click.option('--workers', type=int, default=None, help='PDF rendering processes.')
+def export_summaries(department, output, status, workers):
+    """Write a ZIP of internship summary PDFs for a department."""
+    from database.connection import get_read_db
+    from utils.pdf_generator import department_pdfs, stream_zip
+    
+    output = output or f"{department.replace(' ', '_')}-summaries.zip"
+    written = []
+    
+    def entries():
+        for entry in department_pdfs(get_read_db(), department,
+                                     current_app.config['PDF_CACHE_DIR'], status=status):
+            written.append(entry[0])
+            yield entry
+    
+    with open(output, 'wb') as f:
+        for chunk in stream_zip(entries(), workers or current_app.config['PDF_RENDER_WORKERS']):
+            f.write(chunk)
+    print(f'Wrote {len(written)} summaries to {output}.')
+
+@cli.command()
+@click.option('--delete', is_flag=True, help='Remove orphaned files.')
+@click.option('--min-age', type=int, default=None,
+              help='Ignore files newer than this many seconds.')
+def reconcile_uploads(delete, min_age):
+    """Find stored upload files that no file_uploads row refers to."""
+    from database.archive import history
+    from utils.uploads import reconcile
+    
+    if min_age is None:
+        min_age = current_app.config['UPLOAD_ORPHAN_MIN_AGE']
+    # Files of archived placements are still referenced
+    with history(db_manager, current_app.config['ARCHIVE_DIR']) as conn:
+        orphans, missing = reconcile(conn, current_app.config, min_age, table='all_file_uploads')
+    size = 0
+    for path in orphans:
+        size += os.path.getsize(path)
+        print(f'orphan: {path}')
+        if delete:
+            os.unlink(path)
+    for path in missing:
+        print(f'missing: {path}')
+    action = 'Deleted' if delete else 'Found'
+    print(f'{action} {len(orphans)} orphaned files ({size / 1024 / 1024:.1f} MB), '
+          f'{len(missing)} recorded files missing.')
+
+@cli.command()
+@click.argument('year')
+@click.option('--compact', is_flag=True, help='VACUUM the archive and the live database.')
+@click.option('--read-only', is_flag=True, help='Make the archive file read-only.')
+def archive_year(year, compact, read_only):
+    """Move a past academic year's finished placements to its archive file."""
+    from database.archive import archive_path, archive_year as run_archive
+    
+    try:
+        moved = run_archive(db_manager, year, current_app.config['ARCHIVE_DIR'],
+                            current_app.config['ACADEMIC_YEAR'], compact=compact, read_only=read_only)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for table, count in moved.items():
+        print(f'{table}: {count} rows archived')
+    path = archive_path(current_app.config['ARCHIVE_DIR'], year)
+    print(f'Archived {year} to {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB).')
+
+@cli.command()
+@click.option('--optimize-only', is_flag=True,
+              help='Only merge index segments, do not rebuild.')
+def rebuild_search_index(optimize_only):
+    """Rebuild and optimize the weekly log full-text index."""
+    from models.weekly_log import WeeklyLog
+    
+    with db_manager.transaction() as conn:
+        if not optimize_only:
+            WeeklyLog.rebuild_search_index(conn)
+        WeeklyLog.optimize_search_index(conn)
+        count = conn.execute('SELECT COUNT(*) FROM weekly_logs').fetchone()[0]
+    print(f"{'Optimized' if optimize_only else 'Rebuilt'} search index ({count} weekly logs).")
+
+@cli.command()
+@click.argument('department')
+@click.option('--dataset', type=click.Choice(['weekly_logs', 'attendance', 'evaluations']),
+              default='weekly_logs', show_default=True)
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'xlsx']), default='csv',
+              show_default=True)
+@click.option('--level', default=None, help='Only students at this level.')
+@click.option('--status', default=None, help='Only rows with this status.')
+@click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), default=None)
+@click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), default=None)
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None)
+def export_logs(department, dataset, fmt, level, status, date_from, date_to, output):
+    """Export a department's weekly logs, attendance or evaluations."""
+    from utils.export import Export
+    
+    def progress(job, done):
+        print(f'  {job.rows}/{job.total} rows', file=sys.stderr)
+    
+    try:
+        job = Export(db_manager, dataset, department, progress=progress,
+                     level=level, status=status,
+                     date_from=date_from.date() if date_from else None,
+                     date_to=date_to.date() if date_to else None)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    job.count()
+    output = output or job.filename(fmt)
+    with open(output, 'wb') as f:
+        for chunk in job.stream(fmt):
+            f.write(chunk)
+    print(f'Wrote {job.rows} rows to {output}.')
+
+@cli.command()
+def migrate():
+    """Apply pending schema migrations."""
+    from database.migrations import LATEST
+    
+    applied = init_db()
+    for version, description in applied:
+        print(f'Applied migration {version}: {description}')
+    print(f'Database is at schema version {LATEST}.')
+
+@cli.command()
+def check_queries():
+    """Show query plans for hot queries and flag full table scans."""
+    from database.connection import get_read_db
+    from database.query_plans import check_query_plans
+    
+    flagged = 0
+    for name, plan, scans in check_query_plans(get_read_db()):
+        print(f"{'SCAN' if scans else 'ok'}\t{name}")
+        for line in plan:
+            marker = '  !! ' if line in scans else '     '
+            print(f'{marker}{line}')
+        flagged += bool(scans)
+    if flagged:
+        print(f'{flagged} queries read a whole table or index.')
+        sys.exit(1)
+    print('No full scans.')
+
 # Run the application
 if __name__ == '__main__':
-    # Register blueprints
-    register_blueprints(app)
+    app = create_app()
     
     # Check if database exists, if not initialize it
     db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
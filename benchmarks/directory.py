@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Directory typeahead benchmark
+
+Times utils.directory lookups against the LIKE query a typeahead would
+otherwise run per keystroke, on a database made by benchmarks/generate.py
+(--scale 1 has about 50k users):
+    
+    python benchmarks/generate.py /tmp/bench.db --scale 1
+    python benchmarks/directory.py /tmp/bench.db
+
+Both sides return the first --limit matches in name order. The LIKE
+patterns have a leading wildcard, so every query scans users and students.
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+def rss_mib():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def fixtures(conn):
+    """Queries a user might type: (label, query, filters)"""
+    name, email, student_id, matric, department, level = conn.execute(
+        '''SELECT u.full_name, u.email, s.student_id, s.matriculation_number,
+                  s.department, s.level
+           FROM users u JOIN students s ON s.user_id = u.id
+           WHERE u.is_active = 1 ORDER BY u.id LIMIT 1 OFFSET 100''').fetchone()
+    organization, = conn.execute(
+        'SELECT organization_name FROM organization_supervisors LIMIT 1').fetchone()
+    first, last = name.split()[0], name.split()[-1]
+    return [
+        ('two letters', first[:2].lower(), {}),
+        ('surname', last, {}),
+        ('first and last name', f'{first} {last[:3]}', {}),
+        ('last, first', f'{last} {first}', {}),
+        ('organization word', organization.split()[0], {}),
+        ('student id prefix', student_id[:-2], {}),
+        ('matriculation number', matric, {}),
+        ('email local part', email.partition('@')[0], {}),
+        ('in department and level', first[:3], {'department': department, 'level': level}),
+        ('no match', 'qqqz', {})
+    ]
+
+def like_sql(query, filters, limit):
+    """The SQL equivalent: every word must appear in a name, email or number"""
+    from utils.directory import ENTRY_QUERY, normalize
+    sql = [ENTRY_QUERY]
+    params = []
+    for term in normalize(query).split():
+        sql.append('''AND (u.full_name LIKE ? OR u.email LIKE ? OR s.student_id LIKE ?
+                          OR s.matriculation_number LIKE ? OR os.organization_name LIKE ?)''')
+        params += [f'%{term}%'] * 5
+    for column in ('department', 'level'):
+        if filters.get(column) is not None:
+            sql.append(f"AND (u.user_type != 'student' OR s.{column} = ?)")
+            params.append(filters[column])
+    sql.append('ORDER BY u.full_name COLLATE NOCASE, u.id LIMIT ?')
+    return '\n'.join(sql), params + [limit]
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('database', help='Database made by benchmarks/generate.py.')
+    parser.add_argument('--repeat', type=int, default=200, help='Runs per query (median is shown).')
+    parser.add_argument('--like-repeat', type=int, default=5, help='Runs per LIKE query.')
+    parser.add_argument('--limit', type=int, default=10, help='Results per query.')
+    args = parser.parse_args()
+    
+    # The app reads its database from the environment at import time
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.database)
+    from app import create_app, init_db
+    from database.connection import get_read_db
+    from utils.directory import directory
+    
+    app = create_app()
+    with app.app_context():
+        init_db()
+    conn = sqlite3.connect(args.database)
+    try:
+        queries = fixtures(conn)
+    finally:
+        conn.close()
+    
+    with app.app_context():
+        before = rss_mib()
+        start = time.perf_counter()
+        directory.search('warm up')
+        stats = directory.stats()
+        print(f"Loaded {stats['entries']} entries in {time.perf_counter() - start:.2f}s, "
+              f'about {rss_mib() - before:.0f} MiB')
+        
+        db = get_read_db()
+        print(f"{'query':<26}{'text':<22}{'hits':>5}{'LIKE ms':>10}{'index ms':>10}{'speedup':>10}")
+        for label, query, filters in queries:
+            sql, params = like_sql(query, filters, args.limit)
+            like_ms, _ = timed(lambda: db.execute(sql, params).fetchall(), args.like_repeat)
+            index_ms, results = timed(
+                lambda: directory.search(query, limit=args.limit, **filters), args.repeat)
+            print(f'{label:<26}{query[:21]:<22}{len(results):>5}{like_ms:>10.2f}'
+                  f'{index_ms:>10.3f}{like_ms / index_ms:>9.0f}x')
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
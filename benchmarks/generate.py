@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator
+
+Fills a fresh database with production-like volumes. At --scale 1 that is
+about 50k users, 20k placements, 1.4M attendance rows, 200k weekly logs,
+300k notifications and 500k activity log rows. The same seed always
+produces the same data. Indexes and triggers are dropped while loading.
+The migrations then recreate them, backfill the summary tables and the
+search index, and run ANALYZE.
+    
+    python benchmarks/generate.py /tmp/bench.db --scale 1
+
+Every user's password is PASSWORD below.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.search import sentence, vocabulary
+from config import Config
+from database.migrations import SCHEMA_PATH, migrate
+from utils.auth import hash_password
+
+PASSWORD = 'benchmark123'
+BATCH = 20000
+
+DEPARTMENTS = [
+    'Computer Science', 'Software Engineering', 'Cyber Security', 'Information Systems',
+    'Accounting', 'Banking and Finance', 'Business Administration', 'Economics',
+    'Marketing', 'Mass Communication', 'Political Science', 'International Relations',
+    'Law', 'Architecture', 'Civil Engineering', 'Electrical Engineering',
+    'Mechanical Engineering', 'Biochemistry', 'Microbiology', 'Public Health'
+]
+FIRST_NAMES = ['Amina', 'Chinedu', 'Fatima', 'Tunde', 'Ngozi', 'Ibrahim', 'Zainab', 'Emeka',
+               'Aisha', 'Segun', 'Halima', 'Obinna', 'Maryam', 'Kunle', 'Chiamaka', 'Musa',
+               'Blessing', 'Yusuf', 'Funmi', 'David', 'Grace', 'Sani', 'Ada', 'Femi']
+LAST_NAMES = ['Okafor', 'Bello', 'Adeyemi', 'Musa', 'Eze', 'Abubakar', 'Okonkwo', 'Balogun',
+              'Lawal', 'Nwosu', 'Danjuma', 'Adebayo', 'Umar', 'Obi', 'Ogunleye', 'Garba',
+              'Ibekwe', 'Sule', 'Akande', 'Chukwu']
+ORG_WORDS = ['Global', 'Sterling', 'Zenith', 'Capital', 'Northern', 'Atlantic', 'Unity',
+             'Prime', 'Summit', 'Crescent', 'Delta', 'Savannah', 'Heritage', 'Pinnacle']
+ORG_KINDS = ['Bank', 'Technologies', 'Consulting', 'Ltd', 'Hospital', 'Chambers',
+             'Engineering', 'Media', 'Labs', 'Logistics', 'Energy', 'Ministry']
+CITIES = ['Abuja', 'Lagos', 'Kano', 'Port Harcourt', 'Ibadan', 'Kaduna', 'Enugu']
+ACTIONS = ['login', 'logout', 'view_dashboard', 'submit_log', 'mark_attendance',
+           'upload_file', 'review_log', 'export']
+ATTENDANCE = (['present', 'late', 'absent', 'excused'], [82, 8, 7, 3])
+
+def counts(scale):
+    """Row targets for a scale factor"""
+    users = int(50000 * scale)
+    return {
+        'users': users,
+        'supervisors': max(1, int(users * 0.06)),
+        'placements': int(20000 * scale),
+        'notifications': int(300000 * scale),
+        'activity_logs': int(500000 * scale)
+    }
+
+def insert(conn, sql, rows):
+    """executemany in batches from any iterable, returns the row count"""
+    total = 0
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, BATCH))
+        if not batch:
+            return total
+        conn.executemany(sql, batch)
+        total += len(batch)
+
+def weekdays(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+def generate(path, scale=1.0, seed=2024, today=date(2025, 3, 14)):
+    rng = random.Random(seed)
+    n = counts(scale)
+    words, weights = vocabulary(rng)
+    password_hash = hash_password(PASSWORD, Config.PASSWORD_HASH_METHOD)
+    timings = {}
+    
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    conn.execute('PRAGMA synchronous = OFF')
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    # Bulk load without indexes and triggers; migrate() puts them back
+    for kind in ('trigger', 'index'):
+        names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = ? AND name NOT LIKE 'sqlite_%'",
+            (kind,))]
+        for name in names:
+            conn.execute(f'DROP {kind.upper()} {name}')
+    conn.execute('PRAGMA user_version = 0')
+    
+    def step(name, fn, unit='rows'):
+        start = time.perf_counter()
+        rows = fn()
+        timings[name] = (rows, time.perf_counter() - start)
+        print(f'  {name:<26}{rows:>9} {unit:<10}{timings[name][1]:6.1f}s')
+    
+    print(f'Generating {path} (scale {scale}, seed {seed})')
+    
+    # Users: admins, one HOD per department, supervisors, then students
+    hods = len(DEPARTMENTS)
+    first_supervisor = 3 + hods
+    first_student = first_supervisor + n['supervisors']
+    user_count = max(n['users'], first_student + n['placements'])
+    
+    def users():
+        created = datetime(2024, 8, 1)
+        for uid in range(1, user_count + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            if uid <= 2:
+                kind, email = 'admin', f'admin{uid}@baze.edu.ng'
+            elif uid < first_supervisor:
+                kind, email = 'hod', f'hod{uid}@baze.edu.ng'
+            elif uid < first_student:
+                kind, email = 'supervisor', f'{first}.{last}{uid}@example.com'.lower()
+            else:
+                kind, email = 'student', f'{first}.{last}{uid}@baze.edu.ng'.lower()
+            yield (uid, email, password_hash, f'{first} {last}',
+                   f'080{rng.randrange(10 ** 8):08d}', kind,
+                   str(created + timedelta(minutes=uid)))
+    step('users', lambda: insert(conn, '''INSERT INTO users
+        (id, email, password_hash, full_name, phone, user_type, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)''', users()))
+    
+    step('hods', lambda: insert(conn, '''INSERT INTO hods
+        (id, user_id, staff_id, department, designation) VALUES (?, ?, ?, ?, ?)''',
+        ((i + 1, 3 + i, f'HOD{i + 1:03d}', department, 'Head of Department')
+         for i, department in enumerate(DEPARTMENTS))))
+    
+    organizations = [(f'{rng.choice(ORG_WORDS)} {rng.choice(ORG_KINDS)}', rng.choice(CITIES))
+                     for _ in range(max(10, n['supervisors'] // 6))]
+    supervisor_orgs = {}
+    
+    def supervisors():
+        for uid in range(first_supervisor, first_student):
+            org = rng.choice(organizations)
+            supervisor_orgs[uid] = org
+            yield (uid, org[0], f'{org[1]}, Nigeria', 'Manager', 'Operations')
+    step('organization_supervisors', lambda: insert(conn, '''INSERT INTO organization_supervisors
+        (user_id, organization_name, organization_address, position, department)
+        VALUES (?, ?, ?, ?, ?)''', supervisors()))
+    
+    student_department = {}
+    
+    def students():
+        for sid, uid in enumerate(range(first_student, user_count + 1), start=1):
+            department = rng.choice(DEPARTMENTS)
+            student_department[sid] = department
+            yield (sid, uid, f'BU/{24 - sid % 3}/{sid:06d}', department,
+                   rng.choice(['200', '300', '400']), f'MAT/{sid:06d}')
+    step('students', lambda: insert(conn, '''INSERT INTO students
+        (id, user_id, student_id, department, level, matriculation_number)
+        VALUES (?, ?, ?, ?, ?, ?)''', students()))
+    
+    # Placements for a random subset of students
+    emails = dict(conn.execute(
+        "SELECT id, email FROM users WHERE user_type = 'supervisor'").fetchall())
+    placed = rng.sample(sorted(student_department), min(n['placements'], len(student_department)))
+    placements = []
+    session_start = date(2024, 9, 2)
+    for pid, sid in enumerate(placed, start=1):
+        supervisor = rng.randrange(first_supervisor, first_student)
+        start = session_start + timedelta(weeks=rng.randrange(0, 20))
+        end = start + timedelta(weeks=rng.randrange(12, 17)) - timedelta(days=3)
+        status = 'completed' if end < today else 'active'
+        if rng.random() < 0.02:
+            status = 'terminated'
+            end = min(end, today - timedelta(days=rng.randrange(1, 30)))
+        placements.append((pid, sid, supervisor, start, end, status))
+    
+    def placement_rows():
+        for pid, sid, supervisor, start, end, status in placements:
+            org, city = supervisor_orgs[supervisor]
+            yield (pid, sid, org, f'{city}, Nigeria', 'Operations', emails[supervisor].split('@')[0],
+                   emails[supervisor], start.isoformat(), end.isoformat(), status,
+                   DEPARTMENTS.index(student_department[sid]) + 1)
+    step('internship_placements', lambda: insert(conn, '''INSERT INTO internship_placements
+        (id, student_id, organization_name, organization_address, department,
+         supervisor_name, supervisor_email, start_date, end_date, status, assigned_hod_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', placement_rows()))
+    
+    def attendance():
+        for pid, sid, _, start, end, _ in placements:
+            for day in weekdays(start, min(end, today)):
+                status = rng.choices(*ATTENDANCE)[0]
+                check_in = f'08:{rng.randrange(60):02d}' if status == 'present' else (
+                    f'09:{rng.randrange(60):02d}' if status == 'late' else None)
+                yield (sid, pid, day.isoformat(), status, check_in, '17:00' if check_in else None)
+    step('attendance', lambda: insert(conn, '''INSERT INTO attendance
+        (student_id, placement_id, date, status, check_in_time, check_out_time)
+        VALUES (?, ?, ?, ?, ?, ?)''', attendance()))
+    
+    def weekly_logs():
+        for pid, sid, _, start, end, _ in placements:
+            weeks = min((min(end, today) - start).days // 7 + 1, 12)
+            for week in range(1, weeks + 1):
+                week_start = start + timedelta(weeks=week - 1)
+                age = weeks - week
+                status = 'reviewed' if age > 1 else ('submitted' if age == 1 else
+                                                     rng.choice(['draft', 'submitted']))
+                yield (sid, pid, week, week_start.isoformat(),
+                       (week_start + timedelta(days=4)).isoformat(),
+                       ' '.join(sentence(rng, words, weights) for _ in range(rng.randint(2, 5))),
+                       sentence(rng, words, weights, 4), sentence(rng, words, weights, 6),
+                       sentence(rng, words, weights, 5) if status == 'reviewed' else None,
+                       None, status,
+                       f'{week_start + timedelta(days=4)} 17:00:00'
+                       if status != 'draft' else None)
+    step('weekly_logs', lambda: insert(conn, '''INSERT INTO weekly_logs
+        (student_id, placement_id, week_number, week_start_date, week_end_date, activities,
+         skills_learned, challenges, supervisor_comment, hod_comment, status, submitted_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', weekly_logs()))
+    
+    def evaluations():
+        for pid, sid, supervisor, _, end, status in placements:
+            if status == 'active':
+                continue
+            for evaluator, kind, chance in ((supervisor, 'supervisor', 0.9),
+                                            (DEPARTMENTS.index(student_department[sid]) + 3,
+                                             'hod', 0.6)):
+                if rng.random() < chance:
+                    scores = [min(5, max(1, round(rng.gauss(3.8, 0.8)))) for _ in range(6)]
+                    yield (sid, pid, evaluator, kind, *scores, sentence(rng, words, weights, 8),
+                           rng.choice(['Recommended', 'Highly recommended', None]),
+                           f'{end + timedelta(days=3)} 12:00:00')
+    step('evaluations', lambda: insert(conn, '''INSERT INTO evaluations
+        (student_id, placement_id, evaluator_id, evaluator_type, punctuality, communication,
+         professionalism, technical_skills, initiative, overall_rating, comments,
+         recommendation, evaluated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', evaluations()))
+    
+    def uploads():
+        for pid, sid, *_ in placements:
+            for kind, ext in (('workflow_chart', 'png'), ('workspace_photo', 'jpg')):
+                digest = f'{rng.getrandbits(256):064x}'
+                yield (sid, pid, kind, f'{kind}.{ext}',
+                       f'{kind}s/{digest[:2]}/{digest[2:4]}/{digest}.{ext}')
+    step('file_uploads', lambda: insert(conn, '''INSERT INTO file_uploads
+        (student_id, placement_id, file_type, file_name, file_path) VALUES (?, ?, ?, ?, ?)''',
+        uploads()))
+    
+    epoch = datetime.combine(session_start, datetime.min.time())
+    span = int((datetime.combine(today, datetime.min.time()) - epoch).total_seconds())
+    
+    def notifications():
+        for _ in range(n['notifications']):
+            created = epoch + timedelta(seconds=rng.randrange(span))
+            is_read = rng.random() < 0.75
+            yield (rng.randrange(1, user_count + 1), 'Weekly log reminder',
+                   sentence(rng, words, weights, 8),
+                   rng.choice(['reminder', 'alert', 'info', 'warning']), is_read, str(created),
+                   str(created + timedelta(hours=rng.randrange(1, 72))) if is_read else None)
+    step('notifications', lambda: insert(conn, '''INSERT INTO notifications
+        (user_id, title, message, type, is_read, created_at, read_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)''', notifications()))
+    
+    def activity_logs():
+        for _ in range(n['activity_logs']):
+            yield (rng.randrange(1, user_count + 1), rng.choice(ACTIONS), None, None,
+                   f'10.0.{rng.randrange(256)}.{rng.randrange(256)}', 'Mozilla/5.0',
+                   str(epoch + timedelta(seconds=rng.randrange(span))))
+    step('activity_logs', lambda: insert(conn, '''INSERT INTO activity_logs
+        (user_id, action, entity_type, entity_id, ip_address, user_agent, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)''', activity_logs()))
+    conn.commit()
+    
+    step('indexes and summaries', lambda: len(migrate(conn)), 'migrations')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a benchmark database.')
+    parser.add_argument('path', help='Database file to create (must not exist).')
+    parser.add_argument('--scale', type=float, default=1.0, help='1.0 is about 50k users.')
+    parser.add_argument('--seed', type=int, default=2024)
+    args = parser.parse_args()
+    
+    if os.path.exists(args.path):
+        parser.error(f'{args.path} already exists')
+    start = time.perf_counter()
+    generate(args.path, args.scale, args.seed)
+    size = os.path.getsize(args.path) / 1024 / 1024
+    print(f'Done in {time.perf_counter() - start:.0f}s, {size:.0f} MB.')
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Hot-query benchmark suite
+
+Times the model calls behind logins, dashboards and lists against a
+database made by benchmarks/generate.py, inside the real Flask app and its
+connection pools. Results are written as JSON so two commits can be
+compared:
+    
+    python benchmarks/generate.py /tmp/bench.db
+    python benchmarks/run.py /tmp/bench.db -o before.json
+    python benchmarks/run.py /tmp/bench.db -o after.json --compare before.json
+
+--compare exits with status 1 when a case's median is more than
+--threshold slower than in the baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+class Case:
+    """A named benchmark; setup() runs untimed before every call"""
+    
+    def __init__(self, name, fn, setup=None, rounds=None):
+        self.name = name
+        self.fn = fn
+        self.setup = setup
+        self.rounds = rounds
+
+def fixtures(conn):
+    """Pick the users and departments the cases run against"""
+    department, = conn.execute('''SELECT department FROM students GROUP BY department
+                                  ORDER BY COUNT(*) DESC LIMIT 1''').fetchone()
+    user_id, = conn.execute('''SELECT user_id FROM notification_counters
+                               ORDER BY unread DESC LIMIT 1''').fetchone()
+    email, = conn.execute("SELECT email FROM users WHERE user_type = 'student' LIMIT 1").fetchone()
+    student_id, = conn.execute('SELECT student_id FROM internship_placements LIMIT 1').fetchone()
+    activities, = conn.execute('SELECT activities FROM weekly_logs LIMIT 1').fetchone()
+    return {
+        'department': department,
+        'user_id': user_id,
+        'email': email,
+        'student_id': student_id,
+        'term': activities.split()[0]
+    }
+
+def cases(f):
+    from benchmarks.generate import PASSWORD
+    from database.connection import get_read_db
+    from models import analytics as analytics_module
+    from models.analytics import EvaluationAnalytics
+    from models.reporting import DepartmentReport
+    from models.student import Student
+    from models.user import User, user_cache
+    from models.weekly_log import WeeklyLog
+    from routes.hod import intern_table
+    from utils.fragments import fragment_cache
+    
+    def next_cursor():
+        return User.get(f['user_id']).get_notifications().next_cursor
+    
+    def view(sql, *params):
+        return lambda: get_read_db().execute(sql, params).fetchall()
+    
+    return [
+        Case('User.get (cold)', lambda: User.get(f['user_id']),
+             setup=lambda: user_cache.users.clear()),
+        Case('User.get (warm)', lambda: User.get(f['user_id'])),
+        Case('User.authenticate', lambda: User.authenticate(f['email'], PASSWORD), rounds=10),
+        Case('get_notifications (first page)',
+             lambda: User.get(f['user_id']).get_notifications()),
+        Case('get_notifications (next page)',
+             lambda: User.get(f['user_id']).get_notifications(cursor=f['cursor']),
+             setup=lambda: f.setdefault('cursor', next_cursor())),
+        Case('get_notifications (unread)',
+             lambda: User.get(f['user_id']).get_notifications(unread_only=True)),
+        Case('view active_internships (department)',
+             view('SELECT * FROM active_internships WHERE student_department = ?',
+                  f['department'])),
+        Case('view student_attendance_summary (student)',
+             view('SELECT * FROM student_attendance_summary WHERE student_id = ?',
+                  f['student_id'])),
+        Case('DepartmentReport.build', lambda: DepartmentReport.build(get_read_db(),
+                                                                      f['department'])),
+        Case('DepartmentReport.page', lambda: DepartmentReport.page(f['department'])),
+        Case('EvaluationAnalytics.report (cold)',
+             lambda: EvaluationAnalytics.report(department=f['department']),
+             setup=analytics_module._tables.clear, rounds=10),
+        Case('EvaluationAnalytics.report (warm)',
+             lambda: EvaluationAnalytics.report(department=f['department'])),
+        Case('fragment hod/_intern_table (cold)', lambda: intern_table(f['department']),
+             setup=lambda: fragment_cache.clear(), rounds=10),
+        Case('fragment hod/_intern_table (warm)', lambda: intern_table(f['department'])),
+        Case('Student.list_by_department',
+             lambda: Student.list_by_department(f['department'])),
+        Case('WeeklyLog.search', lambda: WeeklyLog.search(f['term'], f['department']))
+    ]
+
+def measure(app, case, rounds, min_time):
+    """Time one case; every call runs in its own app context like a request"""
+    times = []
+    deadline = time.perf_counter() + min_time
+    for i in range(rounds + 1):
+        with app.app_context():
+            if case.setup is not None:
+                case.setup()
+            start = time.perf_counter()
+            case.fn()
+            elapsed = time.perf_counter() - start
+        if i:  # The first call only warms up
+            times.append(elapsed)
+        if len(times) >= 3 and time.perf_counter() > deadline:
+            break
+    
+    times.sort()
+    mean = statistics.fmean(times)
+    return {
+        'rounds': len(times),
+        'min': times[0],
+        'median': statistics.median(times),
+        'mean': mean,
+        'p95': times[min(len(times) - 1, int(len(times) * 0.95))],
+        'ops': 1 / mean if mean else None
+    }
+
+def meta(path):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    conn = sqlite3.connect(path)
+    try:
+        rows = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('users', 'internship_placements', 'attendance',
+                              'weekly_logs', 'notifications', 'activity_logs')}
+    finally:
+        conn.close()
+    return {
+        'commit': commit,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'database': os.path.abspath(path),
+        'rows': rows
+    }
+
+def compare(results, baseline, threshold):
+    """Print median changes against a baseline, returns the regressed cases"""
+    regressions = []
+    print(f"\n{'case':<44}{'before':>10}{'after':>10}{'change':>9}")
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'{name:<44}{"-":>10}{result["median"] * 1000:>8.2f}ms{"new":>9}')
+            continue
+        change = result['median'] / before['median'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:<44}{before["median"] * 1000:>8.2f}ms{result["median"] * 1000:>8.2f}ms'
+              f'{change:>+8.0%}{flag}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot queries.')
+    parser.add_argument('database', help='Database made by benchmarks/generate.py.')
+    parser.add_argument('-o', '--output', help='Write results as JSON to this file.')
+    parser.add_argument('--rounds', type=int, default=200, help='Maximum calls per case.')
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help='Stop a case after this many seconds (at least 3 calls).')
+    parser.add_argument('-k', dest='only', help='Only run cases whose name contains this.')
+    parser.add_argument('--compare', metavar='JSON', help='Baseline results to compare with.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed median slowdown before failing (0.25 = 25%%).')
+    args = parser.parse_args()
+    
+    # The app reads its database from the environment at import time
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.database)
+    from app import create_app
+    app = create_app()
+    
+    conn = sqlite3.connect(args.database)
+    try:
+        f = fixtures(conn)
+    finally:
+        conn.close()
+    
+    results = {}
+    for case in cases(f):
+        if args.only and args.only.lower() not in case.name.lower():
+            continue
+        result = measure(app, case, case.rounds or args.rounds, args.min_time)
+        results[case.name] = result
+        print(f"{case.name:<44}median {result['median'] * 1000:8.3f} ms  "
+              f"p95 {result['p95'] * 1000:8.3f} ms  {result['ops']:9.1f} ops/s")
+    
+    report = {'meta': meta(args.database), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+        print(f'Results written to {args.output}')
+    
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
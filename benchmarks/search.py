@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Weekly log search benchmark
+
+Builds a throwaway database with a synthetic weekly log corpus and compares
+the FTS5 index against a LIKE '%term%' scan over the same text columns.
+    
+    python benchmarks/search.py --logs 50000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Add parent directory to path to import the models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.weekly_log import SEARCH_COLUMNS, fts_query
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'database', 'schema.sql')
+
+VERBS = ['configured', 'debugged', 'documented', 'deployed', 'reviewed', 'tested',
+         'designed', 'migrated', 'monitored', 'installed', 'analysed', 'presented']
+SKILLS = ['Python', 'SQL', 'Excel', 'Linux', 'networking', 'teamwork', 'report writing',
+          'customer service', 'project planning', 'Kubernetes', 'accounting', 'research']
+COMMENTS = ['Good progress this week.', 'Needs more detail on tasks.',
+            'Excellent initiative shown.', 'Please attach the workflow chart.',
+            'Punctual and professional.', '']
+SYLLABLES = ['ra', 'to', 'ki', 'mon', 'sel', 'var', 'ne', 'dus', 'pri', 'lo', 'gen',
+             'tam', 'ex', 'bur', 'fi', 'cal', 'om', 'tri', 'zen', 'ul']
+
+def vocabulary(rng, size=5000):
+    """Pseudo-words and cumulative Zipf-like weights, like real free text"""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, size + 1)))
+    return words, weights
+
+def sentence(rng, words, weights, length=12):
+    text = ' '.join(rng.choices(words, cum_weights=weights, k=length))
+    return f'{rng.choice(VERBS).capitalize()} {text}.'
+
+def build(path, logs, seed=42):
+    """Create the schema and insert a synthetic corpus"""
+    rng = random.Random(seed)
+    words, weights = vocabulary(rng)
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    
+    students = max(1, logs // 12)
+    conn.executemany(
+        'INSERT INTO users (id, email, password_hash, full_name, user_type) VALUES (?, ?, ?, ?, ?)',
+        [(i, f'student{i}@baze.edu.ng', 'x', f'Student {i}', 'student') for i in range(1, students + 1)]
+    )
+    conn.executemany(
+        '''INSERT INTO students (id, user_id, student_id, department, level, matriculation_number)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        [(i, i, f'BU/{i:06d}', rng.choice(['Computer Science', 'Law', 'Accounting']),
+          rng.choice(['200', '300', '400']), f'MAT{i:06d}') for i in range(1, students + 1)]
+    )
+    start = date(2025, 1, 6)
+    conn.executemany(
+        '''INSERT INTO internship_placements (id, student_id, organization_name, organization_address,
+               department, supervisor_name, supervisor_email, start_date, end_date)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        [(i, i, 'Org', 'Abuja', 'IT', 'Supervisor', 'supervisor@example.com',
+          start, start + timedelta(weeks=12)) for i in range(1, students + 1)]
+    )
+    
+    rows = []
+    for n in range(logs):
+        student = n % students + 1
+        week = n // students + 1
+        rows.append((
+            student, student, week, start + timedelta(weeks=week - 1),
+            start + timedelta(weeks=week - 1, days=4),
+            ' '.join(sentence(rng, words, weights) for _ in range(rng.randint(3, 8))),
+            ', '.join(rng.sample(SKILLS, 3)),
+            sentence(rng, words, weights, 6),
+            rng.choice(COMMENTS), rng.choice(COMMENTS)
+        ))
+    conn.executemany(
+        '''INSERT INTO weekly_logs (student_id, placement_id, week_number, week_start_date,
+               week_end_date, activities, skills_learned, challenges, supervisor_comment, hod_comment)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        rows
+    )
+    conn.execute("INSERT INTO weekly_logs_fts (weekly_logs_fts) VALUES ('optimize')")
+    conn.commit()
+    
+    # Common, mid-frequency and rare terms, a prefix and a two-term query
+    queries = [words[2], words[100], words[2000], words[300][:4], f'{words[5]} {words[50]}']
+    return conn, queries
+
+def timed(conn, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logs', type=int, default=20000, help='Weekly logs to generate.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query (median is shown).')
+    parser.add_argument('--limit', type=int, default=20, help='Results per query.')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        conn, queries = build(os.path.join(tmp, 'bench.db'), args.logs)
+        print(f'Built {args.logs} weekly logs in {time.perf_counter() - start:.1f}s')
+        
+        columns = [name for name, _ in SEARCH_COLUMNS]
+        weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS)
+        like_sql = ('SELECT id FROM weekly_logs WHERE '
+                    + ' OR '.join(f'{column} LIKE ?' for column in columns)
+                    + ' LIMIT ?')
+        fts_sql = f'''SELECT rowid FROM weekly_logs_fts WHERE weekly_logs_fts MATCH ?
+                      ORDER BY bm25(weekly_logs_fts, {weights}) LIMIT ?'''
+        count_like = ('SELECT COUNT(*) FROM weekly_logs WHERE '
+                      + ' OR '.join(f'{column} LIKE ?' for column in columns))
+        count_fts = 'SELECT COUNT(*) FROM weekly_logs_fts WHERE weekly_logs_fts MATCH ?'
+        
+        print(f"{'query':<28}{'matches':>9}{'LIKE ms':>10}{'FTS ms':>10}{'speedup':>9}")
+        for text in queries:
+            # LIKE cannot rank, so it has to see every match to order them
+            pattern = f'%{text}%'
+            like_ms, _ = timed(conn, count_like, [pattern] * len(columns), args.repeat)
+            fts_ms, _ = timed(conn, fts_sql, [fts_query(text), args.limit], args.repeat)
+            matches = conn.execute(count_fts, [fts_query(text)]).fetchone()[0]
+            print(f'{text:<28}{matches:>9}{like_ms:>10.2f}{fts_ms:>10.2f}{like_ms / fts_ms:>8.1f}x')
+        
+        # First page only: LIKE can stop early when matches are common
+        print('\nUnranked LIKE, first page only (LIMIT):')
+        for text in queries:
+            like_ms, _ = timed(conn, like_sql, [f'%{text}%'] * len(columns) + [args.limit],
+                               args.repeat)
+            print(f'{text:<28}{like_ms:>10.2f} ms')
+        conn.close()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Gunicorn startup benchmark
+
+Starts gunicorn with and without preload_app against a database, waits for
+every worker to finish loading the app, sends some requests, then reports
+how long the workers took to become ready and the RSS, PSS and USS of each
+(from /proc/<pid>/smaps_rollup, so Linux only):
+    
+    python benchmarks/startup.py /tmp/bench.db --workers 4
+
+PSS charges shared pages to every process that maps them in equal parts,
+so the sum over all processes is what the server really costs.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Appended to gunicorn.conf.py: record when each worker has loaded the app
+HOOK = '''
+import time as _time
+
+def post_worker_init(worker):
+    with open(os.path.join({ready_dir!r}, str(worker.pid)), 'w') as out:
+        out.write(repr(_time.time()))
+'''
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def memory(pid):
+    """RSS, PSS and USS of a process in KiB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    uss = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return {'rss': fields.get('Rss', 0), 'pss': fields.get('Pss', 0), 'uss': uss}
+
+def run(database, preload, workers, requests, timeout):
+    work_dir = tempfile.mkdtemp(prefix='bids-startup-')
+    ready_dir = os.path.join(work_dir, 'ready')
+    os.mkdir(ready_dir)
+    config = os.path.join(work_dir, 'gunicorn.conf.py')
+    with open(os.path.join(ROOT, 'gunicorn.conf.py')) as base, open(config, 'w') as out:
+        out.write(base.read() + '\n' + HOOK.format(ready_dir=ready_dir))
+    
+    port = free_port()
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.abspath(database),
+               FLASK_ENV='production',
+               GUNICORN_PRELOAD='1' if preload else '0',
+               GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}')
+    start = time.time()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', config, 'wsgi:app'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + timeout
+        while len(os.listdir(ready_dir)) < workers:
+            if server.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+            if time.time() > deadline:
+                raise RuntimeError('Timed out waiting for the workers')
+            time.sleep(0.01)
+        ready = {}
+        for name in os.listdir(ready_dir):
+            with open(os.path.join(ready_dir, name)) as f:
+                ready[int(name)] = float(f.read()) - start
+        
+        for i in range(requests):
+            path = '/auth/login' if i % 2 else '/about'
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=10).read()
+            except urllib.error.HTTPError:
+                pass
+        
+        worker_memory = {pid: memory(pid) for pid in ready}
+        return {
+            'preload': preload,
+            'all_ready': max(ready.values()),
+            'first_ready': min(ready.values()),
+            'master': memory(server.pid),
+            'workers': list(worker_memory.values()),
+            'total_pss': memory(server.pid)['pss'] + sum(m['pss'] for m in worker_memory.values())
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def report(result):
+    mib = lambda kib: f'{kib / 1024:6.1f} MiB'
+    workers = result['workers']
+    mean = lambda key: sum(m[key] for m in workers) / len(workers)
+    print(f"preload={'on' if result['preload'] else 'off'}")
+    print(f"  workers ready    first {result['first_ready']:.3f} s, all {result['all_ready']:.3f} s")
+    print(f"  master           rss {mib(result['master']['rss'])}  pss {mib(result['master']['pss'])}")
+    print(f"  per worker       rss {mib(mean('rss'))}  pss {mib(mean('pss'))}  uss {mib(mean('uss'))}")
+    print(f"  total pss        {mib(result['total_pss'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure gunicorn startup time and memory.')
+    parser.add_argument('database', help='SQLite database to serve.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Requests to send before measuring memory.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per mode (best is kept).')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('-o', '--output', help='Write results as JSON to this file.')
+    args = parser.parse_args()
+    
+    results = []
+    for preload in (False, True):
+        runs = [run(args.database, preload, args.workers, args.requests, args.timeout)
+                for _ in range(args.repeat)]
+        best = min(runs, key=lambda result: result['all_ready'])
+        report(best)
+        results.append(best)
+    
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+        print(f'Results written to {args.output}')
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -12,10 +12,53 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'database', 'baze_internship.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Connection pool config (per worker)
+    DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE') or 4)
+    DB_WRITE_POOL_SIZE = int(os.environ.get('DB_WRITE_POOL_SIZE') or 2)
+    # Audit log, last_login and mail queue writers
+    DB_BACKGROUND_POOL_SIZE = int(os.environ.get('DB_BACKGROUND_POOL_SIZE') or 2)
+    DB_POOL_TIMEOUT = 10.0  # seconds to wait for a free connection
+    DB_BUSY_TIMEOUT = 5000  # milliseconds
+    DB_CACHE_SIZE_KB = 16384  # 16MB page cache per connection
+    DB_MMAP_SIZE = 128 * 1024 * 1024
+    DB_WRITE_RETRIES = 5
+    DB_RETRY_BACKOFF = 0.05  # seconds, doubled on each retry
+    
+    # User cache config (per worker)
+    USER_CACHE_SIZE = 2048
+    USER_CACHE_TTL = 300  # seconds
+    
+    # Login config
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS') or 2)
+    LOGIN_QUEUE_DEPTH = 16  # checks allowed to wait before LoginBusy
+    LOGIN_HASH_TIMEOUT = 10.0  # seconds
+    LAST_LOGIN_FLUSH_INTERVAL = 5.0  # seconds
+    
+    # Audit trail config
+    AUDIT_DURABILITY = os.environ.get('AUDIT_DURABILITY') or 'batched'  # or 'immediate'
+    AUDIT_FLUSH_SIZE = 200  # rows per group commit
+    AUDIT_FLUSH_INTERVAL = 1.0  # seconds
+    AUDIT_MAX_PENDING = 10000
+    AUDIT_MAX_RETRIES = 3  # failed writes of a batch before its rows are dropped and logged
+    AUDIT_RETENTION_DAYS = 90
+    
     # Upload config
     UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
+    UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read per chunk while hashing
+    UPLOAD_RENDITION_WORKERS = int(os.environ.get('UPLOAD_RENDITION_WORKERS') or 1)
+    THUMBNAIL_SIZE = (320, 320)
+    WEB_IMAGE_SIZE = (1600, 1600)
+    RENDITION_QUALITY = 80  # JPEG quality of thumbnails and web images
+    UPLOAD_ORPHAN_MIN_AGE = 3600  # seconds before an unreferenced file counts as orphaned
+    UPLOAD_ACCEL_REDIRECT = os.environ.get('UPLOAD_ACCEL_REDIRECT')  # nginx internal location serving UPLOAD_FOLDER
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE') == '1'  # front server honours X-Sendfile
+    
+    # PDF summaries
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR') or os.path.join(basedir, 'database', 'pdf_cache')
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS') or 0) or None  # default: one per CPU
     
     # Email config
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -24,6 +67,14 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@baze.edu.ng'
+    MAIL_QUEUE_WORKERS = int(os.environ.get('MAIL_QUEUE_WORKERS') or 1)  # threads per process
+    MAIL_BATCH_SIZE = 50  # messages claimed per SMTP session round
+    MAIL_MAX_RECIPIENTS = 50  # BCC recipients per shared message
+    MAIL_RATE_LIMIT = 5  # messages per second per process
+    MAIL_MAX_ATTEMPTS = 5  # then dead-lettered
+    MAIL_RETRY_BACKOFF = 60  # seconds, doubled on each attempt
+    MAIL_POLL_INTERVAL = 5.0
+    MAIL_SMTP_IDLE_TIMEOUT = 30.0
     
     # Session config
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
@@ -34,11 +85,48 @@ class Config:
     # Pagination
     STUDENTS_PER_PAGE = 20
     LOGS_PER_PAGE = 10
+    NOTIFICATIONS_PER_PAGE = 20
+    NOTIFICATION_RETENTION_DAYS = 30  # read notifications older than this are compacted
+    
+    # Weekly compliance reminders (flask check-compliance)
+    COMPLIANCE_REVIEW_DAYS = 7  # submitted logs older than this remind the supervisor (twice this alerts the HOD)
+    COMPLIANCE_MISSED_WEEKS = 2  # weekly logs missed in a row before the supervisor and HOD are alerted
+    COMPLIANCE_GAP_DAYS = 3  # unmarked weekdays in a week before the supervisor and HOD are alerted
+    COMPLIANCE_EMAIL = True  # also email everyone reminded (one BCC message per check)
+    
+    # Typeahead directory (per worker, utils/directory.py)
+    DIRECTORY_MAX_RESULTS = 10
+    DIRECTORY_RELOAD_THRESHOLD = 2000  # changed users above which the index is rebuilt instead
+    
+    # Dashboard fragment cache (utils/fragments.py)
+    FRAGMENT_CACHE_ENABLED = True
+    FRAGMENT_CACHE_SIZE = 1024  # rendered fragments per worker
+    FRAGMENT_MAX_BYTES = 64 * 1024  # larger renders are not cached
+    FRAGMENT_CACHE_DIR = os.environ.get('FRAGMENT_CACHE_DIR')  # shared between workers when set
+    FRAGMENT_DISK_MAX_BYTES = 256 * 1024 * 1024
+    
+    # HOD reporting
+    REPORT_CACHE_SIZE = 64  # department rollup snapshots per worker
+    REPORT_CACHE_TTL = 600  # seconds
+    
+    # Evaluation analytics (per worker, by academic year)
+    ANALYTICS_CACHE_SIZE = 8  # academic years kept per worker
+    ANALYTICS_CACHE_TTL = 3600  # seconds
+    ANALYTICS_EPOCH_FILE = os.path.join(basedir, 'database', '.analytics_epoch')
+    ANALYTICS_MIN_GROUP = 3  # evaluations an organization needs to be charted
+    
+    # SQL instrumentation (per worker, served on /admin/metrics)
+    SQL_TRACE_SAMPLE_RATE = float(os.environ.get('SQL_TRACE_SAMPLE_RATE') or 0.05)  # share of requests in the histograms
+    SQL_SLOW_QUERY_MS = int(os.environ.get('SQL_SLOW_QUERY_MS') or 100)  # logged with normalized SQL
+    SQL_SLOW_QUERY_ALL_REQUESTS = os.environ.get('SQL_SLOW_QUERY_ALL_REQUESTS', 'false').lower() in ['true', 'on', '1']  # else sampled requests only
+    SQL_SLOWEST_PER_REQUEST = 5  # statements listed in the per-request debug log
+    SQL_SERVER_TIMING = True  # Server-Timing header on traced requests
     
     # University specific
     UNIVERSITY_NAME = "Baze University"
     UNIVERSITY_EMAIL_DOMAIN = "@baze.edu.ng"
-    ACADEMIC_YEAR = "2024/2025"
+    ACADEMIC_YEAR = os.environ.get('ACADEMIC_YEAR') or "2024/2025"
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or os.path.join(basedir, 'database', 'archive')
     
     # File paths
     WORKFLOW_CHARTS_PATH = os.path.join(UPLOAD_FOLDER, 'workflow_charts')
@@ -54,6 +142,7 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    SQL_TRACE_SAMPLE_RATE = 1.0
     
 class ProductionConfig(Config):
     DEBUG = False
@@ -61,6 +150,7 @@ class ProductionConfig(Config):
     
 class TestingConfig(Config):
     TESTING = True
+    MAIL_SUPPRESS_SEND = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
 
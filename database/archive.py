@@ -0,0 +1,253 @@
+"""
+Academic-year archives
+
+Completed and terminated placements of a past academic year are moved,
+with their attendance, weekly logs, evaluations, uploads and summary rows,
+into database/archive/archive_YYYY_YYYY.db. The year's activity_logs rows
+go there too, including the months rollover_activity_logs() already moved
+into activity_logs_YYYY_MM tables; those tables are dropped once copied.
+Rows are first copied by column name (INSERT OR IGNORE, so a
+rerun after a crash is harmless) and committed, then deleted from the live database in
+a second transaction; WAL mode does not make one transaction atomic
+across attached files. Users and students stay in the live database.
+
+history() attaches every archive to a read-only connection and creates
+TEMP views all_<table> that UNION ALL the live table with its archived
+copies, so historical reports run unchanged over all years.
+all_activity_logs also covers the live activity_logs_YYYY_MM tables.
+"""
+
+import glob
+import os
+import re
+import stat
+from contextlib import contextmanager
+from datetime import date, datetime
+from database import versions
+
+# (table, column linking it to internship_placements)
+PLACEMENT_TABLES = [
+    ('internship_placements', 'id'),
+    ('attendance', 'placement_id'),
+    ('weekly_logs', 'placement_id'),
+    ('evaluations', 'placement_id'),
+    ('file_uploads', 'placement_id'),
+    ('attendance_summary', 'placement_id')
+]
+HISTORY_TABLES = [table for table, _ in PLACEMENT_TABLES] + ['activity_logs']
+
+_YEAR = re.compile(r'(\d{4})/(\d{4})')
+_ROLLOVER_GLOB = 'activity_logs_[0-9][0-9][0-9][0-9]_[0-9][0-9]'
+_FOREIGN_KEY = re.compile(r',\s*FOREIGN KEY \(\w+\) REFERENCES \w+\(\w+\)(?:\s+ON DELETE \w+)?')
+
+def parse_year(year):
+    """'2023/2024' -> (first day, first day of the next year)"""
+    match = _YEAR.fullmatch(year or '')
+    if not match or int(match.group(2)) != int(match.group(1)) + 1:
+        raise ValueError(f'Academic year must look like 2023/2024, not {year!r}')
+    start = int(match.group(1))
+    return date(start, 9, 1), date(start + 1, 9, 1)
+
+def academic_year(day):
+    """Academic year label ('2024/2025') a date falls in; years start in September"""
+    start = day.year if day.month >= 9 else day.year - 1
+    return f'{start}/{start + 1}'
+
+def archive_path(archive_dir, year):
+    parse_year(year)
+    return os.path.join(archive_dir, f"archive_{year.replace('/', '_')}.db")
+
+def archive_years(archive_dir):
+    """Archived years, oldest first"""
+    years = []
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'archive_*_*.db'))):
+        name = os.path.basename(path)[len('archive_'):-len('.db')]
+        years.append(name.replace('_', '/'))
+    return years
+
+def _alias(year):
+    return 'y' + year.replace('/', '_')
+
+def _create_tables(conn, schema):
+    """Create the archived tables and their indexes in an attached schema"""
+    tables = HISTORY_TABLES
+    marks = ', '.join('?' * len(tables))
+    rows = conn.execute(
+        f'''SELECT type, name, sql FROM main.sqlite_master
+            WHERE tbl_name IN ({marks}) AND type IN ('table', 'index') AND sql IS NOT NULL
+            ORDER BY type = 'index', name''', tables).fetchall()
+    for kind, name, sql in rows:
+        if kind == 'table':
+            # Users and students stay behind, so drop the foreign keys
+            sql = _FOREIGN_KEY.sub('', sql)
+            sql = sql.replace(f'CREATE TABLE {name}',
+                              f'CREATE TABLE IF NOT EXISTS {schema}.{name}', 1)
+        else:
+            sql = re.sub(r'^CREATE (UNIQUE )?INDEX ',
+                         rf'CREATE \1INDEX IF NOT EXISTS {schema}.', sql)
+        conn.execute(sql)
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {schema}.archive_info (
+                         key TEXT PRIMARY KEY, value TEXT)''')
+
+def _rollover_tables(conn, start=None, end=None):
+    """Live activity_logs_YYYY_MM tables, only the months in [start, end) if given"""
+    names = [row[0] for row in conn.execute(
+        """SELECT name FROM main.sqlite_master WHERE type = 'table' AND name GLOB ?
+           ORDER BY name""", (_ROLLOVER_GLOB,))]
+    if start is None:
+        return names
+    return [name for name in names
+            if start <= date(int(name[-7:-3]), int(name[-2:]), 1) < end]
+
+def _copy_columns(conn, schema, table):
+    """Column list for copying table into schema, by name rather than position
+    
+    An archive file created before a migration added columns gets them
+    added (without constraints) so a rerun copies every live column.
+    """
+    columns = [(row[1], row[2]) for row in conn.execute(f'PRAGMA main.table_info({table})')]
+    present = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')}
+    for name, kind in columns:
+        if name not in present:
+            conn.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN {name} {kind}')
+    return ', '.join(name for name, _ in columns)
+
+def archive_year(manager, year, archive_dir, current_year, compact=False, read_only=False):
+    """Move a past year's finished placements into its archive file
+    
+    Returns {table: rows moved}. compact VACUUMs both files afterwards
+    (VACUUM on the live database blocks writers while it runs); read_only
+    clears the archive's write permission bits.
+    """
+    start, end = parse_year(year)
+    if year == current_year:
+        raise ValueError(f'{year} is the current academic year')
+    os.makedirs(archive_dir, exist_ok=True)
+    path = archive_path(archive_dir, year)
+    if os.path.exists(path) and not os.access(path, os.W_OK):
+        raise ValueError(f'{path} is read-only')
+    
+    window = {'start': start.isoformat(), 'end': end.isoformat()}
+    moved = {}
+    conn = manager.writer.acquire()
+    try:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('ATTACH DATABASE ? AS archive', (path,))
+        try:
+            # Archives are opened read-only later, which WAL does not allow
+            conn.execute('PRAGMA archive.journal_mode = DELETE')
+            conn.execute('DROP TABLE IF EXISTS temp.archived_placements')
+            conn.execute(
+                '''CREATE TEMP TABLE archived_placements AS
+                   SELECT id FROM main.internship_placements
+                   WHERE status IN ('completed', 'terminated')
+                     AND start_date >= :start AND start_date < :end''', window)
+            
+            # Phase 1: copy
+            with manager.transaction(conn):
+                _create_tables(conn, 'archive')
+                for table, column in PLACEMENT_TABLES:
+                    columns = _copy_columns(conn, 'archive', table)
+                    conn.execute(
+                        f'''INSERT OR IGNORE INTO archive.{table} ({columns})
+                            SELECT {columns} FROM main.{table}
+                            WHERE {column} IN (SELECT id FROM temp.archived_placements)''')
+                columns = _copy_columns(conn, 'archive', 'activity_logs')
+                conn.execute(
+                    f'''INSERT OR IGNORE INTO archive.activity_logs ({columns})
+                        SELECT {columns} FROM main.activity_logs
+                        WHERE created_at >= :start AND created_at < :end''', window)
+                # Months already rolled over carry the columns activity_logs had then
+                rollover = _rollover_tables(conn, start, end)
+                for table in rollover:
+                    present = {row[1] for row in conn.execute(f'PRAGMA main.table_info({table})')}
+                    shared = ', '.join(c for c in columns.split(', ') if c in present)
+                    conn.execute(f'''INSERT OR IGNORE INTO archive.activity_logs ({shared})
+                                     SELECT {shared} FROM main.{table}''')
+                conn.executemany(
+                    'INSERT OR REPLACE INTO archive.archive_info (key, value) VALUES (?, ?)',
+                    [('academic_year', year), ('archived_at', datetime.now().isoformat())])
+            
+            # Phase 2: delete from the live database (children first; the
+            # triggers keep the FTS index and attendance_summary in step)
+            with manager.transaction(conn):
+                for table, column in reversed(PLACEMENT_TABLES):
+                    cursor = conn.execute(
+                        f'''DELETE FROM main.{table}
+                            WHERE {column} IN (SELECT id FROM temp.archived_placements)''')
+                    moved[table] = cursor.rowcount
+                cursor = conn.execute(
+                    '''DELETE FROM main.activity_logs
+                       WHERE created_at >= :start AND created_at < :end''', window)
+                moved['activity_logs'] = cursor.rowcount
+                for table in rollover:
+                    moved['activity_logs'] += conn.execute(
+                        f'SELECT COUNT(*) FROM main.{table}').fetchone()[0]
+                    conn.execute(f'DROP TABLE main.{table}')
+                for table in versions.TABLES:
+                    versions.bump(conn, table)
+            moved = {table: moved[table] for table in HISTORY_TABLES}
+            
+            conn.execute('DROP TABLE temp.archived_placements')
+            if compact:
+                conn.execute('VACUUM archive')
+        finally:
+            conn.execute('DETACH DATABASE archive')
+        if compact:
+            conn.execute('VACUUM')
+            conn.execute('PRAGMA optimize')
+    finally:
+        manager.writer.release(conn)
+    
+    if read_only:
+        mode = os.stat(path).st_mode
+        os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+    return moved
+
+def attach_archives(conn, archive_dir):
+    """ATTACH every archive and create TEMP all_<table> views, returns the years"""
+    years = archive_years(archive_dir)
+    attached = {row[1] for row in conn.execute('PRAGMA database_list')}
+    for year in years:
+        if _alias(year) not in attached:
+            conn.execute(f'ATTACH DATABASE ? AS {_alias(year)}',
+                         (archive_path(archive_dir, year),))
+    
+    # TEMP views count as writes for PRAGMA query_only, which readers set
+    query_only = conn.execute('PRAGMA query_only').fetchone()[0]
+    conn.execute('PRAGMA query_only = OFF')
+    try:
+        _create_views(conn, years)
+    finally:
+        conn.execute(f'PRAGMA query_only = {int(query_only)}')
+    return years
+
+def _create_views(conn, years):
+    for table in HISTORY_TABLES:
+        columns = [row[1] for row in conn.execute(f'PRAGMA main.table_info({table})')]
+        select_list = ', '.join(columns)
+        parts = [f"SELECT {select_list}, NULL AS archive_year FROM main.{table}"]
+        sources = [(f'main.{name}', 'NULL') for name in (
+            _rollover_tables(conn) if table == 'activity_logs' else [])]
+        sources += [(f'{_alias(year)}.{table}', f"'{year}'") for year in years]
+        for source, label in sources:
+            schema, name = source.split('.')
+            present = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({name})')}
+            if not present:
+                continue
+            # Columns added after the rows were moved read as NULL
+            moved = ', '.join(c if c in present else f'NULL AS {c}' for c in columns)
+            parts.append(f"SELECT {moved}, {label} FROM {source}")
+        conn.execute(f'DROP VIEW IF EXISTS temp.all_{table}')
+        conn.execute(f'CREATE TEMP VIEW all_{table} AS ' + ' UNION ALL '.join(parts))
+
+@contextmanager
+def history(manager, archive_dir):
+    """A read-only connection whose all_<table> views span every year"""
+    conn = manager.connect_readonly()
+    try:
+        attach_archives(conn, archive_dir)
+        yield conn
+    finally:
+        conn.close()
\ No newline at end of file
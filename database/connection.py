@@ -0,0 +1,328 @@
+"""
+Pooled SQLite connection management
+
+Each worker keeps a small pool of reader connections and a smaller pool of
+writer connections. All connections are opened in WAL mode so readers never
+block the writer, and writers start their transactions with BEGIN IMMEDIATE
+so lock contention shows up (and is retried) at the start of a transaction
+instead of half way through it.
+
+Request code writes through ConnectionManager.transaction(), which takes a
+writer only for the length of the transaction. Background writers (the
+audit log, last_login updates and the mail queue) have a pool of their
+own, so busy requests cannot starve them and they cannot starve requests.
+
+Pools open nothing until first used, and a pool inherited through fork()
+starts over empty in the child: SQLite connections must not be shared
+across processes.
+"""
+
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context
+from werkzeug.local import LocalProxy
+from database.tracing import TracedConnection
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free in time"""
+
+class ConnectionPool:
+    """Bounded pool of configured SQLite connections"""
+    
+    def __init__(self, database, size=4, readonly=False, uri=False,
+                 busy_timeout=5000, cache_size=16384, mmap_size=134217728,
+                 timeout=10.0):
+        self.database = database
+        self.size = size
+        self.readonly = readonly
+        self.uri = uri
+        self.busy_timeout = busy_timeout
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.timeout = timeout
+        
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._pid = os.getpid()
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+    
+    def _connect(self):
+        """Open a new connection with the pool's PRAGMAs applied"""
+        conn = sqlite3.connect(
+            self.database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            timeout=self.busy_timeout / 1000,
+            isolation_level=None if self.readonly else 'IMMEDIATE',
+            check_same_thread=False,
+            uri=self.uri,
+            factory=TracedConnection
+        )
+        conn.row_factory = sqlite3.Row
+        
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f'PRAGMA cache_size = -{int(self.cache_size)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        if self.readonly:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+    
+    def _after_fork(self):
+        """Forget connections opened by the parent process
+        
+        They are left unclosed on purpose; closing them here could release
+        locks the parent still relies on.
+        """
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.hits = self.misses = self.waits = 0
+        self.wait_time = 0.0
+        self._pid = os.getpid()
+    
+    def acquire(self):
+        """Take a connection from the pool, opening one if there is room"""
+        if self._pid != os.getpid():
+            self._after_fork()
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+                self.misses += 1
+        
+        if create:
+            try:
+                return self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        # Pool exhausted, wait for another request to hand one back
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(
+                f'No connection available after {self.timeout:.1f}s'
+            )
+        with self._lock:
+            self.waits += 1
+            self.wait_time += time.perf_counter() - start
+        return conn
+    
+    def release(self, conn):
+        """Return a connection to the pool"""
+        conn.trace = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Connection is unusable, drop it and free its slot
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+    
+    def discard(self, conn):
+        """Close a connection without returning it to the pool"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+    
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+    
+    def stats(self):
+        """Return pool counters"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 6)
+            }
+
+class ConnectionManager:
+    """Per-worker reader and writer pools for the application database"""
+    
+    def __init__(self, app=None):
+        self.reader = None
+        self.writer = None
+        self.background = None
+        self.retries = 5
+        self.backoff = 0.05
+        self._anchor = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Configure pools from the application config"""
+        database = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        uri = False
+        
+        if database == ':memory:':
+            # Pooled connections to ':memory:' would each get their own empty
+            # database, so share one named in-memory database instead and
+            # keep it alive for as long as the manager exists.
+            database = f'file:baze_memdb_{id(self)}?mode=memory&cache=shared'
+            uri = True
+            self._anchor = sqlite3.connect(database, uri=True,
+                                           check_same_thread=False)
+        
+        options = {
+            'uri': uri,
+            'busy_timeout': app.config.get('DB_BUSY_TIMEOUT', 5000),
+            'cache_size': app.config.get('DB_CACHE_SIZE_KB', 16384),
+            'mmap_size': app.config.get('DB_MMAP_SIZE', 134217728),
+            'timeout': app.config.get('DB_POOL_TIMEOUT', 10.0)
+        }
+        self.reader = ConnectionPool(
+            database, size=app.config.get('DB_READ_POOL_SIZE', 4),
+            readonly=True, **options
+        )
+        self.writer = ConnectionPool(
+            database, size=app.config.get('DB_WRITE_POOL_SIZE', 2),
+            **options
+        )
+        self.background = ConnectionPool(
+            database, size=app.config.get('DB_BACKGROUND_POOL_SIZE', 2),
+            **options
+        )
+        self.retries = app.config.get('DB_WRITE_RETRIES', 5)
+        self.backoff = app.config.get('DB_RETRY_BACKOFF', 0.05)
+        
+        app.extensions['db_manager'] = self
+        app.teardown_appcontext(close_db)
+    
+    @contextmanager
+    def transaction(self, conn=None, background=False):
+        """Run a write transaction, retrying BEGIN IMMEDIATE while locked
+        
+        Once BEGIN IMMEDIATE succeeds the connection holds the write lock,
+        so only acquiring it needs to be retried. The transaction commits
+        when the block exits cleanly and rolls back otherwise. Without conn
+        a writer is taken from the writer pool (the background pool for
+        background=True) and handed back when the block exits.
+        """
+        owned = conn is None
+        if owned:
+            pool = self.background if background else self.writer
+            conn = pool.acquire()
+            if not background and has_app_context():
+                conn.trace = g.get('sql_trace')
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            
+            attempt = 0
+            while True:
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    break
+                except sqlite3.OperationalError as e:
+                    message = str(e)
+                    if 'locked' not in message and 'busy' not in message:
+                        raise
+                    if attempt >= self.retries:
+                        raise
+                    # Exponential backoff with jitter so workers spread out
+                    delay = self.backoff * (2 ** attempt)
+                    time.sleep(delay + random.uniform(0, delay))
+                    attempt += 1
+            
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+        finally:
+            if owned:
+                pool.release(conn)
+    
+    def connect_readonly(self):
+        """Open a read-only connection outside the pools (for watchers)"""
+        return self.reader._connect()
+    
+    def stats(self):
+        """Return counters for both pools"""
+        return {
+            'reader': self.reader.stats(),
+            'writer': self.writer.stats(),
+            'background': self.background.stats()
+        }
+    
+    def close(self):
+        """Close all idle pooled connections"""
+        self.reader.close()
+        self.writer.close()
+        self.background.close()
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+
+# The current app's manager (create_app() makes one per app)
+db_manager = LocalProxy(lambda: current_app.extensions['db_manager'])
+
+def get_db():
+    """Get a writer connection held until the app context ends
+    
+    For the CLI and tests. Request code writes through
+    db_manager.transaction(), which hands the writer back on commit.
+    """
+    if 'db' not in g:
+        g.db = current_app.extensions['db_manager'].writer.acquire()
+        g.db.trace = g.get('sql_trace')
+    return g.db
+
+def get_read_db():
+    """Get the request's read-only connection"""
+    if 'read_db' not in g:
+        g.read_db = current_app.extensions['db_manager'].reader.acquire()
+        g.read_db.trace = g.get('sql_trace')
+    return g.read_db
+
+def close_db(error=None):
+    """Return the request's connections to their pools"""
+    manager = current_app.extensions.get('db_manager')
+    db = g.pop('db', None)
+    if db is not None:
+        manager.writer.release(db)
+    read_db = g.pop('read_db', None)
+    if read_db is not None:
+        manager.reader.release(read_db)
\ No newline at end of file
@@ -0,0 +1,300 @@
+"""
+Bulk import of students, organization supervisors and placements
+
+Rows are streamed from a CSV or JSONL file in chunks. Password hashing for
+the next chunk runs in a process pool while the current chunk is written,
+and each chunk is written in a single transaction with executemany. Rows
+that collide with an existing email, student_id or matriculation_number are
+skipped by the UNIQUE constraints (INSERT OR IGNORE) rather than checked one
+at a time, and bad rows are reported without aborting the batch.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from flask import current_app
+from database import versions
+from models.student import LEVELS
+from utils.auth import hash_password
+
+STUDENT_FIELDS = ('student_id', 'department', 'level', 'matriculation_number')
+PLACEMENT_FIELDS = ('organization_name', 'organization_address', 'placement_department',
+                    'supervisor_name', 'supervisor_email', 'start_date', 'end_date')
+
+# Columns written as given, so JSONL values must be strings (level may
+# also be a number)
+TEXT_FIELDS = ('user_type', 'email', 'full_name', 'password', 'phone', 'student_id',
+               'department', 'matriculation_number', 'organization_address', 'position',
+               'supervisor_phone') + PLACEMENT_FIELDS
+
+class ImportReport:
+    """Counters and per-row errors for one import run"""
+    
+    def __init__(self):
+        self.rows = 0
+        self.users = 0
+        self.placements = 0
+        self.duplicates = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+    
+    def error(self, line, message):
+        self.errors.append((line, message))
+    
+    @property
+    def throughput(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+    
+    def summary(self):
+        return (f'{self.rows} rows in {self.elapsed:.1f}s '
+                f'({self.throughput:.0f} rows/s): {self.users} users created, '
+                f'{self.placements} placements, {self.duplicates} duplicates '
+                f'skipped, {len(self.errors)} errors')
+
+def read_rows(path):
+    """Yield (line number, row dict) from a CSV or JSONL file"""
+    if path.endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_no, {'_error': f'invalid JSON: {e}'}
+                    continue
+                yield line_no, row if isinstance(row, dict) else {'_error': 'not an object'}
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            # Header is line 1
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+
+def _clean(row):
+    return {key.strip(): value.strip() if isinstance(value, str) else value
+            for key, value in row.items() if key}
+
+def _is_date(value):
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def validate_row(row):
+    """Return an error message for a row, or None if it can be imported"""
+    if '_error' in row:
+        return row['_error']
+    for field in TEXT_FIELDS:
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return f'{field} must be text'
+    level = row.get('level')
+    if level is not None and (isinstance(level, bool) or not isinstance(level, (str, int))):
+        return 'level must be text or a number'
+    
+    user_type = row.get('user_type') or 'student'
+    if user_type not in ('student', 'supervisor'):
+        return f'unsupported user_type {user_type!r}'
+    for field in ('email', 'full_name', 'password'):
+        if not row.get(field):
+            return f'missing {field}'
+    
+    if user_type == 'student':
+        for field in STUDENT_FIELDS:
+            if not row.get(field):
+                return f'missing {field}'
+        if str(row['level']) not in LEVELS:
+            return f"level must be one of {', '.join(LEVELS)}"
+        # Placement columns are optional, but all or nothing
+        given = [field for field in PLACEMENT_FIELDS if row.get(field)]
+        if given and len(given) != len(PLACEMENT_FIELDS):
+            missing = sorted(set(PLACEMENT_FIELDS) - set(given))
+            return f"incomplete placement, missing {', '.join(missing)}"
+        if given:
+            if not (_is_date(row['start_date']) and _is_date(row['end_date'])):
+                return 'start_date and end_date must be YYYY-MM-DD'
+            if row['end_date'] < row['start_date']:
+                return 'end_date is before start_date'
+    elif not row.get('organization_name'):
+        return 'missing organization_name'
+    return None
+
+def _write_chunk(conn, chunk, hashes, report):
+    """Insert one validated chunk inside the caller's transaction"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM users')
+    first_new = cursor.fetchone()[0]
+    
+    cursor.executemany(
+        '''INSERT OR IGNORE INTO users (email, password_hash, full_name, phone, user_type)
+           VALUES (?, ?, ?, ?, ?)''',
+        [(row['email'].lower(), password_hash, row['full_name'], row.get('phone') or None,
+          row.get('user_type') or 'student')
+         for (_, row), password_hash in zip(chunk, hashes)]
+    )
+    
+    # Rows ignored by UNIQUE(email) are not in here
+    cursor.execute('SELECT id, email FROM users WHERE id > ?', (first_new,))
+    user_ids = {email: user_id for user_id, email in cursor.fetchall()}
+    
+    students = []
+    supervisors = []
+    created = []
+    for line_no, row in chunk:
+        user_id = user_ids.pop(row['email'].lower(), None)
+        if user_id is None:
+            report.duplicates += 1
+            report.error(line_no, f"duplicate email {row['email']}")
+            continue
+        created.append((line_no, row, user_id))
+        if (row.get('user_type') or 'student') == 'student':
+            students.append((user_id, row['student_id'], row['department'],
+                             str(row['level']), row['matriculation_number']))
+        else:
+            supervisors.append((user_id, row['organization_name'],
+                                row.get('organization_address') or None,
+                                row.get('position') or None,
+                                row.get('department') or None))
+    
+    cursor.executemany(
+        '''INSERT OR IGNORE INTO students
+           (user_id, student_id, department, level, matriculation_number)
+           VALUES (?, ?, ?, ?, ?)''',
+        students
+    )
+    cursor.executemany(
+        '''INSERT INTO organization_supervisors
+           (user_id, organization_name, organization_address, position, department)
+           VALUES (?, ?, ?, ?, ?)''',
+        supervisors
+    )
+    
+    # Students whose student_id or matriculation_number already existed were
+    # ignored above; drop their new user rows so no orphan accounts remain
+    cursor.execute(
+        '''SELECT u.id FROM users u
+           LEFT JOIN students s ON s.user_id = u.id
+           WHERE u.id > ? AND u.user_type = 'student' AND s.id IS NULL''',
+        (first_new,)
+    )
+    orphans = {row[0] for row in cursor.fetchall()}
+    if orphans:
+        cursor.executemany('DELETE FROM users WHERE id = ?', [(i,) for i in orphans])
+    
+    cursor.execute(
+        'SELECT user_id, id FROM students WHERE user_id > ?',
+        (first_new,)
+    )
+    student_ids = dict(cursor.fetchall())
+    versions.bump(conn, 'students', student_ids.values())
+    
+    placements = []
+    for line_no, row, user_id in created:
+        if user_id in orphans:
+            report.duplicates += 1
+            report.error(line_no, 'duplicate student_id or matriculation_number')
+            continue
+        report.users += 1
+        if user_id in student_ids and row.get('organization_name') and row.get('start_date'):
+            placements.append((student_ids[user_id], row['organization_name'],
+                               row['organization_address'], row['placement_department'],
+                               row['supervisor_name'], row['supervisor_email'].lower(),
+                               row.get('supervisor_phone') or None,
+                               row['start_date'], row['end_date']))
+    
+    cursor.executemany(
+        '''INSERT INTO internship_placements
+           (student_id, organization_name, organization_address, department,
+            supervisor_name, supervisor_email, supervisor_phone, start_date, end_date)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        placements
+    )
+    versions.bump(conn, 'internship_placements', [placement[0] for placement in placements])
+    report.placements += len(placements)
+
+def import_users(manager, path, chunk_size=500, workers=None, progress=None):
+    """Import a CSV/JSONL file of students and supervisors
+    
+    manager is the application's ConnectionManager. progress, if given, is
+    called with the report after every chunk. Returns an ImportReport.
+    """
+    report = ImportReport()
+    workers = workers or os.cpu_count() or 1
+    # The pool's processes have no app context
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    
+    def chunks():
+        chunk = []
+        for line_no, row in read_rows(path):
+            report.rows += 1
+            row = _clean(row)
+            message = validate_row(row)
+            if message:
+                report.error(line_no, message)
+                continue
+            chunk.append((line_no, row))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = None
+        for chunk in chunks():
+            # Start hashing this chunk before writing the previous one so the
+            # pool and the database work at the same time
+            hashing = pool.map(_hash,
+                               [row['password'] for _, row in chunk], repeat(method),
+                               chunksize=max(1, len(chunk) // (workers * 4)))
+            if pending is not None:
+                _flush(manager, pending, report, progress)
+            pending = (chunk, hashing)
+        if pending is not None:
+            _flush(manager, pending, report, progress)
+    
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+def _hash(password, method):
+    """hash_password for the pool, returning a failure instead of raising it
+    
+    pool.map() would otherwise raise the first failure in place of every
+    hash after it, losing the rest of the chunk.
+    """
+    try:
+        return hash_password(password, method)
+    except Exception as e:
+        return e
+
+def _flush(manager, pending, report, progress):
+    chunk, hashing = pending
+    rows = []
+    hashes = []
+    for (line_no, row), password_hash in zip(chunk, hashing):
+        if isinstance(password_hash, Exception):
+            report.error(line_no, f'password could not be hashed: {password_hash}')
+            continue
+        rows.append((line_no, row))
+        hashes.append(password_hash)
+    
+    counters = (report.users, report.placements, report.duplicates, len(report.errors))
+    try:
+        if rows:
+            with manager.transaction() as conn:
+                _write_chunk(conn, rows, hashes, report)
+    except sqlite3.Error as e:
+        # The chunk was rolled back; report its rows and carry on
+        report.users, report.placements, report.duplicates = counters[:3]
+        del report.errors[counters[3]:]
+        for line_no, _ in rows:
+            report.error(line_no, f'chunk failed: {e}')
+    report.elapsed = time.perf_counter() - report.started
+    if progress:
+        progress(report)
\ No newline at end of file
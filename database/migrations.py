@@ -0,0 +1,533 @@
+"""
+Schema migrations
+
+Migrations are numbered and applied in order; PRAGMA user_version records
+the last one applied, so running them again is a no-op. Each migration and
+its version bump commit together. After migrating, ANALYZE refreshes the
+planner statistics and PRAGMA optimize is run.
+
+Migration 1 runs baseline.sql, the schema as first released, and every
+change since is a migration of its own. schema.sql is the same schema at
+LATEST written out in full; tests check that both routes give the same
+database. Migrations must also run cleanly on a database built from
+schema.sql (IF NOT EXISTS, or check first), since such databases start at
+version 0.
+"""
+
+import os
+import sqlite3
+
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# The schema as first released, run by migration 1 and never edited
+BASELINE_PATH = os.path.join(DATABASE_DIR, 'baseline.sql')
+# The whole schema at LATEST, for tools that build a database in one go
+SCHEMA_PATH = os.path.join(DATABASE_DIR, 'schema.sql')
+
+# Trigger-maintained tables; the triggers keep them exact from here on and
+# _backfill() fills them for rows written before
+SUMMARY_TABLES = '''
+-- Attendance summary (one row per student per placement, kept in step with
+-- attendance by the triggers below so dashboards never scan attendance)
+CREATE TABLE IF NOT EXISTS attendance_summary (
+    student_id INTEGER NOT NULL,
+    placement_id INTEGER NOT NULL,
+    days_present INTEGER NOT NULL DEFAULT 0,
+    days_absent INTEGER NOT NULL DEFAULT 0,
+    days_late INTEGER NOT NULL DEFAULT 0,
+    days_excused INTEGER NOT NULL DEFAULT 0,
+    total_days INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student_id, placement_id),
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (placement_id) REFERENCES internship_placements(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS attendance_summary_insert
+AFTER INSERT ON attendance
+BEGIN
+    INSERT INTO attendance_summary
+        (student_id, placement_id, days_present, days_absent, days_late, days_excused, total_days)
+    VALUES (
+        NEW.student_id, NEW.placement_id,
+        NEW.status = 'present', NEW.status = 'absent',
+        NEW.status = 'late', NEW.status = 'excused', 1
+    )
+    ON CONFLICT (student_id, placement_id) DO UPDATE SET
+        days_present = days_present + excluded.days_present,
+        days_absent = days_absent + excluded.days_absent,
+        days_late = days_late + excluded.days_late,
+        days_excused = days_excused + excluded.days_excused,
+        total_days = total_days + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attendance_summary_delete
+AFTER DELETE ON attendance
+BEGIN
+    UPDATE attendance_summary SET
+        days_present = days_present - (OLD.status = 'present'),
+        days_absent = days_absent - (OLD.status = 'absent'),
+        days_late = days_late - (OLD.status = 'late'),
+        days_excused = days_excused - (OLD.status = 'excused'),
+        total_days = total_days - 1
+    WHERE student_id = OLD.student_id AND placement_id = OLD.placement_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attendance_summary_update
+AFTER UPDATE OF status, student_id, placement_id ON attendance
+BEGIN
+    UPDATE attendance_summary SET
+        days_present = days_present - (OLD.status = 'present'),
+        days_absent = days_absent - (OLD.status = 'absent'),
+        days_late = days_late - (OLD.status = 'late'),
+        days_excused = days_excused - (OLD.status = 'excused'),
+        total_days = total_days - 1
+    WHERE student_id = OLD.student_id AND placement_id = OLD.placement_id;
+    
+    INSERT INTO attendance_summary
+        (student_id, placement_id, days_present, days_absent, days_late, days_excused, total_days)
+    VALUES (
+        NEW.student_id, NEW.placement_id,
+        NEW.status = 'present', NEW.status = 'absent',
+        NEW.status = 'late', NEW.status = 'excused', 1
+    )
+    ON CONFLICT (student_id, placement_id) DO UPDATE SET
+        days_present = days_present + excluded.days_present,
+        days_absent = days_absent + excluded.days_absent,
+        days_late = days_late + excluded.days_late,
+        days_excused = days_excused + excluded.days_excused,
+        total_days = total_days + 1;
+END;
+
+-- Unread notification counters (kept in step with notifications by the
+-- triggers below so the notification bell is a primary key lookup)
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id INTEGER PRIMARY KEY,
+    unread INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_insert
+AFTER INSERT ON notifications
+WHEN NEW.is_read = 0
+BEGIN
+    INSERT INTO notification_counters (user_id, unread) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET unread = unread + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_update
+AFTER UPDATE OF is_read ON notifications
+WHEN OLD.is_read != NEW.is_read
+BEGIN
+    INSERT INTO notification_counters (user_id, unread)
+    VALUES (NEW.user_id, CASE WHEN NEW.is_read = 0 THEN 1 ELSE 0 END)
+    ON CONFLICT (user_id) DO UPDATE SET
+        unread = MAX(0, unread + CASE WHEN NEW.is_read = 0 THEN 1 ELSE -1 END);
+END;
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_delete
+AFTER DELETE ON notifications
+WHEN OLD.is_read = 0
+BEGIN
+    UPDATE notification_counters SET unread = MAX(0, unread - 1)
+    WHERE user_id = OLD.user_id;
+END;
+
+DROP VIEW IF EXISTS student_attendance_summary;
+CREATE VIEW student_attendance_summary AS
+SELECT 
+    s.id as student_id,
+    s.student_id as student_number,
+    u.full_name,
+    COALESCE(SUM(sa.days_present), 0) as days_present,
+    COALESCE(SUM(sa.days_absent), 0) as days_absent,
+    COALESCE(SUM(sa.days_late), 0) as days_late,
+    COALESCE(SUM(sa.days_excused), 0) as days_excused,
+    COALESCE(SUM(sa.total_days), 0) as total_days
+FROM students s
+JOIN users u ON s.user_id = u.id
+LEFT JOIN attendance_summary sa ON s.id = sa.student_id
+GROUP BY s.id;
+'''
+
+LOG_SEARCH = '''
+-- Full-text index over weekly log text (external content: only the index is
+-- stored, the text stays in weekly_logs; kept in step by the triggers below)
+CREATE VIRTUAL TABLE IF NOT EXISTS weekly_logs_fts USING fts5(
+    activities, skills_learned, challenges, supervisor_comment, hod_comment,
+    content='weekly_logs', content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS weekly_logs_fts_insert
+AFTER INSERT ON weekly_logs
+BEGIN
+    INSERT INTO weekly_logs_fts
+        (rowid, activities, skills_learned, challenges, supervisor_comment, hod_comment)
+    VALUES
+        (NEW.id, NEW.activities, NEW.skills_learned, NEW.challenges,
+         NEW.supervisor_comment, NEW.hod_comment);
+END;
+
+CREATE TRIGGER IF NOT EXISTS weekly_logs_fts_delete
+AFTER DELETE ON weekly_logs
+BEGIN
+    INSERT INTO weekly_logs_fts
+        (weekly_logs_fts, rowid, activities, skills_learned, challenges,
+         supervisor_comment, hod_comment)
+    VALUES
+        ('delete', OLD.id, OLD.activities, OLD.skills_learned, OLD.challenges,
+         OLD.supervisor_comment, OLD.hod_comment);
+END;
+
+-- Status and date changes do not touch the index
+CREATE TRIGGER IF NOT EXISTS weekly_logs_fts_update
+AFTER UPDATE OF id, activities, skills_learned, challenges, supervisor_comment, hod_comment
+ON weekly_logs
+BEGIN
+    INSERT INTO weekly_logs_fts
+        (weekly_logs_fts, rowid, activities, skills_learned, challenges,
+         supervisor_comment, hod_comment)
+    VALUES
+        ('delete', OLD.id, OLD.activities, OLD.skills_learned, OLD.challenges,
+         OLD.supervisor_comment, OLD.hod_comment);
+    INSERT INTO weekly_logs_fts
+        (rowid, activities, skills_learned, challenges, supervisor_comment, hod_comment)
+    VALUES
+        (NEW.id, NEW.activities, NEW.skills_learned, NEW.challenges,
+         NEW.supervisor_comment, NEW.hod_comment);
+END;
+'''
+
+EMAIL_QUEUE = '''
+-- Outbound email queue (drained by utils.email workers)
+CREATE TABLE IF NOT EXISTS email_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipients TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    html TEXT,
+    status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'sending', 'sent', 'dead')),
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_email_queue_due ON email_queue(next_attempt_at) WHERE status = 'pending';
+'''
+
+# Keyset pagination indexes (equality filters first, then the sort key)
+KEYSET_INDEXES = '''
+CREATE INDEX IF NOT EXISTS idx_students_department_level ON students(department, level);
+CREATE INDEX IF NOT EXISTS idx_weekly_logs_student_week ON weekly_logs(student_id, week_number);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id, created_at) WHERE is_read = 0;
+CREATE INDEX IF NOT EXISTS idx_evaluations_placement ON evaluations(placement_id);
+'''
+
+PERFORMANCE_INDEXES = '''
+CREATE INDEX IF NOT EXISTS idx_weekly_logs_placement_week ON weekly_logs(placement_id, week_number);
+CREATE INDEX IF NOT EXISTS idx_evaluations_student_placement ON evaluations(student_id, placement_id);
+CREATE INDEX IF NOT EXISTS idx_file_uploads_student_type ON file_uploads(student_id, file_type);
+CREATE INDEX IF NOT EXISTS idx_file_uploads_placement ON file_uploads(placement_id, uploaded_at);
+CREATE INDEX IF NOT EXISTS idx_placements_hod_status ON internship_placements(assigned_hod_id, status);
+CREATE INDEX IF NOT EXISTS idx_attendance_placement_date ON attendance(placement_id, date);
+
+-- Covered by a longer index (or a UNIQUE constraint) with the same prefix,
+-- so they only cost writes
+DROP INDEX IF EXISTS idx_students_department;
+DROP INDEX IF EXISTS idx_weekly_logs_student;
+DROP INDEX IF EXISTS idx_attendance_student_date;
+'''
+
+COMPLIANCE = '''
+CREATE TABLE IF NOT EXISTS compliance_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    check_name TEXT NOT NULL,
+    period TEXT NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP,
+    duration_ms REAL,
+    placements INTEGER DEFAULT 0,
+    reminders INTEGER DEFAULT 0,
+    escalations INTEGER DEFAULT 0,
+    emails INTEGER DEFAULT 0,
+    UNIQUE (check_name, period)
+);
+CREATE INDEX IF NOT EXISTS idx_weekly_logs_submitted ON weekly_logs(submitted_at) WHERE status = 'submitted';
+'''
+
+DIRECTORY = '''
+CREATE TABLE IF NOT EXISTS directory_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER UNIQUE NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS directory_users_insert
+AFTER INSERT ON users
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_users_update
+AFTER UPDATE OF email, full_name, user_type, is_active ON users
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_users_delete
+AFTER DELETE ON users
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = OLD.id;
+    INSERT INTO directory_changes (user_id) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_students_insert
+AFTER INSERT ON students
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.user_id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_students_update
+AFTER UPDATE OF student_id, matriculation_number, department, level ON students
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.user_id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_supervisors_insert
+AFTER INSERT ON organization_supervisors
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.user_id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_supervisors_update
+AFTER UPDATE OF organization_name, department ON organization_supervisors
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.user_id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.user_id);
+END;
+'''
+
+DATA_VERSIONS = '''
+CREATE TABLE IF NOT EXISTS data_versions (
+    entity TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+'''
+
+# Supervisor intern pages filter on status as well as the supervisor
+SUPERVISOR_INDEX = '''
+DROP INDEX IF EXISTS idx_placements_supervisor;
+CREATE INDEX idx_placements_supervisor ON internship_placements(supervisor_email, status, start_date);
+'''
+
+# Users whose cached record or profile is stale; the user cache reads the
+# rows past the last seq it saw (models/user.py)
+USER_CHANGES = '''
+CREATE TABLE IF NOT EXISTS user_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER UNIQUE NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS user_changes_users_update
+AFTER UPDATE OF email, password_hash, full_name, phone, user_type, is_active ON users
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_users_delete
+AFTER DELETE ON users
+BEGIN
+    DELETE FROM user_changes WHERE user_id = OLD.id;
+    INSERT INTO user_changes (user_id) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_students_insert
+AFTER INSERT ON students
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_students_update
+AFTER UPDATE ON students
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_students_delete
+AFTER DELETE ON students
+BEGIN
+    DELETE FROM user_changes WHERE user_id = OLD.user_id;
+    INSERT INTO user_changes (user_id) VALUES (OLD.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_hods_insert
+AFTER INSERT ON hods
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_hods_update
+AFTER UPDATE ON hods
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_hods_delete
+AFTER DELETE ON hods
+BEGIN
+    DELETE FROM user_changes WHERE user_id = OLD.user_id;
+    INSERT INTO user_changes (user_id) VALUES (OLD.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_organization_supervisors_insert
+AFTER INSERT ON organization_supervisors
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_organization_supervisors_update
+AFTER UPDATE ON organization_supervisors
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_organization_supervisors_delete
+AFTER DELETE ON organization_supervisors
+BEGIN
+    DELETE FROM user_changes WHERE user_id = OLD.user_id;
+    INSERT INTO user_changes (user_id) VALUES (OLD.user_id);
+END;
+'''
+
+ACTIVITY_LOG_INDEX = '''
+CREATE INDEX IF NOT EXISTS idx_activity_logs_created_at ON activity_logs(created_at);
+'''
+
+def _baseline(conn):
+    """Create anything in the baseline schema that is missing"""
+    with open(BASELINE_PATH) as f:
+        _script(conn, f.read())
+
+def _backfill(conn):
+    """Add the summary tables, search index and email queue, and fill them"""
+    for script in (SUMMARY_TABLES, LOG_SEARCH, EMAIL_QUEUE, KEYSET_INDEXES):
+        _script(conn, script)
+    
+    from models.attendance import Attendance
+    from models.notification import Notification
+    from models.weekly_log import WeeklyLog
+    
+    Attendance.rebuild_summary(conn)
+    Notification.rebuild_counters(conn)
+    WeeklyLog.rebuild_search_index(conn)
+
+def _indexes(conn):
+    _script(conn, PERFORMANCE_INDEXES)
+
+def _compliance(conn):
+    _script(conn, COMPLIANCE)
+
+def _directory(conn):
+    _script(conn, DIRECTORY)
+
+def _data_versions(conn):
+    _script(conn, DATA_VERSIONS)
+
+def _supervisor_index(conn):
+    _script(conn, SUPERVISOR_INDEX)
+
+def _attendance_marked_by(conn):
+    """Record who wrote each attendance mark; earlier auto-fills are recognisable"""
+    from models.attendance import AUTOFILL_REMARK, MARKERS
+    
+    _add_column(conn, 'attendance', 'marked_by',
+                f"TEXT CHECK(marked_by IN ({', '.join(repr(m) for m in MARKERS)}))")
+    conn.execute("UPDATE attendance SET marked_by = 'autofill' "
+                 'WHERE marked_by IS NULL AND remarks = ?', (AUTOFILL_REMARK,))
+
+def _user_changes(conn):
+    _script(conn, USER_CHANGES)
+
+def _activity_log_index(conn):
+    """Index for the created_at ranges of rollover_activity_logs() and archive_year()"""
+    _script(conn, ACTIVITY_LOG_INDEX)
+
+def _add_column(conn, table, column, declaration):
+    # ALTER TABLE has no IF NOT EXISTS, and schema.sql databases already have it
+    if column not in [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+def _script(conn, script):
+    # executescript() would commit, so run the statements one by one
+    for statement in _statements(script):
+        conn.execute(statement)
+
+def _statements(script):
+    """Split a SQL script into complete statements (triggers included)"""
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ''
+
+# (version, description, function taking a connection inside a transaction).
+# Released migrations are never edited: a schema change is a new entry here
+# plus the same change in schema.sql
+MIGRATIONS = [
+    (1, 'base schema', _baseline),
+    (2, 'summary tables, search index and email queue, backfilled', _backfill),
+    (3, 'performance index pack', _indexes),
+    (4, 'compliance run log', _compliance),
+    (5, 'directory change log', _directory),
+    (6, 'data version counters', _data_versions),
+    (7, 'supervisor index with status', _supervisor_index),
+    (8, 'attendance marked_by', _attendance_marked_by),
+    (9, 'user cache change log', _user_changes),
+    (10, 'activity log created_at index', _activity_log_index)
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+def current_version(conn):
+    """Last migration applied to the database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn, target=None):
+    """Apply pending migrations up to target, returns those applied"""
+    target = LATEST if target is None else target
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version > target or version <= current_version(conn):
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            apply(conn)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        applied.append((version, description))
+    
+    if applied:
+        conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    if conn.in_transaction:
+        conn.commit()
+    return applied
\ No newline at end of file
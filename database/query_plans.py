@@ -0,0 +1,103 @@
+"""
+Query plan check for the application's hot queries
+
+Runs EXPLAIN QUERY PLAN over the queries behind logins, dashboards, lists
+and exports and flags any that scan a whole table (or a whole index)
+instead of seeking. Run it after schema changes with flask check-queries.
+"""
+
+from models.reporting import ROLLUP_QUERY, page_query
+from utils.export import DATASETS, build_query
+from utils.pdf_generator import (ATTENDANCE_QUERY, EVALUATIONS_QUERY, LOGS_QUERY,
+                                 PLACEMENTS_QUERY, SUMMARY_ORDER)
+
+# (name, sql, params, scans that are expected, e.g. over CTEs)
+HOT_QUERIES = [
+    ('user by id', 'SELECT * FROM users WHERE id = ?', [1], ()),
+    ('user by email', 'SELECT * FROM users WHERE email = ?', ['a@b'], ()),
+    ('student profile', 'SELECT * FROM students WHERE user_id = ?', [1], ()),
+    ('hod profile', 'SELECT * FROM hods WHERE user_id = ?', [1], ()),
+    ('unread notification count',
+     'SELECT unread FROM notification_counters WHERE user_id = ?', [1], ()),
+    ('notifications page',
+     '''SELECT * FROM notifications WHERE user_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC LIMIT ?''', [1, '2025-01-01', 1, 21], ()),
+    ('unread notifications page',
+     '''SELECT * FROM notifications WHERE user_id = ? AND is_read = 0
+        ORDER BY created_at DESC, id DESC LIMIT ?''', [1, 21], ()),
+    ('students by department',
+     '''SELECT s.*, u.full_name, u.email, u.phone FROM students s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.department = ? AND (s.level, s.id) > (?, ?)
+        ORDER BY s.level, s.id LIMIT ?''', ['CS', '200', 1, 21], ()),
+    ('supervisor interns',
+     '''SELECT ip.*, u.full_name FROM internship_placements ip
+        JOIN students s ON ip.student_id = s.id
+        JOIN users u ON s.user_id = u.id
+        WHERE ip.supervisor_email = ? AND ip.status = ?
+        ORDER BY ip.start_date, ip.id LIMIT ?''', ['a@b', 'active', 21], ()),
+    ('hod placements',
+     '''SELECT * FROM internship_placements WHERE assigned_hod_id = ? AND status = ?''',
+     [1, 'active'], ()),
+    ('student weekly logs',
+     '''SELECT * FROM weekly_logs WHERE student_id = ?
+        ORDER BY week_number DESC, id DESC LIMIT ?''', [1, 11], ()),
+    ('placement weekly logs',
+     'SELECT * FROM weekly_logs WHERE placement_id = ? ORDER BY week_number', [1], ()),
+    ('placement attendance',
+     '''SELECT * FROM attendance WHERE placement_id = ? AND date BETWEEN ? AND ?
+        ORDER BY date''', [1, '2025-01-01', '2025-02-01'], ()),
+    ('student attendance summary',
+     'SELECT * FROM attendance_summary WHERE student_id = ?', [1], ()),
+    ('student evaluations',
+     'SELECT * FROM evaluations WHERE student_id = ? AND placement_id = ?', [1, 1], ()),
+    ('student uploads',
+     'SELECT * FROM file_uploads WHERE student_id = ? AND file_type = ?',
+     [1, 'document'], ()),
+    ('placement uploads',
+     '''SELECT * FROM file_uploads WHERE placement_id = ?
+        ORDER BY uploaded_at DESC, id DESC''', [1], ()),
+    ('weekly log search',
+     '''SELECT wl.id FROM weekly_logs_fts
+        JOIN weekly_logs wl ON wl.id = weekly_logs_fts.rowid
+        JOIN students s ON wl.student_id = s.id
+        WHERE weekly_logs_fts MATCH ? AND s.department = ?
+        ORDER BY rank LIMIT ?''', ['"x"', 'CS', 20], ()),
+    ('email queue claim',
+     '''SELECT id FROM email_queue
+        WHERE status = 'pending' AND next_attempt_at <= datetime('now')
+        ORDER BY next_attempt_at, id LIMIT ?''', [50], ()),
+    ('department rollup', ROLLUP_QUERY,
+     {'department': 'CS', 'level': None, 'today': '2025-01-01'}, ('c', 'l')),
+    ('department rollup page', page_query(2),
+     {'s0': 1, 's1': 2, 'today': '2025-01-01'}, ('c', 'l'))
+]
+
+for _dataset in DATASETS:
+    _sql, _, _params = build_query(_dataset, 'CS')
+    HOT_QUERIES.append((f'{_dataset} export', _sql, _params, ()))
+
+for _name, _sql in (('placements', PLACEMENTS_QUERY), ('attendance', ATTENDANCE_QUERY),
+                    ('logs', LOGS_QUERY), ('evaluations', EVALUATIONS_QUERY)):
+    HOT_QUERIES.append((f'department summary {_name}',
+                        _sql.format(where='s.department = ?', order=SUMMARY_ORDER), ['CS'], ()))
+
+def full_scans(plan, allowed=()):
+    """Plan lines that read a whole table or index"""
+    flagged = []
+    for line in plan:
+        if not line.startswith('SCAN '):
+            continue
+        name = line.split()[1]
+        if name in allowed or 'VIRTUAL TABLE' in line:
+            continue
+        flagged.append(line)
+    return flagged
+
+def check_query_plans(conn):
+    """Return [(name, plan lines, flagged lines)] for every hot query"""
+    results = []
+    for name, sql, params, allowed in HOT_QUERIES:
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        results.append((name, plan, full_scans(plan, allowed)))
+    return results
\ No newline at end of file
@@ -1,4 +1,7 @@
 -- Baze Internship Database System Schema
+--
+-- The full schema at the latest migration. Every change here also needs a
+-- migration in database/migrations.py (tests compare the two).
 
 -- Users table (base table for all user types)
 CREATE TABLE IF NOT EXISTS users (
@@ -75,6 +78,8 @@ CREATE TABLE IF NOT EXISTS attendance (
     check_out_time TIME,
     remarks TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Students may only change their own marks (models/attendance.py)
+    marked_by TEXT CHECK(marked_by IN ('student', 'supervisor', 'autofill')),
     FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
     FOREIGN KEY (placement_id) REFERENCES internship_placements(id) ON DELETE CASCADE,
     UNIQUE(student_id, date)
@@ -162,14 +167,366 @@ CREATE TABLE IF NOT EXISTS activity_logs (
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
+-- Outbound email queue (drained by utils.email workers)
+CREATE TABLE IF NOT EXISTS email_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipients TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    html TEXT,
+    status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'sending', 'sent', 'dead')),
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+-- One row per compliance check and week (models/compliance.py); the
+-- UNIQUE key makes a second run for the same week a no-op
+CREATE TABLE IF NOT EXISTS compliance_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    check_name TEXT NOT NULL,
+    period TEXT NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP,
+    duration_ms REAL,
+    placements INTEGER DEFAULT 0,
+    reminders INTEGER DEFAULT 0,
+    escalations INTEGER DEFAULT 0,
+    emails INTEGER DEFAULT 0,
+    UNIQUE (check_name, period)
+);
+
+-- Change counters per table and per student, department or supervisor,
+-- bumped by the model layer with each write (database/versions.py)
+CREATE TABLE IF NOT EXISTS data_versions (
+    entity TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- Attendance summary (one row per student per placement, kept in step with
+-- attendance by the triggers below so dashboards never scan attendance)
+CREATE TABLE IF NOT EXISTS attendance_summary (
+    student_id INTEGER NOT NULL,
+    placement_id INTEGER NOT NULL,
+    days_present INTEGER NOT NULL DEFAULT 0,
+    days_absent INTEGER NOT NULL DEFAULT 0,
+    days_late INTEGER NOT NULL DEFAULT 0,
+    days_excused INTEGER NOT NULL DEFAULT 0,
+    total_days INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (student_id, placement_id),
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (placement_id) REFERENCES internship_placements(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS attendance_summary_insert
+AFTER INSERT ON attendance
+BEGIN
+    INSERT INTO attendance_summary
+        (student_id, placement_id, days_present, days_absent, days_late, days_excused, total_days)
+    VALUES (
+        NEW.student_id, NEW.placement_id,
+        NEW.status = 'present', NEW.status = 'absent',
+        NEW.status = 'late', NEW.status = 'excused', 1
+    )
+    ON CONFLICT (student_id, placement_id) DO UPDATE SET
+        days_present = days_present + excluded.days_present,
+        days_absent = days_absent + excluded.days_absent,
+        days_late = days_late + excluded.days_late,
+        days_excused = days_excused + excluded.days_excused,
+        total_days = total_days + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attendance_summary_delete
+AFTER DELETE ON attendance
+BEGIN
+    UPDATE attendance_summary SET
+        days_present = days_present - (OLD.status = 'present'),
+        days_absent = days_absent - (OLD.status = 'absent'),
+        days_late = days_late - (OLD.status = 'late'),
+        days_excused = days_excused - (OLD.status = 'excused'),
+        total_days = total_days - 1
+    WHERE student_id = OLD.student_id AND placement_id = OLD.placement_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attendance_summary_update
+AFTER UPDATE OF status, student_id, placement_id ON attendance
+BEGIN
+    UPDATE attendance_summary SET
+        days_present = days_present - (OLD.status = 'present'),
+        days_absent = days_absent - (OLD.status = 'absent'),
+        days_late = days_late - (OLD.status = 'late'),
+        days_excused = days_excused - (OLD.status = 'excused'),
+        total_days = total_days - 1
+    WHERE student_id = OLD.student_id AND placement_id = OLD.placement_id;
+    
+    INSERT INTO attendance_summary
+        (student_id, placement_id, days_present, days_absent, days_late, days_excused, total_days)
+    VALUES (
+        NEW.student_id, NEW.placement_id,
+        NEW.status = 'present', NEW.status = 'absent',
+        NEW.status = 'late', NEW.status = 'excused', 1
+    )
+    ON CONFLICT (student_id, placement_id) DO UPDATE SET
+        days_present = days_present + excluded.days_present,
+        days_absent = days_absent + excluded.days_absent,
+        days_late = days_late + excluded.days_late,
+        days_excused = days_excused + excluded.days_excused,
+        total_days = total_days + 1;
+END;
+
+-- Unread notification counters (kept in step with notifications by the
+-- triggers below so the notification bell is a primary key lookup)
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id INTEGER PRIMARY KEY,
+    unread INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_insert
+AFTER INSERT ON notifications
+WHEN NEW.is_read = 0
+BEGIN
+    INSERT INTO notification_counters (user_id, unread) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET unread = unread + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_update
+AFTER UPDATE OF is_read ON notifications
+WHEN OLD.is_read != NEW.is_read
+BEGIN
+    INSERT INTO notification_counters (user_id, unread)
+    VALUES (NEW.user_id, CASE WHEN NEW.is_read = 0 THEN 1 ELSE 0 END)
+    ON CONFLICT (user_id) DO UPDATE SET
+        unread = MAX(0, unread + CASE WHEN NEW.is_read = 0 THEN 1 ELSE -1 END);
+END;
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_delete
+AFTER DELETE ON notifications
+WHEN OLD.is_read = 0
+BEGIN
+    UPDATE notification_counters SET unread = MAX(0, unread - 1)
+    WHERE user_id = OLD.user_id;
+END;
+
+-- Users whose directory entry changed, newest last (kept by the triggers
+-- below; utils/directory.py re-reads rows with a higher seq)
+CREATE TABLE IF NOT EXISTS directory_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER UNIQUE NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS directory_users_insert
+AFTER INSERT ON users
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_users_update
+AFTER UPDATE OF email, full_name, user_type, is_active ON users
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_users_delete
+AFTER DELETE ON users
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = OLD.id;
+    INSERT INTO directory_changes (user_id) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_students_insert
+AFTER INSERT ON students
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.user_id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_students_update
+AFTER UPDATE OF student_id, matriculation_number, department, level ON students
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.user_id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_supervisors_insert
+AFTER INSERT ON organization_supervisors
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.user_id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS directory_supervisors_update
+AFTER UPDATE OF organization_name, department ON organization_supervisors
+BEGIN
+    DELETE FROM directory_changes WHERE user_id = NEW.user_id;
+    INSERT INTO directory_changes (user_id) VALUES (NEW.user_id);
+END;
+
+-- Users whose cached record or profile changed, newest last (kept by the
+-- triggers below; models/user.py drops the cached entries of rows with a
+-- higher seq than it has seen)
+CREATE TABLE IF NOT EXISTS user_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER UNIQUE NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS user_changes_users_update
+AFTER UPDATE OF email, password_hash, full_name, phone, user_type, is_active ON users
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_users_delete
+AFTER DELETE ON users
+BEGIN
+    DELETE FROM user_changes WHERE user_id = OLD.id;
+    INSERT INTO user_changes (user_id) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_students_insert
+AFTER INSERT ON students
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_students_update
+AFTER UPDATE ON students
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_students_delete
+AFTER DELETE ON students
+BEGIN
+    DELETE FROM user_changes WHERE user_id = OLD.user_id;
+    INSERT INTO user_changes (user_id) VALUES (OLD.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_hods_insert
+AFTER INSERT ON hods
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_hods_update
+AFTER UPDATE ON hods
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_hods_delete
+AFTER DELETE ON hods
+BEGIN
+    DELETE FROM user_changes WHERE user_id = OLD.user_id;
+    INSERT INTO user_changes (user_id) VALUES (OLD.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_organization_supervisors_insert
+AFTER INSERT ON organization_supervisors
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_organization_supervisors_update
+AFTER UPDATE ON organization_supervisors
+BEGIN
+    DELETE FROM user_changes WHERE user_id = NEW.user_id;
+    INSERT INTO user_changes (user_id) VALUES (NEW.user_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_changes_organization_supervisors_delete
+AFTER DELETE ON organization_supervisors
+BEGIN
+    DELETE FROM user_changes WHERE user_id = OLD.user_id;
+    INSERT INTO user_changes (user_id) VALUES (OLD.user_id);
+END;
+
+-- Full-text index over weekly log text (external content: only the index is
+-- stored, the text stays in weekly_logs; kept in step by the triggers below)
+CREATE VIRTUAL TABLE IF NOT EXISTS weekly_logs_fts USING fts5(
+    activities, skills_learned, challenges, supervisor_comment, hod_comment,
+    content='weekly_logs', content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS weekly_logs_fts_insert
+AFTER INSERT ON weekly_logs
+BEGIN
+    INSERT INTO weekly_logs_fts
+        (rowid, activities, skills_learned, challenges, supervisor_comment, hod_comment)
+    VALUES
+        (NEW.id, NEW.activities, NEW.skills_learned, NEW.challenges,
+         NEW.supervisor_comment, NEW.hod_comment);
+END;
+
+CREATE TRIGGER IF NOT EXISTS weekly_logs_fts_delete
+AFTER DELETE ON weekly_logs
+BEGIN
+    INSERT INTO weekly_logs_fts
+        (weekly_logs_fts, rowid, activities, skills_learned, challenges,
+         supervisor_comment, hod_comment)
+    VALUES
+        ('delete', OLD.id, OLD.activities, OLD.skills_learned, OLD.challenges,
+         OLD.supervisor_comment, OLD.hod_comment);
+END;
+
+-- Status and date changes do not touch the index
+CREATE TRIGGER IF NOT EXISTS weekly_logs_fts_update
+AFTER UPDATE OF id, activities, skills_learned, challenges, supervisor_comment, hod_comment
+ON weekly_logs
+BEGIN
+    INSERT INTO weekly_logs_fts
+        (weekly_logs_fts, rowid, activities, skills_learned, challenges,
+         supervisor_comment, hod_comment)
+    VALUES
+        ('delete', OLD.id, OLD.activities, OLD.skills_learned, OLD.challenges,
+         OLD.supervisor_comment, OLD.hod_comment);
+    INSERT INTO weekly_logs_fts
+        (rowid, activities, skills_learned, challenges, supervisor_comment, hod_comment)
+    VALUES
+        (NEW.id, NEW.activities, NEW.skills_learned, NEW.challenges,
+         NEW.supervisor_comment, NEW.hod_comment);
+END;
+
 -- Create indexes for better performance
-CREATE INDEX idx_students_department ON students(department);
-CREATE INDEX idx_placements_student ON internship_placements(student_id);
-CREATE INDEX idx_placements_status ON internship_placements(status);
-CREATE INDEX idx_attendance_student_date ON attendance(student_id, date);
-CREATE INDEX idx_weekly_logs_student ON weekly_logs(student_id);
-CREATE INDEX idx_notifications_user ON notifications(user_id, is_read);
-CREATE INDEX idx_activity_logs_user ON activity_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_placements_student ON internship_placements(student_id);
+CREATE INDEX IF NOT EXISTS idx_placements_status ON internship_placements(status);
+CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id, is_read);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_user ON activity_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_created_at ON activity_logs(created_at);
+
+-- Keyset pagination indexes (equality filters first, then the sort key)
+CREATE INDEX IF NOT EXISTS idx_students_department_level ON students(department, level);
+CREATE INDEX IF NOT EXISTS idx_placements_supervisor ON internship_placements(supervisor_email, status, start_date);
+CREATE INDEX IF NOT EXISTS idx_weekly_logs_student_week ON weekly_logs(student_id, week_number);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id, created_at) WHERE is_read = 0;
+
+-- Lookups by placement, HOD and upload type
+CREATE INDEX IF NOT EXISTS idx_weekly_logs_placement_week ON weekly_logs(placement_id, week_number);
+CREATE INDEX IF NOT EXISTS idx_evaluations_placement ON evaluations(placement_id);
+CREATE INDEX IF NOT EXISTS idx_evaluations_student_placement ON evaluations(student_id, placement_id);
+CREATE INDEX IF NOT EXISTS idx_file_uploads_student_type ON file_uploads(student_id, file_type);
+CREATE INDEX IF NOT EXISTS idx_file_uploads_placement ON file_uploads(placement_id, uploaded_at);
+CREATE INDEX IF NOT EXISTS idx_placements_hod_status ON internship_placements(assigned_hod_id, status);
+CREATE INDEX IF NOT EXISTS idx_attendance_placement_date ON attendance(placement_id, date);
+
+-- Only messages still waiting to be sent are indexed
+CREATE INDEX IF NOT EXISTS idx_email_queue_due ON email_queue(next_attempt_at) WHERE status = 'pending';
+
+-- Submitted logs waiting for review, oldest first
+CREATE INDEX IF NOT EXISTS idx_weekly_logs_submitted ON weekly_logs(submitted_at) WHERE status = 'submitted';
 
 -- Create views for common queries
 CREATE VIEW IF NOT EXISTS active_internships AS
@@ -185,16 +542,18 @@ JOIN students s ON ip.student_id = s.id
 JOIN users u ON s.user_id = u.id
 WHERE ip.status = 'active';
 
-CREATE VIEW IF NOT EXISTS student_attendance_summary AS
+DROP VIEW IF EXISTS student_attendance_summary;
+CREATE VIEW student_attendance_summary AS
 SELECT 
     s.id as student_id,
     s.student_id as student_number,
     u.full_name,
-    COUNT(CASE WHEN a.status = 'present' THEN 1 END) as days_present,
-    COUNT(CASE WHEN a.status = 'absent' THEN 1 END) as days_absent,
-    COUNT(CASE WHEN a.status = 'late' THEN 1 END) as days_late,
-    COUNT(a.id) as total_days
+    COALESCE(SUM(sa.days_present), 0) as days_present,
+    COALESCE(SUM(sa.days_absent), 0) as days_absent,
+    COALESCE(SUM(sa.days_late), 0) as days_late,
+    COALESCE(SUM(sa.days_excused), 0) as days_excused,
+    COALESCE(SUM(sa.total_days), 0) as total_days
 FROM students s
 JOIN users u ON s.user_id = u.id
-LEFT JOIN attendance a ON s.id = a.student_id
+LEFT JOIN attendance_summary sa ON s.id = sa.student_id
 GROUP BY s.id;
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""
+Per-request SQL instrumentation
+
+Pooled connections are TracedConnections. A sampled request (a share
+SQL_TRACE_SAMPLE_RATE of them) hangs a RequestTrace on the connections it
+takes from get_db(), get_read_db() and db_manager.transaction(), and
+their cursors then time every execute and fetch, which costs two
+perf_counter() calls and a list append per statement. When the request
+ends its statements go into the per-endpoint histograms and a
+Server-Timing header, and those slower than SQL_SLOW_QUERY_MS are counted
+and logged with their SQL normalized. SQL_SLOW_QUERY_ALL_REQUESTS times
+every request for the slow query log, sampled or not. Other requests, and
+connections used outside a request, have no trace and hand out plain
+sqlite3 cursors.
+"""
+
+import functools
+import heapq
+import logging
+import random
+import re
+import sqlite3
+import time
+from flask import current_app, g, request
+from werkzeug.local import LocalProxy
+from utils.metrics import Counter, Histogram, counter, gauge, render_prometheus
+
+logger = logging.getLogger(__name__)
+
+_COMMENT = re.compile(r'--[^\n]*')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Collapse a statement to one line with its literals replaced by ?"""
+    sql = _COMMENT.sub(' ', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?, ...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+class RequestTrace:
+    """Statements run during one request, as [sql, seconds] entries"""
+    
+    __slots__ = ('statements', 'sampled')
+    
+    def __init__(self, sampled=False):
+        self.statements = []
+        self.sampled = sampled
+    
+    def statement(self, sql):
+        entry = [sql, 0.0]
+        self.statements.append(entry)
+        return entry
+    
+    @property
+    def count(self):
+        return len(self.statements)
+    
+    @property
+    def db_time(self):
+        return sum(seconds for _, seconds in self.statements)
+    
+    def slowest(self, n=5):
+        return heapq.nlargest(n, self.statements, key=lambda entry: entry[1])
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that adds execute and fetch time to the connection's trace
+    
+    Rows read by iterating the cursor directly are not timed.
+    """
+    
+    _entry = None
+    
+    def _start(self, sql):
+        trace = self.connection.trace
+        self._entry = trace.statement(sql) if trace is not None else None
+    
+    def _timed(self, method, *args):
+        entry = self._entry
+        if entry is None:
+            return method(*args)
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            entry[1] += time.perf_counter() - start
+    
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        return self._timed(super().execute, sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        return self._timed(super().executemany, sql, seq_of_parameters)
+    
+    def fetchone(self):
+        return self._timed(super().fetchone)
+    
+    def fetchmany(self, size=None):
+        return self._timed(super().fetchmany, self.arraysize if size is None else size)
+    
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+class TracedConnection(sqlite3.Connection):
+    """Connection that hands out TracedCursors while a trace is attached"""
+    
+    trace = None
+    
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = TracedCursor if self.trace is not None else sqlite3.Cursor
+        return super().cursor(factory)
+    
+    # Connection.execute() would bypass the cursor subclass's methods
+    def execute(self, sql, parameters=()):
+        if self.trace is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        if self.trace is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class SQLTracer:
+    """Samples requests, aggregates their SQL timings and serves /metrics data"""
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.sample_rate = 0.0
+        self.slow_query = 0.1
+        self.slowest = 5
+        self.server_timing = True
+        self.slow_query_all = False
+        labels = ('blueprint', 'endpoint')
+        self.request_time = Histogram(
+            'bids_request_duration_seconds', 'Request handling time.', labels)
+        self.db_time = Histogram(
+            'bids_request_db_seconds', 'Time spent in SQLite per sampled request.', labels)
+        self.queries = Histogram(
+            'bids_request_queries', 'SQL statements per sampled request.', labels,
+            buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+        self.slow_queries = Counter(
+            'bids_slow_queries_total', 'Statements slower than SQL_SLOW_QUERY_MS.', labels)
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        self.sample_rate = app.config.get('SQL_TRACE_SAMPLE_RATE', 0.0)
+        self.slow_query = app.config.get('SQL_SLOW_QUERY_MS', 100) / 1000
+        self.slowest = app.config.get('SQL_SLOWEST_PER_REQUEST', 5)
+        self.server_timing = app.config.get('SQL_SERVER_TIMING', True)
+        self.slow_query_all = app.config.get('SQL_SLOW_QUERY_ALL_REQUESTS', False)
+        app.extensions['sql_tracer'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+    
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        rate = self.sample_rate
+        sampled = rate >= 1 or (rate > 0 and random.random() < rate)
+        if sampled or self.slow_query_all:
+            g.sql_trace = RequestTrace(sampled)
+    
+    def _after_request(self, response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        # Endpoints rather than paths keep the label set bounded
+        labels = (request.blueprint or 'app', request.endpoint or 'unmatched')
+        self.request_time.observe(elapsed, *labels)
+        
+        trace = g.pop('sql_trace', None)
+        if trace is None:
+            return response
+        for sql, seconds in trace.statements:
+            if seconds >= self.slow_query:
+                self.slow_queries.inc(*labels)
+                logger.warning('Slow query (%.1f ms) in %s: %s',
+                               seconds * 1000, labels[1], normalize_sql(sql))
+        if not trace.sampled:
+            return response
+        
+        db_time = trace.db_time
+        self.db_time.observe(db_time, *labels)
+        self.queries.observe(trace.count, *labels)
+        if logger.isEnabledFor(logging.DEBUG) and trace.count:
+            slowest = '; '.join(f'{seconds * 1000:.1f} ms {normalize_sql(sql)[:120]}'
+                                for sql, seconds in trace.slowest(self.slowest))
+            logger.debug('%s %s: %d queries, %.1f ms in SQLite. Slowest: %s',
+                         request.method, request.path, trace.count, db_time * 1000, slowest)
+        
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={db_time * 1000:.2f};desc="{trace.count} queries", '
+                f'app;dur={elapsed * 1000:.2f}')
+        return response
+    
+    def render(self):
+        """This worker's metrics in Prometheus text format"""
+        groups = [self.request_time.render(), self.db_time.render(),
+                  self.queries.render(), self.slow_queries.render()]
+        manager = self.app.extensions.get('db_manager') if self.app else None
+        if manager is not None:
+            stats = manager.stats()
+            for key, help in (('open', 'Open pooled connections.'),
+                              ('idle', 'Idle pooled connections.')):
+                groups.append(gauge(f'bids_db_pool_{key}', help,
+                                    [([('pool', pool)], stats[pool][key]) for pool in stats]))
+            for key, name, help in (
+                    ('hits', 'hits_total', 'Acquires served by an idle connection.'),
+                    ('misses', 'misses_total', 'Acquires that opened a new connection.'),
+                    ('waits', 'waits_total', 'Acquires that waited for a connection.'),
+                    ('wait_time', 'wait_seconds_total', 'Time spent waiting for a connection.')):
+                groups.append(counter(f'bids_db_pool_{name}', help,
+                                      [([('pool', pool)], stats[pool][key]) for pool in stats]))
+        fragments = self.app.extensions.get('fragment_cache') if self.app else None
+        if fragments is not None:
+            groups.extend(fragments.metrics())
+        groups.extend(self._user_metrics())
+        return render_prometheus(*groups)
+    
+    def _user_metrics(self):
+        # Imported here: models.user depends on the connection module, which imports this one
+        from models.user import User
+        from utils.auth import login_latency, login_stats
+        
+        caches = User.cache_stats()
+        groups = [
+            counter(f'bids_user_cache_{key}_total', help,
+                    [([('cache', name)], caches[name][key]) for name in caches])
+            for key, help in (('hits', 'User cache lookups served from memory.'),
+                              ('misses', 'User cache lookups that went to the database.'))
+        ]
+        groups.append(login_latency.render('bids_login_duration_seconds',
+                                           'Login time over the most recent logins.'))
+        logins = login_stats()
+        verifier = logins['verifier']
+        groups.append(gauge('bids_login_verifier_in_flight',
+                            'Password checks running or queued.', [([], verifier['in_flight'])]))
+        groups.append(gauge('bids_last_login_pending', 'last_login updates not yet written.',
+                            [([], logins['last_login_pending'])]))
+        groups.append(counter('bids_login_rejected_total',
+                              'Logins turned away because the verifier queue was full.',
+                              [([], verifier['rejected'])]))
+        return groups
+
+# The current app's tracer (create_app() makes one per app)
+sql_tracer = LocalProxy(lambda: current_app.extensions['sql_tracer'])
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+Per-entity data versions
+
+data_versions holds change counters for the tables dashboards are built
+from ('students' also covers the student's name and email in users). The
+model layer bumps them in the same transaction as its writes:
+
+- '<table>' for the whole table (bulk jobs, imports, archiving);
+- '<table>:student:<id>', '<table>:department:<name>' and
+  '<table>:supervisor:<email>' for the rows of one student, and of the
+  department and supervisors that student belongs to.
+
+Caches put the counters they depend on into their keys (see
+utils/fragments.py), so a write makes stale entries unreachable instead of
+having to find and delete them. Counters only ever go up.
+"""
+
+TABLES = ('students', 'attendance', 'weekly_logs', 'evaluations', 'internship_placements')
+
+SCOPES = ('student', 'department', 'supervisor')
+
+def entity(table, scope=None, value=None):
+    """Counter name for a table, or for one student, department or supervisor's rows"""
+    if table not in TABLES:
+        raise ValueError(f'Untracked table: {table}')
+    if scope is None:
+        return table
+    if scope not in SCOPES:
+        raise ValueError(f'Unknown scope: {scope}')
+    return f'{table}:{scope}:{value}'
+
+def entities(scope, value, tables=TABLES):
+    """Table-wide and scoped counter names a view of one scope depends on"""
+    names = []
+    for table in tables:
+        names += [entity(table), entity(table, scope, value)]
+    return names
+
+def bump(conn, table, student_ids=None):
+    """Move the counters for a write to table, in the caller's transaction
+    
+    With student_ids only those students' counters move, along with their
+    departments' and their placements' supervisors'. Without them the
+    table-wide counter moves, which every view of the table depends on.
+    """
+    if student_ids is None:
+        conn.execute(
+            '''INSERT INTO data_versions (entity, version) VALUES (?, 1)
+               ON CONFLICT (entity) DO UPDATE SET version = version + 1''',
+            (entity(table),))
+        return
+    
+    student_ids = sorted(set(student_ids))
+    if not student_ids:
+        return
+    marks = ', '.join('?' * len(student_ids))
+    prefix = entity(table)
+    conn.execute(
+        f'''INSERT INTO data_versions (entity, version)
+            SELECT name, 1 FROM (
+                SELECT ? || ':student:' || id AS name FROM students WHERE id IN ({marks})
+                UNION
+                SELECT ? || ':department:' || department FROM students
+                WHERE id IN ({marks}) AND department IS NOT NULL
+                UNION
+                SELECT ? || ':supervisor:' || supervisor_email FROM internship_placements
+                WHERE student_id IN ({marks})
+            ) WHERE true
+            ON CONFLICT (entity) DO UPDATE SET version = version + 1''',
+        [prefix, *student_ids] * 3)
+
+def current(db, names):
+    """Current counters for names, in order (0 for ones never bumped)"""
+    names = list(names)
+    marks = ', '.join('?' * len(names))
+    found = dict(db.execute(
+        f'SELECT entity, version FROM data_versions WHERE entity IN ({marks})',
+        names).fetchall())
+    return tuple(found.get(name, 0) for name in names)
\ No newline at end of file
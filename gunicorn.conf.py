@@ -0,0 +1,39 @@
+"""
+Gunicorn settings
+
+The app is imported once in the master (preload_app) and workers are
+forked from it, so modules, blueprints, config and compiled templates are
+shared copy-on-write instead of being rebuilt by every worker. Nothing in
+app import opens a database connection or starts a thread; pools and
+executors are created by each worker on first use.
+    
+    gunicorn wsgi:app
+"""
+
+import gc
+import os
+import random
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '2'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))  # 0 = never recycle
+max_requests_jitter = max_requests // 10
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from app import warm_up
+    warm_up(server.app.wsgi())
+    # Objects made so far live for the life of the process. Moving them out
+    # of the collector's reach stops gc passes in the workers from touching
+    # (and so copying) the pages they sit on.
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Forked workers would otherwise share the master's random state, and
+    # with it the SQL trace sampling and retry jitter sequences
+    random.seed()
\ No newline at end of file
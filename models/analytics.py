@@ -0,0 +1,305 @@
+"""
+Evaluation analytics for HOD dashboards
+
+All evaluations of an academic year (placements starting in it, archived
+years included) are read with one query and turned into NumPy columns: a
+float matrix of the six scores (NaN where left blank) and integer codes for
+department, level, organization and evaluator type. Score distributions,
+organization averages, HOD/supervisor gaps, percentile ranks and criterion
+correlations are then whole-array operations (bincount, nanpercentile,
+searchsorted, corrcoef) rather than Python loops over rows.
+
+A year's columns, and the reports built from them, are cached per worker.
+Evaluation writes drop the year in the writing worker and bump a shared
+epoch file, so the other workers start over on their next lookup.
+"""
+
+import threading
+import time
+import warnings
+from datetime import date
+import numpy as np
+from flask import current_app
+from config import Config
+from database.archive import academic_year, archive_years, history, parse_year
+from database.connection import get_read_db
+from models.evaluation import CRITERIA
+from utils.cache import LRUCache, SharedEpoch
+
+LABELS = ('Punctuality', 'Communication', 'Professionalism', 'Technical skills',
+          'Initiative', 'Overall')
+
+# {prefix} is 'all_' when the year has been archived (history() views)
+SCORES_QUERY = '''
+SELECT e.placement_id, e.student_id, e.evaluator_type = 'hod',
+       COALESCE(s.department, ''), COALESCE(s.level, ''), COALESCE(ip.organization_name, ''),
+       {criteria}
+FROM {prefix}evaluations e
+JOIN {prefix}internship_placements ip ON ip.id = e.placement_id
+JOIN students s ON s.id = e.student_id
+WHERE ip.start_date >= :start AND ip.start_date < :end
+'''.replace('{criteria}', ', '.join(f'e.{criterion}' for criterion in CRITERIA))
+
+# Per-worker score tables: academic year -> ScoreTable
+_tables = LRUCache(maxsize=Config.ANALYTICS_CACHE_SIZE, ttl=Config.ANALYTICS_CACHE_TTL)
+_epoch = SharedEpoch(Config.ANALYTICS_EPOCH_FILE)
+
+def year_of(start_date):
+    """Academic year of a placement start date (date or ISO string)"""
+    if isinstance(start_date, str):
+        start_date = date.fromisoformat(start_date[:10])
+    return academic_year(start_date)
+
+def _list(values, digits=2):
+    """An array as JSON-ready (nested) lists, NaN as None"""
+    values = np.round(np.asarray(values, dtype=float), digits)
+    return np.where(np.isnan(values), None, values).tolist()
+
+def _group_means(groups, scores, size):
+    """Mean of each criterion per group code, and the scores behind each mean"""
+    criteria = scores.shape[1]
+    valid = ~np.isnan(scores)
+    index = (groups[:, None] * criteria + np.arange(criteria)).ravel()
+    sums = np.bincount(index, weights=np.where(valid, scores, 0).ravel(),
+                       minlength=size * criteria)
+    counts = np.bincount(index, weights=valid.ravel().astype(float),
+                         minlength=size * criteria)
+    return (sums / counts).reshape(size, criteria), counts.reshape(size, criteria)
+
+def _series(matrix, digits=2):
+    """One chart series per criterion from a (group x criterion) matrix"""
+    return [{'name': label, 'data': _list(matrix[:, i], digits)}
+            for i, label in enumerate(LABELS)]
+
+class ScoreTable:
+    """One academic year's evaluation scores as NumPy columns"""
+    
+    def __init__(self, year, rows):
+        self.year = year
+        columns = list(zip(*rows)) or [()] * (6 + len(CRITERIA))
+        self.placement = np.array(columns[0], dtype=np.int64)
+        self.student = np.array(columns[1], dtype=np.int64)
+        self.by_hod = np.array(columns[2], dtype=np.int64)
+        self.departments, self.department = np.unique(np.array(columns[3], dtype=str),
+                                                      return_inverse=True)
+        self.levels, self.level = np.unique(np.array(columns[4], dtype=str),
+                                            return_inverse=True)
+        self.organizations, self.organization = np.unique(np.array(columns[5], dtype=str),
+                                                          return_inverse=True)
+        self.scores = np.array(columns[6:], dtype=float).T.reshape(-1, len(CRITERIA))
+        self.reports = {}
+        self.loaded_at = time.time()
+    
+    @classmethod
+    def load(cls, year):
+        """Read a year's evaluations in one query"""
+        start, end = parse_year(year)
+        params = {'start': start.isoformat(), 'end': end.isoformat()}
+        archive_dir = current_app.config['ARCHIVE_DIR']
+        if year in archive_years(archive_dir):
+            with history(current_app.extensions['db_manager'], archive_dir) as conn:
+                rows = conn.execute(SCORES_QUERY.format(prefix='all_'), params).fetchall()
+        else:
+            rows = get_read_db().execute(SCORES_QUERY.format(prefix=''), params).fetchall()
+        return cls(year, rows)
+    
+    def report(self, department=None, min_group=3):
+        """Chart data for the year, or one department of it (cached)"""
+        key = (department, min_group)
+        report = self.reports.get(key)
+        if report is None:
+            if department is None:
+                mask = np.ones(len(self.placement), dtype=bool)
+            else:
+                codes = np.nonzero(self.departments == department)[0]
+                mask = self.department == (codes[0] if len(codes) else -1)
+            # All-NaN slices and empty groups come out as NaN (None in JSON)
+            with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+                warnings.simplefilter('ignore', RuntimeWarning)
+                report = self._build(mask, min_group)
+            report.update(year=self.year, department=department)
+            self.reports[key] = report
+        return report
+    
+    def _build(self, mask, min_group):
+        scores = self.scores[mask]
+        placements, placement = np.unique(self.placement[mask], return_inverse=True)
+        _, first = np.unique(placement, return_index=True)
+        return {
+            'evaluations': len(scores),
+            'placements': len(placements),
+            'criteria': list(LABELS),
+            'distribution': self._distribution(scores),
+            'levels': self._levels(self.level[mask], scores),
+            'organizations': self._organizations(self.organization[mask], placement, first,
+                                                 scores, min_group),
+            'gaps': self._gaps(placement, len(placements), self.by_hod[mask], scores),
+            'ranks': self._ranks(placements, placement, first, self.student[mask],
+                                 self.level[mask], scores),
+            'correlations': self._correlations(scores),
+            'generated_at': time.time()
+        }
+    
+    @staticmethod
+    def _distribution(scores):
+        """How often each score (1-5) was given per criterion, with quartiles"""
+        valid = ~np.isnan(scores)
+        criterion = np.nonzero(valid)[1]
+        counts = np.bincount(criterion * 5 + scores[valid].astype(np.int64) - 1,
+                             minlength=len(CRITERIA) * 5).reshape(len(CRITERIA), 5)
+        quartiles = (np.nanpercentile(scores, [25, 50, 75], axis=0) if len(scores)
+                     else np.full((3, len(CRITERIA)), np.nan))
+        return {
+            'labels': ['1', '2', '3', '4', '5'],
+            'series': [{'name': label, 'data': counts[i].tolist()}
+                       for i, label in enumerate(LABELS)],
+            'responses': valid.sum(axis=0).tolist(),
+            'mean': _list(np.nanmean(scores, axis=0)),
+            'p25': _list(quartiles[0]),
+            'median': _list(quartiles[1]),
+            'p75': _list(quartiles[2])
+        }
+    
+    def _levels(self, level, scores):
+        """Average of each criterion per student level"""
+        means, counts = _group_means(level, scores, len(self.levels))
+        present = np.nonzero(counts.any(axis=1))[0]
+        return {
+            'labels': self.levels[present].tolist(),
+            'series': _series(means[present]),
+            'evaluations': np.bincount(level, minlength=len(self.levels))[present].tolist()
+        }
+    
+    def _organizations(self, organization, placement, first, scores, min_group):
+        """Average of each criterion per organization, best overall first
+        
+        Organizations with fewer than min_group evaluations are left out.
+        """
+        present, group = np.unique(organization, return_inverse=True)
+        means, _ = _group_means(group, scores, len(present))
+        evaluations = np.bincount(group, minlength=len(present))
+        placements = np.bincount(group[first], minlength=len(present))
+        keep = np.nonzero(evaluations >= min_group)[0]
+        overall = np.nan_to_num(means[keep, -1], nan=0.0)
+        order = keep[np.lexsort((keep, -overall))]
+        return {
+            'labels': self.organizations[present[order]].tolist(),
+            'series': _series(means[order]),
+            'evaluations': evaluations[order].tolist(),
+            'placements': placements[order].tolist(),
+            'min_evaluations': min_group
+        }
+    
+    @staticmethod
+    def _gaps(placement, size, by_hod, scores):
+        """HOD minus supervisor score per placement where both have rated it
+        
+        Several evaluations by the same side are averaged first.
+        """
+        means, _ = _group_means(placement * 2 + by_hod, scores, size * 2)
+        means = means.reshape(size, 2, len(CRITERIA))
+        supervisor, hod = means[:, 0], means[:, 1]
+        gap = hod - supervisor
+        paired = ~np.isnan(gap)
+        hod = np.where(paired, hod, np.nan)
+        supervisor = np.where(paired, supervisor, np.nan)
+        hod_mean = np.nanmean(hod, axis=0)
+        supervisor_mean = np.nanmean(supervisor, axis=0)
+        
+        # Pearson r per criterion over the paired placements
+        x = hod - hod_mean
+        y = supervisor - supervisor_mean
+        r = np.nansum(x * y, axis=0) / np.sqrt(np.nansum(x * x, axis=0) * np.nansum(y * y, axis=0))
+        
+        overall = gap[paired[:, -1], -1]
+        histogram = np.bincount(np.clip(np.rint(overall), -4, 4).astype(np.int64) + 4,
+                                minlength=9)
+        return {
+            'labels': list(LABELS),
+            'series': [
+                {'name': 'HOD', 'data': _list(hod_mean)},
+                {'name': 'Supervisor', 'data': _list(supervisor_mean)},
+                {'name': 'Gap', 'data': _list(np.nanmean(gap, axis=0))}
+            ],
+            'mean_absolute_gap': _list(np.nanmean(np.abs(gap), axis=0)),
+            'correlation': _list(r, 3),
+            'pairs': paired.sum(axis=0).tolist(),
+            'overall_gap': {'labels': [str(n) for n in range(-4, 5)], 'data': histogram.tolist()}
+        }
+    
+    def _ranks(self, placements, placement, first, student, level, scores):
+        """Percentile rank of each placement's average score within the cohort
+        
+        The rank is the share of placements scoring lower, counting ties as
+        half, so equal scores share a percentile.
+        """
+        valid = ~np.isnan(scores)
+        sums = np.bincount(placement, weights=np.where(valid, scores, 0).sum(axis=1),
+                           minlength=len(placements))
+        counts = np.bincount(placement, weights=valid.sum(axis=1), minlength=len(placements))
+        average = sums / counts
+        rated = np.nonzero(~np.isnan(average))[0]
+        ordered = np.sort(average[rated])
+        below = np.searchsorted(ordered, average[rated], side='left')
+        upto = np.searchsorted(ordered, average[rated], side='right')
+        percentile = 100.0 * (below + upto) / 2 / max(len(ordered), 1)
+        deciles = (np.percentile(ordered, np.arange(10, 100, 10)) if len(ordered)
+                   else np.full(9, np.nan))
+        order = rated[np.argsort(-average[rated], kind='stable')]
+        rank = np.empty(len(placements))
+        rank[rated] = percentile
+        return {
+            'placement_id': placements[order].tolist(),
+            'student_id': student[first][order].tolist(),
+            'level': self.levels[level[first][order]].tolist(),
+            'score': _list(average[order]),
+            'percentile': _list(rank[order], 1),
+            'deciles': {'labels': [f'p{n}' for n in range(10, 100, 10)], 'data': _list(deciles)}
+        }
+    
+    @staticmethod
+    def _correlations(scores):
+        """Correlation matrix of the criteria over fully scored evaluations"""
+        complete = scores[~np.isnan(scores).any(axis=1)]
+        matrix = (np.corrcoef(complete, rowvar=False) if len(complete) > 1
+                  else np.full((len(CRITERIA), len(CRITERIA)), np.nan))
+        return {'labels': list(LABELS), 'matrix': _list(matrix, 3),
+                'evaluations': len(complete)}
+
+class EvaluationAnalytics:
+    """Cached evaluation analytics per academic year"""
+    
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def report(year=None, department=None):
+        """Chart-ready analytics for a year (the current one by default)
+        
+        Reports are shared between requests and must not be modified.
+        """
+        year = year or current_app.config['ACADEMIC_YEAR']
+        parse_year(year)
+        if _epoch.changed():
+            _tables.clear()
+        table = _tables.get(year)
+        if table is None:
+            # One load per year at a time; other requests wait for it
+            with EvaluationAnalytics._lock:
+                table = _tables.get(year)
+                if table is None:
+                    table = ScoreTable.load(year)
+                    _tables.set(year, table)
+        return table.report(department, current_app.config.get('ANALYTICS_MIN_GROUP', 3))
+    
+    @staticmethod
+    def invalidate(year=None):
+        """Drop a year's analytics (or all) in this worker and signal the others"""
+        if year is None:
+            _tables.clear()
+        else:
+            _tables.invalidate(year)
+        _epoch.bump()
+    
+    @staticmethod
+    def cache_stats():
+        return _tables.stats()
\ No newline at end of file
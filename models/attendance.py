@@ -0,0 +1,283 @@
+"""
+Attendance model and attendance summaries
+"""
+
+import re
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+from flask import current_app
+from database import versions
+from database.connection import get_read_db
+
+STATUSES = ('present', 'absent', 'late', 'excused')
+# Who wrote a mark; students may only change marks they wrote themselves
+MARKERS = ('student', 'supervisor', 'autofill')
+MAX_GRID_CELLS = 2000
+AUTOFILL_REMARK = 'Auto-filled: no attendance recorded'
+
+_TIME = re.compile(r'^([01]\d|2[0-3]):[0-5]\d(:[0-5]\d)?$')
+
+# result is 'inserted', 'updated', 'unchanged' or 'rejected' (with a message)
+CellResult = namedtuple('CellResult', 'student_id date status result message')
+
+# Omitted times and remarks keep their stored values, so a student can
+# check in and later check out with two submissions for the same day
+UPSERT = '''
+INSERT INTO attendance
+    (student_id, placement_id, date, status, check_in_time, check_out_time, remarks, marked_by)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (student_id, date) DO UPDATE SET
+    placement_id = excluded.placement_id,
+    status = excluded.status,
+    check_in_time = COALESCE(excluded.check_in_time, check_in_time),
+    check_out_time = COALESCE(excluded.check_out_time, check_out_time),
+    remarks = COALESCE(excluded.remarks, remarks),
+    marked_by = excluded.marked_by
+'''
+
+# Every weekday of each placement in the window, generated in SQL; days
+# that already have a mark are left alone by ON CONFLICT
+AUTOFILL = '''
+WITH RECURSIVE days(student_id, placement_id, day, last_day) AS (
+    SELECT ip.student_id, ip.id,
+           MAX(ip.start_date, COALESCE(:since, ip.start_date)),
+           MIN(ip.end_date, :through)
+    FROM internship_placements ip
+    WHERE ip.status IN ('active', 'completed')
+      AND ip.start_date <= :through
+      AND (:since IS NULL OR ip.end_date >= :since)
+      AND (:department IS NULL OR ip.student_id IN
+           (SELECT id FROM students WHERE department = :department))
+    UNION ALL
+    SELECT student_id, placement_id, date(day, '+1 day'), last_day
+    FROM days
+    WHERE day < last_day
+)
+INSERT INTO attendance (student_id, placement_id, date, status, remarks, marked_by)
+SELECT student_id, placement_id, day, 'absent', :remarks, 'autofill'
+FROM days
+WHERE strftime('%w', day) NOT IN ('0', '6')
+ON CONFLICT (student_id, date) DO NOTHING
+'''
+
+def expand_grid(dates, marks):
+    """Turn {student_id: [status per date]} into cells; blank entries are skipped"""
+    if not isinstance(dates, list) or not isinstance(marks, dict):
+        raise ValueError('dates must be a list and marks an object')
+    cells = []
+    for student_id, statuses in marks.items():
+        if not isinstance(statuses, list) or len(statuses) != len(dates):
+            raise ValueError(f'Student {student_id} needs one status per date')
+        for day, status in zip(dates, statuses):
+            if status:
+                cells.append({'student_id': student_id, 'date': day, 'status': status})
+    return cells
+
+def results_json(results):
+    """JSON-ready counts and per-cell results from mark_grid()"""
+    return {
+        'counts': dict(Counter(result.result for result in results)),
+        'results': [dict(result._asdict(), date=str(result.date)) for result in results]
+    }
+
+def _parse_cell(cell, today):
+    """Normalize one grid cell, returns (values, error)"""
+    try:
+        student_id = int(cell['student_id'])
+        day = cell['date']
+        if not isinstance(day, date):
+            day = date.fromisoformat(str(day))
+    except (KeyError, TypeError, ValueError):
+        return None, 'student_id and a YYYY-MM-DD date are required'
+    
+    values = {
+        'student_id': student_id,
+        'date': day,
+        'status': cell.get('status'),
+        'check_in_time': cell.get('check_in_time') or None,
+        'check_out_time': cell.get('check_out_time') or None,
+        'remarks': cell.get('remarks') or None
+    }
+    if values['status'] not in STATUSES:
+        return values, f"status must be one of {', '.join(STATUSES)}"
+    if day > today:
+        return values, 'date is in the future'
+    if values['remarks'] is not None and not isinstance(values['remarks'], str):
+        return values, 'remarks must be text'
+    for name in ('check_in_time', 'check_out_time'):
+        if values[name] is not None and not _TIME.match(str(values[name])):
+            return values, f'{name} must be HH:MM'
+    return values, None
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+class Attendance:
+    """Attendance records and their per-student summaries"""
+    
+    @staticmethod
+    def mark_grid(cells, supervisor_email=None, student_id=None, today=None):
+        """Write a grid of attendance marks (students x dates) in one transaction
+        
+        Each cell is a dict with student_id, date and status, and optionally
+        check_in_time, check_out_time and remarks. A cell is accepted when
+        its date falls inside one of the student's placements (restricted to
+        one supervisor's placements, or one student's, when given); existing
+        marks are updated in place. A student (student_id given) may only
+        mark today, and never over a mark their supervisor or the auto-fill
+        job wrote. Returns a CellResult per cell, in order.
+        """
+        cells = list(cells)
+        if len(cells) > MAX_GRID_CELLS:
+            raise ValueError(f'At most {MAX_GRID_CELLS} cells can be marked at once')
+        today = today or date.today()
+        marked_by = 'student' if student_id is not None else 'supervisor'
+        
+        parsed = [_parse_cell(cell, today) for cell in cells]
+        student_ids = sorted({values['student_id'] for values, error in parsed if not error})
+        results = [None] * len(cells)
+        
+        with current_app.extensions['db_manager'].transaction() as conn:
+            placements = {}
+            existing = {}
+            if student_ids:
+                marks = ', '.join('?' * len(student_ids))
+                for row in conn.execute(
+                        f'''SELECT id, student_id, start_date, end_date, supervisor_email
+                            FROM internship_placements
+                            WHERE student_id IN ({marks}) AND status != 'terminated'
+                            ORDER BY start_date''', student_ids):
+                    placements.setdefault(row['student_id'], []).append(row)
+                
+                days = [values['date'] for values, error in parsed if not error]
+                for row in conn.execute(
+                        f'''SELECT student_id, date, placement_id, status, check_in_time,
+                                   check_out_time, remarks, marked_by
+                            FROM attendance
+                            WHERE student_id IN ({marks}) AND date BETWEEN ? AND ?''',
+                        student_ids + [min(days).isoformat(), max(days).isoformat()]):
+                    existing[(row['student_id'], str(row['date']))] = row
+            
+            writes = []
+            seen = set()
+            for i, (values, error) in enumerate(parsed):
+                if not error:
+                    error, row = Attendance._check_cell(values, placements, existing, seen,
+                                                        supervisor_email, student_id, today)
+                if error:
+                    source = values or (cells[i] if isinstance(cells[i], dict) else {})
+                    results[i] = CellResult(source.get('student_id'), source.get('date'),
+                                            source.get('status'), 'rejected', error)
+                    continue
+                
+                key = (values['student_id'], values['date'].isoformat())
+                params = (values['student_id'], row['id'], key[1], values['status'],
+                          values['check_in_time'], values['check_out_time'], values['remarks'],
+                          marked_by)
+                old = existing.get(key)
+                if old is None:
+                    outcome = 'inserted'
+                else:
+                    stored = (old['placement_id'], old['status'], old['check_in_time'],
+                              old['check_out_time'], old['remarks'], old['marked_by'])
+                    merged = (row['id'], values['status'], params[4] or stored[2],
+                              params[5] or stored[3], params[6] or stored[4], marked_by)
+                    outcome = 'unchanged' if merged == stored else 'updated'
+                if outcome != 'unchanged':
+                    writes.append(params)
+                results[i] = CellResult(values['student_id'], values['date'],
+                                        values['status'], outcome, None)
+            
+            if writes:
+                conn.executemany(UPSERT, writes)
+                versions.bump(conn, 'attendance', [params[0] for params in writes])
+        return results
+    
+    @staticmethod
+    def _check_cell(values, placements, existing, seen, supervisor_email, student_id, today):
+        """Find the placement a valid cell belongs to, returns (error, placement)"""
+        key = (values['student_id'], values['date'])
+        if key in seen:
+            return 'student and date appear more than once', None
+        seen.add(key)
+        if student_id is not None:
+            if values['student_id'] != student_id:
+                return 'not your attendance record', None
+            if values['date'] != today:
+                return "only today's attendance can be marked", None
+            old = existing.get((student_id, values['date'].isoformat()))
+            # Marks from before marked_by existed count as the supervisor's
+            if old is not None and old['marked_by'] != 'student':
+                return 'attendance for this day has already been recorded', None
+        
+        candidates = placements.get(values['student_id'], [])
+        if supervisor_email is not None:
+            candidates = [row for row in candidates
+                          if row['supervisor_email'].lower() == supervisor_email.lower()]
+            if not candidates:
+                return 'student is not one of your interns', None
+        if not candidates:
+            return 'student has no placement', None
+        day = values['date']
+        for row in candidates:
+            if _as_date(row['start_date']) <= day <= _as_date(row['end_date']):
+                return None, row
+        return 'date is outside the placement period', None
+    
+    @staticmethod
+    def autofill_absent(conn, through=None, since=None, department=None):
+        """Mark every unmarked weekday up to through as absent, in one statement
+        
+        Covers active and completed placements from since (or the placement
+        start) to through (default yesterday). Runs inside the caller's
+        transaction and returns the number of rows added.
+        """
+        through = through or date.today() - timedelta(days=1)
+        cursor = conn.cursor()
+        cursor.execute(AUTOFILL, {
+            'through': through.isoformat(),
+            'since': since.isoformat() if since else None,
+            'department': department,
+            'remarks': AUTOFILL_REMARK
+        })
+        # rowcount is -1 for statements starting with WITH
+        added = cursor.execute('SELECT changes()').fetchone()[0]
+        if added:
+            versions.bump(conn, 'attendance')
+        return added
+    
+    @staticmethod
+    def summary_for_student(student_id):
+        """Get attendance totals per placement for one student"""
+        db = get_read_db()
+        cursor = db.cursor()
+        cursor.execute(
+            '''SELECT * FROM attendance_summary
+               WHERE student_id = ?
+               ORDER BY placement_id''',
+            (student_id,)
+        )
+        return cursor.fetchall()
+    
+    @staticmethod
+    def rebuild_summary(conn):
+        """Recompute attendance_summary from the attendance table
+        
+        The triggers keep the summary exact, this is only needed to repair
+        drift (e.g. rows written with triggers disabled or restored from a
+        backup). Runs inside the caller's transaction.
+        """
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM attendance_summary')
+        cursor.execute(
+            '''INSERT INTO attendance_summary
+                   (student_id, placement_id, days_present, days_absent,
+                    days_late, days_excused, total_days)
+               SELECT student_id, placement_id,
+                      SUM(status = 'present'), SUM(status = 'absent'),
+                      SUM(status = 'late'), SUM(status = 'excused'),
+                      COUNT(*)
+               FROM attendance
+               GROUP BY student_id, placement_id'''
+        )
+        return cursor.rowcount
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""
+Weekly compliance checks
+
+Compliance.run() looks at the week that just ended (Monday to Sunday) and
+works out, for every active placement at once, who is behind:
+
+- missing_log: no weekly log for the last placement week completed
+- attendance_gap: weekdays of the week without an attendance mark
+- unreviewed_log: logs still 'submitted' COMPLIANCE_REVIEW_DAYS later
+
+Each check fills a temp table with one INSERT ... SELECT, then writes
+reminders grouped per recipient, escalations to supervisors and HODs and
+one BCC email with a few more statements, however many placements there
+are. The compliance_runs row for the check and ISO week commits in the
+same transaction, so a second run for the week does nothing, and it keeps
+the run's duration and row counts.
+"""
+
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from flask import current_app
+from database.connection import get_read_db
+from utils.email import mail_queue
+
+CHECKS = ('missing_log', 'attendance_gap', 'unreviewed_log')
+
+CheckRun = namedtuple('CheckRun', 'check_name period skipped placements reminders '
+                                  'escalations emails seconds')
+
+# Active placements overlapping the week, with the accounts reminders and
+# escalations go to (supervisors without an account only get email)
+PLACEMENTS = '''
+placements AS (
+    SELECT ai.id AS placement_id, ai.student_id, ai.start_date, ai.end_date,
+           ai.student_email, ai.supervisor_email, s.user_id AS student_user_id,
+           (SELECT id FROM users WHERE email = ai.supervisor_email
+              AND user_type = 'supervisor' AND is_active = 1) AS supervisor_user_id,
+           COALESCE((SELECT user_id FROM hods WHERE id = ai.assigned_hod_id),
+                    (SELECT MIN(user_id) FROM hods
+                     WHERE department = ai.student_department)) AS hod_user_id
+    FROM active_internships ai
+    JOIN students s ON s.id = ai.student_id
+    WHERE ai.start_date <= :week_end AND ai.end_date >= :week_start
+)'''
+
+DUE = '''INSERT INTO temp.compliance_due
+    (placement_id, remind_user_id, remind_email, detail,
+     escalate_supervisor_id, escalate_hod_id)'''
+
+# Week n of a placement starts n - 1 weeks after its start date; the last
+# one completed by the end of the week is due
+MISSING_LOG = f'''
+WITH {PLACEMENTS},
+due AS (
+    SELECT *, CAST((julianday(MIN(:week_end, end_date)) - julianday(start_date) + 1) / 7
+                   AS INTEGER) AS week_number
+    FROM placements
+)
+{DUE}
+SELECT placement_id, student_user_id, student_email, week_number,
+       CASE WHEN escalate THEN supervisor_user_id END,
+       CASE WHEN escalate THEN hod_user_id END
+FROM (
+    SELECT due.*, week_number >= :missed_weeks AND NOT EXISTS (
+               SELECT 1 FROM weekly_logs wl
+               WHERE wl.placement_id = due.placement_id
+                 AND wl.week_number > due.week_number - :missed_weeks
+                 AND wl.week_number <= due.week_number) AS escalate
+    FROM due
+    WHERE week_number >= 1 AND NOT EXISTS (
+        SELECT 1 FROM weekly_logs wl
+        WHERE wl.placement_id = due.placement_id AND wl.week_number = due.week_number)
+)
+'''
+
+ATTENDANCE_GAP = f'''
+WITH {PLACEMENTS},
+days(day) AS (
+    SELECT date(:week_start, '+' || column1 || ' days')
+    FROM (VALUES (0), (1), (2), (3), (4))
+),
+gaps AS (
+    SELECT placements.*, COUNT(*) AS missing
+    FROM placements
+    JOIN days ON days.day BETWEEN placements.start_date AND placements.end_date
+    WHERE NOT EXISTS (SELECT 1 FROM attendance a
+                      WHERE a.student_id = placements.student_id AND a.date = days.day)
+    GROUP BY placement_id
+)
+{DUE}
+SELECT placement_id, student_user_id, student_email, missing,
+       CASE WHEN missing >= :gap_days THEN supervisor_user_id END,
+       CASE WHEN missing >= :gap_days THEN hod_user_id END
+FROM gaps
+'''
+
+UNREVIEWED_LOG = f'''
+WITH {PLACEMENTS}
+{DUE}
+SELECT p.placement_id, p.supervisor_user_id, p.supervisor_email, wl.week_number, NULL,
+       CASE WHEN wl.submitted_at < :escalate_before THEN p.hod_user_id END
+FROM weekly_logs wl
+JOIN placements p ON p.placement_id = wl.placement_id
+WHERE wl.status = 'submitted' AND wl.submitted_at < :review_before
+'''
+
+# check: (due query, reminder title, reminder message, escalation title,
+#         escalation message, email body); messages are SQL expressions over
+#         one recipient's rows
+CHECK_SQL = {
+    'missing_log': (
+        MISSING_LOG,
+        'Weekly log overdue',
+        "printf('Your weekly log for week %d has not been submitted yet.', MAX(detail))",
+        'Interns missing weekly logs',
+        "printf('%d of your interns have not submitted a weekly log for %d weeks in a row.', "
+        "COUNT(DISTINCT placement_id), :missed_weeks)",
+        'Your weekly internship log is overdue. Please log in to BIDS and submit it.'
+    ),
+    'attendance_gap': (
+        ATTENDANCE_GAP,
+        'Attendance missing',
+        "printf('%d day(s) in the week of %s have no attendance record.', "
+        "MAX(detail), :week_start)",
+        'Interns missing attendance',
+        "printf('%d of your interns have %d or more unmarked days in the week of %s.', "
+        "COUNT(DISTINCT placement_id), :gap_days, :week_start)",
+        'Some days of your internship last week have no attendance record. '
+        'Please log in to BIDS and mark them.'
+    ),
+    'unreviewed_log': (
+        UNREVIEWED_LOG,
+        'Weekly logs awaiting review',
+        "printf('%d weekly log(s) have been waiting for your review for more than %d days.', "
+        "COUNT(*), :review_days)",
+        'Weekly logs not reviewed',
+        "printf('%d weekly log(s) of your students have waited more than %d days for "
+        "supervisor review.', COUNT(*), :review_days * 2)",
+        'Weekly logs from your interns are waiting for your review in BIDS.'
+    )
+}
+
+def reporting_week(today=None):
+    """(Monday, Sunday, 'YYYY-Www') of the last full week before today"""
+    today = today or date.today()
+    week_start = today - timedelta(days=today.weekday() + 7)
+    year, week, _ = week_start.isocalendar()
+    return week_start, week_start + timedelta(days=6), f'{year}-W{week:02d}'
+
+class Compliance:
+    """Set-based weekly compliance checks and their run log"""
+    
+    @staticmethod
+    def run(today=None, checks=CHECKS, force=False):
+        """Run the checks for the last full week, returns a CheckRun each
+        
+        Each check commits on its own. Checks already run for the week are
+        skipped unless force is set, which sends their reminders again.
+        """
+        config = current_app.config
+        manager = current_app.extensions['db_manager']
+        today = today or date.today()
+        week_start, week_end, period = reporting_week(today)
+        review_days = config.get('COMPLIANCE_REVIEW_DAYS', 7)
+        params = {
+            'week_start': week_start.isoformat(),
+            'week_end': week_end.isoformat(),
+            'missed_weeks': config.get('COMPLIANCE_MISSED_WEEKS', 2),
+            'gap_days': config.get('COMPLIANCE_GAP_DAYS', 3),
+            'review_days': review_days,
+            'review_before': (today - timedelta(days=review_days)).isoformat(),
+            'escalate_before': (today - timedelta(days=review_days * 2)).isoformat()
+        }
+        
+        results = []
+        for check_name in checks:
+            if check_name not in CHECK_SQL:
+                raise ValueError(f'Unknown compliance check: {check_name}')
+            with manager.transaction() as conn:
+                results.append(Compliance._run_check(
+                    conn, check_name, period, params, force,
+                    email=config.get('COMPLIANCE_EMAIL', True)))
+            if results[-1].emails:
+                mail_queue.wake()
+        return results
+    
+    @staticmethod
+    def _run_check(conn, check_name, period, params, force, email):
+        start = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''INSERT INTO compliance_runs (check_name, period, started_at)
+               VALUES (?, ?, ?)
+               ON CONFLICT (check_name, period) DO UPDATE
+               SET started_at = excluded.started_at WHERE ?''',
+            (check_name, period, datetime.now(), bool(force))
+        )
+        if not cursor.rowcount:
+            return CheckRun(check_name, period, True, 0, 0, 0, 0, 0.0)
+        
+        due_sql, title, message, alert_title, alert, body = CHECK_SQL[check_name]
+        cursor.execute('DROP TABLE IF EXISTS temp.compliance_due')
+        cursor.execute(
+            '''CREATE TEMP TABLE compliance_due (
+                   placement_id INTEGER, remind_user_id INTEGER, remind_email TEXT,
+                   detail INTEGER, escalate_supervisor_id INTEGER, escalate_hod_id INTEGER)''')
+        cursor.execute(due_sql, params)
+        placements = cursor.execute(
+            'SELECT COUNT(DISTINCT placement_id) FROM temp.compliance_due').fetchone()[0]
+        
+        cursor.execute(
+            f'''INSERT INTO notifications (user_id, title, message, type)
+                SELECT remind_user_id, :title, {message}, 'reminder'
+                FROM temp.compliance_due
+                WHERE remind_user_id IS NOT NULL
+                GROUP BY remind_user_id''',
+            dict(params, title=title))
+        reminders = cursor.rowcount
+        cursor.execute(
+            f'''INSERT INTO notifications (user_id, title, message, type)
+                SELECT user_id, :title, {alert}, 'alert'
+                FROM (SELECT placement_id, escalate_supervisor_id AS user_id
+                      FROM temp.compliance_due
+                      UNION ALL
+                      SELECT placement_id, escalate_hod_id FROM temp.compliance_due)
+                WHERE user_id IS NOT NULL
+                GROUP BY user_id''',
+            dict(params, title=alert_title))
+        escalations = cursor.rowcount
+        
+        emails = 0
+        if email:
+            recipients = [row[0] for row in cursor.execute(
+                '''SELECT DISTINCT remind_email FROM temp.compliance_due
+                   WHERE remind_email IS NOT NULL''')]
+            emails = mail_queue.enqueue(recipients, title, body, conn=conn)
+        cursor.execute('DROP TABLE temp.compliance_due')
+        
+        seconds = time.perf_counter() - start
+        cursor.execute(
+            '''UPDATE compliance_runs
+               SET finished_at = ?, duration_ms = ?, placements = ?,
+                   reminders = ?, escalations = ?, emails = ?
+               WHERE check_name = ? AND period = ?''',
+            (datetime.now(), round(seconds * 1000, 3), placements, reminders,
+             escalations, emails, check_name, period)
+        )
+        return CheckRun(check_name, period, False, placements, reminders,
+                        escalations, emails, seconds)
+    
+    @staticmethod
+    def recent_runs(limit=20):
+        """Latest compliance runs, newest first"""
+        db = get_read_db()
+        cursor = db.cursor()
+        cursor.execute(
+            'SELECT * FROM compliance_runs ORDER BY started_at DESC, id DESC LIMIT ?',
+            (limit,)
+        )
+        return cursor.fetchall()
\ No newline at end of file
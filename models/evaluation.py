@@ -0,0 +1,103 @@
+"""
+Evaluation model
+"""
+
+from flask import current_app
+from database import versions
+from database.connection import get_read_db
+
+EVALUATOR_TYPES = ('hod', 'supervisor')
+
+# The six 1-5 scores, in form order
+CRITERIA = ('punctuality', 'communication', 'professionalism', 'technical_skills',
+            'initiative', 'overall_rating')
+
+def _check_scores(scores):
+    """Validated scores in CRITERIA order; each must be 1-5 (or None to leave blank)"""
+    values = []
+    for criterion in CRITERIA:
+        value = scores.get(criterion)
+        if value is not None:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{criterion} must be a whole number from 1 to 5')
+            if not 1 <= value <= 5:
+                raise ValueError(f'{criterion} must be a whole number from 1 to 5')
+        values.append(value)
+    return values
+
+class Evaluation:
+    """HOD and supervisor evaluations of a placement"""
+    
+    @staticmethod
+    def create(student_id, placement_id, evaluator_id, evaluator_type, scores,
+               comments=None, recommendation=None):
+        """Record an evaluation, returns its id"""
+        if evaluator_type not in EVALUATOR_TYPES:
+            raise ValueError('evaluator_type must be hod or supervisor')
+        values = _check_scores(scores)
+        
+        with current_app.extensions['db_manager'].transaction() as conn:
+            placement = conn.execute(
+                'SELECT start_date FROM internship_placements WHERE id = ? AND student_id = ?',
+                (placement_id, student_id)
+            ).fetchone()
+            if placement is None:
+                raise ValueError('Placement not found for this student')
+            cursor = conn.execute(
+                f'''INSERT INTO evaluations
+                        (student_id, placement_id, evaluator_id, evaluator_type,
+                         {', '.join(CRITERIA)}, comments, recommendation)
+                    VALUES (?, ?, ?, ?, {', '.join('?' * len(CRITERIA))}, ?, ?)''',
+                (student_id, placement_id, evaluator_id, evaluator_type, *values,
+                 comments, recommendation)
+            )
+            versions.bump(conn, 'evaluations', [student_id])
+        Evaluation._written(placement['start_date'])
+        return cursor.lastrowid
+    
+    @staticmethod
+    def update(evaluation_id, scores, comments=None, recommendation=None):
+        """Change an evaluation's scores and remarks, returns False if it does not exist"""
+        values = _check_scores(scores)
+        with current_app.extensions['db_manager'].transaction() as conn:
+            cursor = conn.execute(
+                f'''UPDATE evaluations
+                    SET {', '.join(f'{criterion} = ?' for criterion in CRITERIA)},
+                        comments = ?, recommendation = ?, evaluated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?''',
+                (*values, comments, recommendation, evaluation_id)
+            )
+            if not cursor.rowcount:
+                return False
+            placement = conn.execute(
+                '''SELECT e.student_id, ip.start_date FROM evaluations e
+                   JOIN internship_placements ip ON ip.id = e.placement_id
+                   WHERE e.id = ?''',
+                (evaluation_id,)
+            ).fetchone()
+            versions.bump(conn, 'evaluations', [placement['student_id']])
+        Evaluation._written(placement['start_date'])
+        return True
+    
+    @staticmethod
+    def _written(start_date):
+        """Drop the cached analytics of the placement's academic year"""
+        from models.analytics import EvaluationAnalytics, year_of
+        EvaluationAnalytics.invalidate(year_of(start_date))
+    
+    @staticmethod
+    def list_for_placement(placement_id):
+        """Evaluations of a placement with the evaluator's name, newest first"""
+        db = get_read_db()
+        cursor = db.cursor()
+        cursor.execute(
+            '''SELECT e.*, u.full_name AS evaluator_name
+               FROM evaluations e
+               JOIN users u ON u.id = e.evaluator_id
+               WHERE e.placement_id = ?
+               ORDER BY e.evaluated_at DESC, e.id DESC''',
+            (placement_id,)
+        )
+        return cursor.fetchall()
\ No newline at end of file
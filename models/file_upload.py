@@ -0,0 +1,61 @@
+"""
+File upload model
+"""
+
+from flask import current_app
+from database.connection import db_manager, get_read_db
+from utils.uploads import save_upload
+
+class FileUpload:
+    """Files attached to a placement"""
+    
+    @staticmethod
+    def create(student_id, placement_id, file_type, storage, description=None):
+        """Store an uploaded file and record it, returns the new row id"""
+        stored = save_upload(storage, file_type, current_app.config)
+        with db_manager.transaction() as conn:
+            cursor = conn.execute(
+                '''INSERT INTO file_uploads
+                   (student_id, placement_id, file_type, file_name, file_path, description)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                (student_id, placement_id, file_type, stored.file_name,
+                 stored.file_path, description)
+            )
+        return cursor.lastrowid
+    
+    @staticmethod
+    def list_for_placement(placement_id, file_type=None):
+        """Get a placement's uploads, newest first"""
+        db = get_read_db()
+        cursor = db.cursor()
+        query = 'SELECT * FROM file_uploads WHERE placement_id = ?'
+        params = [placement_id]
+        if file_type:
+            query += ' AND file_type = ?'
+            params.append(file_type)
+        cursor.execute(query + ' ORDER BY uploaded_at DESC, id DESC', params)
+        return cursor.fetchall()
+    
+    @staticmethod
+    def get_for_user(upload_id, user):
+        """An upload if the user may see it, else None
+        
+        Students see their own files, HODs their department's, supervisors
+        their interns' and admins everything; one query decides.
+        """
+        db = get_read_db()
+        cursor = db.cursor()
+        cursor.execute(
+            '''SELECT fu.* FROM file_uploads fu
+               JOIN students s ON s.id = fu.student_id
+               JOIN internship_placements ip ON ip.id = fu.placement_id
+               WHERE fu.id = :upload_id AND (
+                   :user_type = 'admin'
+                   OR (:user_type = 'student' AND s.user_id = :user_id)
+                   OR (:user_type = 'hod' AND s.department =
+                       (SELECT department FROM hods WHERE user_id = :user_id))
+                   OR (:user_type = 'supervisor' AND ip.supervisor_email = :email))''',
+            {'upload_id': upload_id, 'user_type': user.user_type,
+             'user_id': user.id, 'email': user.email}
+        )
+        return cursor.fetchone()
\ No newline at end of file
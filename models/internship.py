@@ -0,0 +1,53 @@
+"""
+Internship placement model
+"""
+
+from flask import current_app
+from config import Config
+from database.archive import history
+from database.connection import get_read_db
+from utils.pagination import keyset_paginate
+
+STATUSES = ('active', 'completed', 'terminated')
+
+class Internship:
+    """Internship placements"""
+    
+    @staticmethod
+    def list_for_supervisor(supervisor_email, status='active', cursor=None, limit=None):
+        """Get a page of an organization supervisor's interns with their attendance totals"""
+        db = get_read_db()
+        
+        return keyset_paginate(
+            db,
+            '''SELECT ip.*, s.student_id AS student_number, s.level,
+                      u.full_name AS student_name, u.email AS student_email,
+                      COALESCE(sa.days_present, 0) AS days_present,
+                      COALESCE(sa.days_absent, 0) AS days_absent,
+                      COALESCE(sa.days_late, 0) AS days_late,
+                      COALESCE(sa.days_excused, 0) AS days_excused,
+                      COALESCE(sa.total_days, 0) AS total_days
+               FROM internship_placements ip
+               JOIN students s ON ip.student_id = s.id
+               JOIN users u ON s.user_id = u.id
+               LEFT JOIN attendance_summary sa
+                    ON sa.student_id = ip.student_id AND sa.placement_id = ip.id''',
+            ['ip.supervisor_email = ?', 'ip.status = ?'],
+            [supervisor_email, status],
+            keys=[('ip.start_date', 'start_date'), ('ip.id', 'id')],
+            cursor=cursor,
+            limit=limit or Config.STUDENTS_PER_PAGE
+        )
+    
+    @staticmethod
+    def history_for_student(student_id):
+        """Every placement a student has had, archived years included"""
+        with history(current_app.extensions['db_manager'],
+                     current_app.config['ARCHIVE_DIR']) as conn:
+            cursor = conn.execute(
+                '''SELECT * FROM all_internship_placements
+                   WHERE student_id = ?
+                   ORDER BY start_date DESC, id DESC''',
+                (student_id,)
+            )
+            return cursor.fetchall()
\ No newline at end of file
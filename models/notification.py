@@ -0,0 +1,114 @@
+"""
+Notification model
+"""
+
+from datetime import datetime, timedelta
+from database.connection import db_manager, get_read_db
+
+class Notification:
+    """User notifications and their unread counters"""
+    
+    @staticmethod
+    def create(user_id, title, message, type='info'):
+        """Send a notification to one user"""
+        with db_manager.transaction() as conn:
+            cursor = conn.execute(
+                '''INSERT INTO notifications (user_id, title, message, type)
+                   VALUES (?, ?, ?, ?)''',
+                (user_id, title, message, type)
+            )
+        return cursor.lastrowid
+    
+    @staticmethod
+    def fan_out(title, message, type='info', department=None, level=None,
+                user_type='student'):
+        """Send a notification to every active user in a group in one statement
+        
+        Students are selected by department and/or level; other user types
+        by user_type alone. Returns the number of notifications created.
+        """
+        if user_type == 'student':
+            query = '''INSERT INTO notifications (user_id, title, message, type)
+                       SELECT s.user_id, ?, ?, ?
+                       FROM students s
+                       JOIN users u ON s.user_id = u.id
+                       WHERE u.is_active = 1'''
+            params = [title, message, type]
+            if department:
+                query += ' AND s.department = ?'
+                params.append(department)
+            if level:
+                query += ' AND s.level = ?'
+                params.append(level)
+        else:
+            query = '''INSERT INTO notifications (user_id, title, message, type)
+                       SELECT id, ?, ?, ?
+                       FROM users
+                       WHERE is_active = 1 AND user_type = ?'''
+            params = [title, message, type, user_type]
+        
+        with db_manager.transaction() as conn:
+            return conn.execute(query, params).rowcount
+    
+    @staticmethod
+    def unread_count(user_id):
+        """Get a user's unread notification count"""
+        db = get_read_db()
+        cursor = db.cursor()
+        cursor.execute(
+            'SELECT unread FROM notification_counters WHERE user_id = ?',
+            (user_id,)
+        )
+        row = cursor.fetchone()
+        return row['unread'] if row else 0
+    
+    @staticmethod
+    def mark_read(user_id, notification_id):
+        """Mark one notification as read"""
+        with db_manager.transaction() as conn:
+            return conn.execute(
+                '''UPDATE notifications
+                   SET is_read = 1, read_at = ?
+                   WHERE id = ? AND user_id = ? AND is_read = 0''',
+                (datetime.now(), notification_id, user_id)
+            ).rowcount
+    
+    @staticmethod
+    def mark_all_read(user_id):
+        """Mark every unread notification of a user as read"""
+        with db_manager.transaction() as conn:
+            return conn.execute(
+                '''UPDATE notifications
+                   SET is_read = 1, read_at = ?
+                   WHERE user_id = ? AND is_read = 0''',
+                (datetime.now(), user_id)
+            ).rowcount
+    
+    @staticmethod
+    def compact(conn, older_than_days=30):
+        """Delete read notifications older than the cutoff
+        
+        Unread notifications are never removed. Runs inside the caller's
+        transaction and returns the number of rows deleted.
+        """
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        cursor = conn.cursor()
+        cursor.execute(
+            '''DELETE FROM notifications
+               WHERE is_read = 1 AND COALESCE(read_at, created_at) < ?''',
+            (cutoff,)
+        )
+        return cursor.rowcount
+    
+    @staticmethod
+    def rebuild_counters(conn):
+        """Recompute notification_counters from the notifications table"""
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM notification_counters')
+        cursor.execute(
+            '''INSERT INTO notification_counters (user_id, unread)
+               SELECT user_id, COUNT(*) FROM notifications
+               WHERE is_read = 0
+               GROUP BY user_id'''
+        )
+        return cursor.rowcount
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Department reporting for the HOD dashboard
+
+The whole department rollup (attendance rate, logs submitted against
+expected, pending reviews, evaluation status) comes from one aggregate
+query, however many students there are. Rollups are cached per worker
+under the department's data_versions counters (database/versions.py),
+which every write to its students' rows bumps, so a write in any worker
+makes the next rollup() rebuild.
+"""
+
+import time
+from datetime import date
+from config import Config
+from database.connection import get_read_db
+from database.versions import current, entities
+from models.student import Student
+from utils.cache import LRUCache
+from utils.pagination import Page
+
+# Per-student rows for the students matched by {students}
+ROWS_QUERY = '''
+WITH current AS (
+    -- Each student's active placement, else their latest one
+    SELECT s.id AS student_id,
+           (SELECT ip.id FROM internship_placements ip
+            WHERE ip.student_id = s.id
+            ORDER BY ip.status = 'active' DESC, ip.start_date DESC, ip.id DESC
+            LIMIT 1) AS placement_id
+    FROM students s
+    WHERE {students}
+),
+logs AS (
+    -- One row per student, driven from current so weekly_logs is only
+    -- read through its placement index
+    SELECT c.student_id, c.placement_id,
+           COALESCE(SUM(wl.status != 'draft'), 0) AS logs_submitted,
+           COALESCE(SUM(wl.status = 'submitted'), 0) AS logs_pending_review,
+           COALESCE(SUM(wl.status = 'reviewed'), 0) AS logs_reviewed,
+           COALESCE(SUM(wl.status = 'draft'), 0) AS logs_draft
+    FROM current c
+    LEFT JOIN weekly_logs wl ON wl.placement_id = c.placement_id
+    GROUP BY c.student_id
+),
+evals AS (
+    SELECT e.placement_id,
+           SUM(e.evaluator_type = 'supervisor') AS supervisor_evaluations,
+           SUM(e.evaluator_type = 'hod') AS hod_evaluations,
+           ROUND(AVG(e.overall_rating), 2) AS average_rating
+    FROM current c
+    CROSS JOIN evaluations e ON e.placement_id = c.placement_id
+    GROUP BY e.placement_id
+)
+SELECT s.id AS student_id, s.student_id AS student_number, s.level,
+       u.full_name, u.email,
+       ip.id AS placement_id, ip.organization_name, ip.status AS placement_status,
+       ip.start_date, ip.end_date,
+       COALESCE(sa.days_present, 0) AS days_present,
+       COALESCE(sa.days_absent, 0) AS days_absent,
+       COALESCE(sa.days_late, 0) AS days_late,
+       COALESCE(sa.days_excused, 0) AS days_excused,
+       COALESCE(sa.total_days, 0) AS total_days,
+       CASE WHEN sa.total_days > 0
+            THEN ROUND(100.0 * (sa.days_present + sa.days_late) / sa.total_days, 1)
+       END AS attendance_rate,
+       l.logs_submitted, l.logs_pending_review, l.logs_reviewed, l.logs_draft,
+       -- Whole weeks elapsed in the placement up to today
+       CASE WHEN ip.id IS NULL THEN 0
+            ELSE MAX(0, CAST((julianday(MIN(:today, ip.end_date))
+                              - julianday(ip.start_date) + 1) / 7 AS INTEGER))
+       END AS logs_expected,
+       COALESCE(ev.supervisor_evaluations, 0) AS supervisor_evaluations,
+       COALESCE(ev.hod_evaluations, 0) AS hod_evaluations,
+       ev.average_rating,
+       CASE WHEN ev.supervisor_evaluations > 0 AND ev.hod_evaluations > 0 THEN 'complete'
+            WHEN ev.placement_id IS NOT NULL THEN 'partial'
+            ELSE 'pending'
+       END AS evaluation_status
+FROM logs l
+JOIN students s ON s.id = l.student_id
+JOIN users u ON s.user_id = u.id
+LEFT JOIN internship_placements ip ON ip.id = l.placement_id
+LEFT JOIN attendance_summary sa
+     ON sa.student_id = l.student_id AND sa.placement_id = l.placement_id
+LEFT JOIN evals ev ON ev.placement_id = l.placement_id
+ORDER BY {order}
+'''
+
+ROLLUP_QUERY = ROWS_QUERY.format(
+    students='s.department = :department AND (:level IS NULL OR s.level = :level)',
+    order='u.full_name, s.id')
+
+def page_query(count):
+    """ROWS_QUERY for count students given as :s0, :s1, ..., in Student.list_by_department order"""
+    marks = ', '.join(f':s{i}' for i in range(count))
+    return ROWS_QUERY.format(students=f's.id IN ({marks})', order='s.level, s.id')
+
+# Per-worker snapshots: (department, level) -> ((counters, day), rollup)
+_snapshots = LRUCache(maxsize=Config.REPORT_CACHE_SIZE, ttl=Config.REPORT_CACHE_TTL)
+
+def _totals(students):
+    """Department-wide figures from the per-student rows"""
+    attendance_days = sum(s['total_days'] for s in students)
+    attended = sum(s['days_present'] + s['days_late'] for s in students)
+    expected = sum(s['logs_expected'] for s in students)
+    submitted = sum(min(s['logs_submitted'], s['logs_expected']) for s in students)
+    return {
+        'students': len(students),
+        'placed': sum(1 for s in students if s['placement_id']),
+        'active': sum(1 for s in students if s['placement_status'] == 'active'),
+        'attendance_rate': round(100.0 * attended / attendance_days, 1) if attendance_days else None,
+        'logs_submitted': sum(s['logs_submitted'] for s in students),
+        'logs_expected': expected,
+        'log_compliance': round(100.0 * submitted / expected, 1) if expected else None,
+        'pending_reviews': sum(s['logs_pending_review'] for s in students),
+        'evaluations_complete': sum(1 for s in students if s['evaluation_status'] == 'complete'),
+        'evaluations_pending': sum(1 for s in students
+                                   if s['placement_id'] and s['evaluation_status'] != 'complete')
+    }
+
+class DepartmentReport:
+    """Set-based rollups for HOD dashboards"""
+    
+    @staticmethod
+    def build(db, department, level=None, today=None):
+        """Compute a department rollup with a single aggregate query"""
+        cursor = db.cursor()
+        cursor.execute(ROLLUP_QUERY, {
+            'department': department,
+            'level': level,
+            'today': (today or date.today()).isoformat()
+        })
+        students = [dict(row) for row in cursor.fetchall()]
+        return {
+            'department': department,
+            'level': level,
+            'students': students,
+            'totals': _totals(students),
+            'generated_at': time.time()
+        }
+    
+    @staticmethod
+    def page(department, level=None, cursor=None, limit=None, today=None):
+        """One keyset page of a department's per-student rows, by level
+        
+        Students are paged with Student.list_by_department and only that
+        page's attendance, logs and evaluations are aggregated.
+        """
+        students = Student.list_by_department(department, level, cursor, limit)
+        if not students.items:
+            return Page([], students.next_cursor)
+        params = {f's{i}': student['id'] for i, student in enumerate(students)}
+        params['today'] = (today or date.today()).isoformat()
+        cursor = get_read_db().execute(page_query(len(params) - 1), params)
+        return Page([dict(row) for row in cursor.fetchall()], students.next_cursor)
+    
+    @staticmethod
+    def rollup(department, level=None):
+        """Get a department rollup, from the snapshot cache while still current
+        
+        A snapshot is current while the department's counters and the date
+        (logs expected grow by the day) are unchanged. The counters are read
+        before building, so a snapshot is never newer than its stamp.
+        Snapshots are shared between requests and must not be modified.
+        """
+        key = (department, level)
+        db = get_read_db()
+        stamp = (current(db, entities('department', department)), date.today())
+        entry = _snapshots.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        
+        snapshot = DepartmentReport.build(db, department, level)
+        _snapshots.set(key, (stamp, snapshot))
+        return snapshot
+    
+    @staticmethod
+    def cache_stats():
+        return _snapshots.stats()
\ No newline at end of file
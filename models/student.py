@@ -0,0 +1,38 @@
+"""
+Student model
+"""
+
+from config import Config
+from database.connection import get_read_db
+from utils.pagination import keyset_paginate
+
+LEVELS = ('200', '300', '400')
+
+class Student:
+    """Student records (extends users)"""
+    
+    @staticmethod
+    def list_by_department(department, level=None, cursor=None, limit=None):
+        """Get a page of students in a department, ordered by level"""
+        db = get_read_db()
+        
+        # Columns pinned by an equality filter stay out of the sort key so
+        # the cursor predicate becomes a range on the next index column
+        where = ['s.department = ?']
+        params = [department]
+        keys = [('s.level', 'level'), ('s.id', 'id')]
+        if level:
+            where.append('s.level = ?')
+            params.append(level)
+            keys = [('s.id', 'id')]
+        
+        return keyset_paginate(
+            db,
+            '''SELECT s.*, u.full_name, u.email, u.phone
+               FROM students s
+               JOIN users u ON s.user_id = u.id''',
+            where, params,
+            keys=keys,
+            cursor=cursor,
+            limit=limit or Config.STUDENTS_PER_PAGE
+        )
\ No newline at end of file
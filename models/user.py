@@ -2,15 +2,138 @@
 User model for authentication and base user functionality
 """
 
-from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import datetime
 import sqlite3
-from flask import g
+import threading
+import time
+from flask import current_app
+from werkzeug.local import LocalProxy
+from config import Config
+from database import versions
+from database.connection import db_manager, get_read_db
+from models.notification import Notification
+from utils.audit import audit_writer
+from utils.auth import (hash_password, needs_rehash, password_verifier,
+                        last_login_writer, login_latency)
+from utils.cache import DataVersion, LRUCache
+from utils.pagination import keyset_paginate
 
-class User(UserMixin):
+# Columns kept in the user cache (never the password hash)
+USER_FIELDS = ('id', 'email', 'full_name', 'phone', 'user_type', 'is_active',
+               'created_at', 'last_login')
+
+_MISSING = object()
+
+class UserCache:
+    """Per-worker cache of user records and profiles for load_user
+    
+    Triggers log every user whose record or profile changes in
+    user_changes. When PRAGMA data_version shows a commit from another
+    connection, the cache reads the log past the last seq it has seen and
+    drops only those users, so a change made by any worker reaches every
+    worker on its next lookup. Entries also expire after USER_CACHE_TTL.
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.users = LRUCache()
+        self.profiles = LRUCache()
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._version = None
+        self._seq = None
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        size = app.config.get('USER_CACHE_SIZE', 2048)
+        ttl = app.config.get('USER_CACHE_TTL', 300)
+        self.users = LRUCache(maxsize=size, ttl=ttl)
+        self.profiles = LRUCache(maxsize=size, ttl=ttl)
+        app.extensions['user_cache'] = self
+    
+    def refresh(self):
+        """Drop the users changed since the last check (one PRAGMA when nothing was)"""
+        if self._watcher is None:
+            self._watcher = DataVersion(self.app.extensions['db_manager'].connect_readonly)
+        version = self._watcher.current()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            db = get_read_db()
+            if self._seq is None:
+                # Nothing cached can be trusted before the log position is known
+                seq = db.execute('SELECT COALESCE(MAX(seq), 0) FROM user_changes').fetchone()[0]
+                self.users.clear()
+                self.profiles.clear()
+            else:
+                changes = db.execute(
+                    'SELECT seq, user_id FROM user_changes WHERE seq > ? ORDER BY seq',
+                    (self._seq,)).fetchall()
+                for row in changes:
+                    self.invalidate(row['user_id'])
+                seq = changes[-1]['seq'] if changes else self._seq
+            self._seq = seq
+            self._version = version
+    
+    def invalidate(self, user_id):
+        """Drop one user's record and profile in this worker"""
+        self.users.invalidate(user_id)
+        self.profiles.invalidate(user_id)
+        self.invalidations += 1
+    
+    def stats(self):
+        return {'users': self.users.stats(), 'profiles': self.profiles.stats()}
+
+# The current app's user cache (create_app() makes one per app)
+user_cache = LocalProxy(lambda: current_app.extensions['user_cache'])
+
+class _SlottedUserMixin:
+    """flask_login.UserMixin's interface for classes with __slots__
+    
+    UserMixin declares no __slots__, so anything deriving from it gets an
+    instance __dict__ whatever its own __slots__ say. is_active is left to
+    the subclass.
+    """
+    
+    __slots__ = ()
+    
+    # Defining __eq__ would otherwise set __hash__ to None
+    __hash__ = object.__hash__
+    
+    # As in UserMixin (Flask-Login 0.6): a deactivated account loaded from
+    # the session is treated as logged out
+    @property
+    def is_authenticated(self):
+        return self.is_active
+    
+    @property
+    def is_anonymous(self):
+        return False
+    
+    def get_id(self):
+        return str(self.id)
+    
+    def __eq__(self, other):
+        if isinstance(other, _SlottedUserMixin):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+    
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return NotImplemented
+        return not equal
+
+class User(_SlottedUserMixin):
     """Base User class for all user types"""
     
+    __slots__ = USER_FIELDS
+    
     def __init__(self, id, email, full_name, phone, user_type, is_active=True, 
                  created_at=None, last_login=None):
         self.id = id
@@ -24,32 +147,46 @@ class User(UserMixin):
     
     @staticmethod
     def get(user_id):
-        """Get user by ID"""
-        db = g.get('db')
-        cursor = db.cursor()
-        cursor.execute(
-            'SELECT * FROM users WHERE id = ?',
-            (user_id,)
-        )
-        row = cursor.fetchone()
+        """Get user by ID, served from the per-worker cache when possible"""
+        try:
+            key = int(user_id)
+        except (TypeError, ValueError):
+            return None
         
-        if row:
-            return User(
-                id=row['id'],
-                email=row['email'],
-                full_name=row['full_name'],
-                phone=row['phone'],
-                user_type=row['user_type'],
-                is_active=row['is_active'],
-                created_at=row['created_at'],
-                last_login=row['last_login']
+        user_cache.refresh()
+        record = user_cache.users.get(key)
+        if record is None:
+            db = get_read_db()
+            cursor = db.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE id = ?",
+                (key,)
             )
-        return None
+            row = cursor.fetchone()
+            if not row:
+                return None
+            record = tuple(row)
+            user_cache.users.set(key, record)
+        
+        return User(*record)
+    
+    @staticmethod
+    def invalidate_cache(user_id):
+        """Drop a user's cached record and profile in this worker at once
+        
+        Other workers find the change in user_changes on their next lookup.
+        """
+        user_cache.invalidate(user_id)
+    
+    @staticmethod
+    def cache_stats():
+        """Return hit/miss counters for this worker's user caches"""
+        return user_cache.stats()
     
     @staticmethod
     def get_by_email(email):
         """Get user by email"""
-        db = g.get('db')
+        db = get_read_db()
         cursor = db.cursor()
         cursor.execute(
             'SELECT * FROM users WHERE email = ?',
@@ -72,49 +209,59 @@ class User(UserMixin):
     
     @staticmethod
     def authenticate(email, password):
-        """Authenticate user with email and password"""
-        db = g.get('db')
-        cursor = db.cursor()
-        cursor.execute(
-            'SELECT * FROM users WHERE email = ? AND is_active = 1',
-            (email,)
-        )
-        row = cursor.fetchone()
+        """Authenticate user with email and password
         
-        if row and check_password_hash(row['password_hash'], password):
-            # Update last login
+        Raises LoginBusy when the password check queue is full.
+        """
+        start = time.perf_counter()
+        try:
+            db = get_read_db()
+            cursor = db.cursor()
             cursor.execute(
-                'UPDATE users SET last_login = ? WHERE id = ?',
-                (datetime.now(), row['id'])
+                'SELECT * FROM users WHERE email = ? AND is_active = 1',
+                (email,)
             )
-            db.commit()
+            row = cursor.fetchone()
             
-            return User(
-                id=row['id'],
-                email=row['email'],
-                full_name=row['full_name'],
-                phone=row['phone'],
-                user_type=row['user_type'],
-                is_active=row['is_active'],
-                created_at=row['created_at'],
-                last_login=datetime.now()
-            )
-        return None
+            if row and password_verifier.verify(row['password_hash'], password):
+                # Upgrade hashes made with older cost parameters
+                if needs_rehash(row['password_hash']):
+                    password_hash = password_verifier.hash(password)
+                    with db_manager.transaction() as conn:
+                        conn.execute(
+                            'UPDATE users SET password_hash = ? WHERE id = ?',
+                            (password_hash, row['id'])
+                        )
+                
+                # Update last login (coalesced and written in batches)
+                now = datetime.now()
+                last_login_writer.touch(row['id'], now)
+                
+                return User(
+                    id=row['id'],
+                    email=row['email'],
+                    full_name=row['full_name'],
+                    phone=row['phone'],
+                    user_type=row['user_type'],
+                    is_active=row['is_active'],
+                    created_at=row['created_at'],
+                    last_login=now
+                )
+            return None
+        finally:
+            login_latency.observe(time.perf_counter() - start)
     
     def create(self, password):
         """Create a new user"""
-        db = g.get('db')
-        cursor = db.cursor()
-        
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
         
         try:
-            cursor.execute(
-                '''INSERT INTO users (email, password_hash, full_name, phone, user_type)
-                   VALUES (?, ?, ?, ?, ?)''',
-                (self.email, password_hash, self.full_name, self.phone, self.user_type)
-            )
-            db.commit()
+            with db_manager.transaction() as conn:
+                cursor = conn.execute(
+                    '''INSERT INTO users (email, password_hash, full_name, phone, user_type)
+                       VALUES (?, ?, ?, ?, ?)''',
+                    (self.email, password_hash, self.full_name, self.phone, self.user_type)
+                )
             self.id = cursor.lastrowid
             return True
         except sqlite3.IntegrityError:
@@ -122,9 +269,6 @@ class User(UserMixin):
     
     def update(self, **kwargs):
         """Update user information"""
-        db = g.get('db')
-        cursor = db.cursor()
-        
         allowed_fields = ['full_name', 'phone', 'is_active']
         update_fields = []
         values = []
@@ -137,8 +281,12 @@ class User(UserMixin):
         if update_fields:
             values.append(self.id)
             query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?"
-            cursor.execute(query, values)
-            db.commit()
+            with db_manager.transaction() as conn:
+                conn.execute(query, values)
+                # Student names are shown in cached intern tables
+                students = conn.execute('SELECT id FROM students WHERE user_id = ?', (self.id,))
+                versions.bump(conn, 'students', [row[0] for row in students.fetchall()])
+            User.invalidate_cache(self.id)
             
             # Update object attributes
             for field, value in kwargs.items():
@@ -147,64 +295,47 @@ class User(UserMixin):
     
     def change_password(self, new_password):
         """Change user password"""
-        db = g.get('db')
-        cursor = db.cursor()
-        
-        password_hash = generate_password_hash(new_password)
-        cursor.execute(
-            'UPDATE users SET password_hash = ? WHERE id = ?',
-            (password_hash, self.id)
-        )
-        db.commit()
+        password_hash = hash_password(new_password)
+        with db_manager.transaction() as conn:
+            conn.execute(
+                'UPDATE users SET password_hash = ? WHERE id = ?',
+                (password_hash, self.id)
+            )
+        User.invalidate_cache(self.id)
     
     def log_activity(self, action, entity_type=None, entity_id=None, 
                      ip_address=None, user_agent=None):
-        """Log user activity"""
-        db = g.get('db')
-        cursor = db.cursor()
-        
-        cursor.execute(
-            '''INSERT INTO activity_logs 
-               (user_id, action, entity_type, entity_id, ip_address, user_agent)
-               VALUES (?, ?, ?, ?, ?, ?)''',
-            (self.id, action, entity_type, entity_id, ip_address, user_agent)
-        )
-        db.commit()
+        """Log user activity (queued and group-committed by the audit writer)"""
+        audit_writer.record(self.id, action, entity_type, entity_id,
+                            ip_address, user_agent)
     
-    def get_notifications(self, unread_only=False):
-        """Get user notifications"""
-        db = g.get('db')
-        cursor = db.cursor()
+    def get_notifications(self, unread_only=False, cursor=None, limit=None):
+        """Get a page of user notifications, newest first"""
+        db = get_read_db()
         
+        where = ['user_id = ?']
         if unread_only:
-            cursor.execute(
-                '''SELECT * FROM notifications 
-                   WHERE user_id = ? AND is_read = 0 
-                   ORDER BY created_at DESC''',
-                (self.id,)
-            )
-        else:
-            cursor.execute(
-                '''SELECT * FROM notifications 
-                   WHERE user_id = ? 
-                   ORDER BY created_at DESC''',
-                (self.id,)
-            )
+            where.append('is_read = 0')
         
-        return cursor.fetchall()
+        return keyset_paginate(
+            db, 'SELECT * FROM notifications', where, [self.id],
+            keys=[('created_at', 'created_at'), ('id', 'id')],
+            cursor=cursor,
+            limit=limit or Config.NOTIFICATIONS_PER_PAGE,
+            descending=True
+        )
     
     def mark_notification_read(self, notification_id):
         """Mark a notification as read"""
-        db = g.get('db')
-        cursor = db.cursor()
-        
-        cursor.execute(
-            '''UPDATE notifications 
-               SET is_read = 1, read_at = ? 
-               WHERE id = ? AND user_id = ?''',
-            (datetime.now(), notification_id, self.id)
-        )
-        db.commit()
+        Notification.mark_read(self.id, notification_id)
+    
+    def mark_all_notifications_read(self):
+        """Mark every unread notification as read"""
+        return Notification.mark_all_read(self.id)
+    
+    def unread_notification_count(self):
+        """Get the number of unread notifications"""
+        return Notification.unread_count(self.id)
     
     @property
     def is_student(self):
@@ -224,7 +355,12 @@ class User(UserMixin):
     
     def get_profile_data(self):
         """Get additional profile data based on user type"""
-        db = g.get('db')
+        user_cache.refresh()
+        profile = user_cache.profiles.get(self.id, _MISSING)
+        if profile is not _MISSING:
+            return profile
+        
+        db = get_read_db()
         cursor = db.cursor()
         
         if self.is_student:
@@ -245,7 +381,9 @@ class User(UserMixin):
         else:
             return None
         
-        return cursor.fetchone()
+        profile = cursor.fetchone()
+        user_cache.profiles.set(self.id, profile)
+        return profile
     
     def __repr__(self):
         return f'<User {self.email}>'
\ No newline at end of file
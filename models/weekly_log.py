@@ -0,0 +1,124 @@
+"""
+Weekly log model
+"""
+
+import re
+from markupsafe import Markup, escape
+from config import Config
+from database.connection import get_read_db
+from utils.pagination import keyset_paginate
+
+STATUSES = ('draft', 'submitted', 'reviewed')
+
+# Columns of weekly_logs_fts, in order, with their bm25 weights
+SEARCH_COLUMNS = [
+    ('activities', 2.0),
+    ('skills_learned', 1.5),
+    ('challenges', 1.0),
+    ('supervisor_comment', 1.0),
+    ('hod_comment', 1.0)
+]
+
+# Control characters mark snippet matches so the log text can be escaped
+# before the highlight tags are added
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query (all terms, last one as a prefix)"""
+    terms = re.findall(r'\w+', text or '')
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def highlight(snippet):
+    """Escape a snippet and wrap its matches in <mark>"""
+    return Markup(
+        str(escape(snippet or ''))
+        .replace(_MATCH_START, '<mark>')
+        .replace(_MATCH_END, '</mark>')
+    )
+
+def search_json(results):
+    """JSON-ready rows from WeeklyLog.search()"""
+    return {'results': [dict(result, week_start_date=str(result['week_start_date']),
+                             snippet=str(result['snippet'])) for result in results]}
+
+class WeeklyLog:
+    """Weekly activity logs submitted by students"""
+    
+    @staticmethod
+    def list_for_student(student_id, cursor=None, limit=None):
+        """Get a page of a student's weekly logs, latest week first"""
+        db = get_read_db()
+        
+        return keyset_paginate(
+            db, 'SELECT * FROM weekly_logs',
+            ['student_id = ?'], [student_id],
+            keys=[('week_number', 'week_number'), ('id', 'id')],
+            cursor=cursor,
+            limit=limit or Config.LOGS_PER_PAGE,
+            descending=True
+        )
+    
+    @staticmethod
+    def search(text, department=None, placement_id=None, supervisor_email=None,
+               status=None, limit=20):
+        """Full-text search over weekly logs, best matches first
+        
+        Results can be scoped to a department (HODs), a placement, or an
+        organization supervisor's interns. Each row has a highlighted snippet.
+        """
+        query = fts_query(text)
+        if query is None:
+            return []
+        
+        weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS)
+        sql = f'''SELECT wl.id, wl.student_id, wl.placement_id, wl.week_number,
+                         wl.week_start_date, wl.status, s.student_id AS student_number,
+                         s.department, u.full_name AS student_name,
+                         snippet(weekly_logs_fts, -1, ?, ?, '...', 16) AS snippet,
+                         bm25(weekly_logs_fts, {weights}) AS rank
+                  FROM weekly_logs_fts
+                  JOIN weekly_logs wl ON wl.id = weekly_logs_fts.rowid
+                  JOIN students s ON wl.student_id = s.id
+                  JOIN users u ON s.user_id = u.id'''
+        where = ['weekly_logs_fts MATCH ?']
+        params = [_MATCH_START, _MATCH_END, query]
+        if department:
+            where.append('s.department = ?')
+            params.append(department)
+        if placement_id:
+            where.append('wl.placement_id = ?')
+            params.append(placement_id)
+        if supervisor_email:
+            sql += ' JOIN internship_placements ip ON wl.placement_id = ip.id'
+            where.append('ip.supervisor_email = ?')
+            params.append(supervisor_email)
+        if status:
+            where.append('wl.status = ?')
+            params.append(status)
+        sql += ' WHERE ' + ' AND '.join(where) + ' ORDER BY rank LIMIT ?'
+        params.append(max(1, min(limit, 100)))
+        
+        db = get_read_db()
+        cursor = db.cursor()
+        cursor.execute(sql, params)
+        results = []
+        for row in cursor.fetchall():
+            result = dict(row)
+            result['snippet'] = highlight(result['snippet'])
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def rebuild_search_index(conn):
+        """Rebuild weekly_logs_fts from weekly_logs"""
+        conn.execute("INSERT INTO weekly_logs_fts (weekly_logs_fts) VALUES ('rebuild')")
+    
+    @staticmethod
+    def optimize_search_index(conn):
+        """Merge the index b-trees into one for faster queries"""
+        conn.execute("INSERT INTO weekly_logs_fts (weekly_logs_fts) VALUES ('optimize')")
\ No newline at end of file
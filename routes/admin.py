@@ -0,0 +1,34 @@
+"""
+Admin routes
+"""
+
+from flask import Blueprint, Response, abort, jsonify, render_template, request
+from database.tracing import sql_tracer
+from utils.auth import role_required
+from utils.directory import USER_TYPES, directory
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/')
+@role_required('admin')
+def dashboard():
+    """Dashboard"""
+    return render_template('admin/dashboard.html')
+
+@admin_bp.route('/metrics')
+@role_required('admin')
+def metrics():
+    """Request and SQL metrics for this worker in Prometheus text format"""
+    return Response(sql_tracer.render(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/directory')
+@role_required('admin')
+def directory_search():
+    """Typeahead over every student and supervisor"""
+    user_type = request.args.get('type')
+    if user_type is not None and user_type not in USER_TYPES:
+        abort(400, description='type must be student or supervisor')
+    results = directory.search(request.args.get('q', ''), user_type=user_type,
+                               department=request.args.get('department'),
+                               level=request.args.get('level'))
+    return jsonify({'results': results})
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Authentication routes
+"""
+
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required, login_user, logout_user
+from models.user import User
+from utils.auth import LoginBusy
+
+auth_bp = Blueprint('auth', __name__)
+
+@auth_bp.route('/login', methods=['GET', 'POST'])
+def login():
+    """Log in with email and password"""
+    if current_user.is_authenticated:
+        return redirect(url_for('index'))
+    if request.method == 'POST':
+        email = request.form.get('email', '').strip().lower()
+        try:
+            user = User.authenticate(email, request.form.get('password', ''))
+        except LoginBusy as e:
+            abort(503, description=str(e))
+        if user is not None:
+            login_user(user, remember=bool(request.form.get('remember')))
+            user.log_activity('login', ip_address=request.remote_addr,
+                              user_agent=request.user_agent.string)
+            return redirect(url_for('index'))
+        flash('Invalid email or password.', 'danger')
+    return render_template('login.html')
+
+@auth_bp.route('/logout')
+@login_required
+def logout():
+    """Log out"""
+    logout_user()
+    return redirect(url_for('auth.login'))
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Upload downloads
+"""
+
+from flask import Blueprint, abort, current_app, request, url_for
+from flask_login import current_user, login_required
+from models.file_upload import FileUpload
+from utils.uploads import RENDITION_TYPES, content_tag, gallery_path, send_upload
+
+files_bp = Blueprint('files', __name__)
+
+RENDITION_SIZES = {'thumb', 'web'}
+
+@files_bp.app_template_global()
+def upload_url(upload, size=None):
+    """Download URL for a file_uploads row, versioned by content hash"""
+    file_path = upload['file_path']
+    if size is not None:
+        file_path = gallery_path(file_path, size, current_app.config['UPLOAD_FOLDER'])
+    return url_for('files.download', upload_id=upload['id'], size=size,
+                   v=content_tag(file_path))
+
+@files_bp.route('/<int:upload_id>')
+@login_required
+def download(upload_id):
+    """Send an upload (or ?size=thumb|web of a workspace photo)
+    
+    Files the user may not see are reported missing rather than forbidden.
+    """
+    upload = FileUpload.get_for_user(upload_id, current_user)
+    if upload is None:
+        abort(404)
+    file_path = upload['file_path']
+    size = request.args.get('size')
+    if size is not None:
+        if size not in RENDITION_SIZES or upload['file_type'] not in RENDITION_TYPES:
+            abort(404)
+        file_path = gallery_path(file_path, size, current_app.config['UPLOAD_FOLDER'])
+    
+    # A URL carrying the content hash always names the same bytes
+    tag = content_tag(file_path)
+    immutable = tag is not None and request.args.get('v') == tag
+    download_name = upload['file_name'] if size is None else None
+    return send_upload(file_path, current_app.config, download_name=download_name,
+                       immutable=immutable)
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+HOD routes
+"""
+
+from datetime import date
+from flask import (Blueprint, Response, abort, current_app, jsonify, render_template, request,
+                   send_file, stream_with_context)
+from flask_login import current_user
+from database.connection import get_read_db
+from database.versions import entities
+from models.analytics import EvaluationAnalytics
+from models.internship import STATUSES
+from models.reporting import DepartmentReport
+from models.student import LEVELS
+from models.weekly_log import STATUSES as LOG_STATUSES
+from models.weekly_log import WeeklyLog, search_json
+from utils.auth import role_required
+from utils.directory import USER_TYPES, directory
+from utils.export import DATASETS, FORMATS, Export, ExportError, parse_filters
+from utils.fragments import fragment_cache
+from utils.pdf_generator import department_pdfs, get_summary_pdf, stream_zip
+
+hod_bp = Blueprint('hod', __name__)
+
+@hod_bp.route('/')
+@role_required('hod')
+def dashboard():
+    """Dashboard"""
+    try:
+        interns = intern_table(current_department(), request.args.get('cursor'),
+                               current_user.id)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return render_template('hod/dashboard.html', profile=current_user.get_profile_data(),
+                           interns=interns)
+
+def intern_table(department, cursor=None, user_id=None):
+    """The dashboard's intern table fragment (benchmarks/run.py times it too)"""
+    def load():
+        # Totals cover the whole department, the table one keyset page of it
+        return {'totals': DepartmentReport.rollup(department)['totals'], 'cursor': cursor,
+                'page': DepartmentReport.page(department, cursor=cursor)}
+    
+    # Logs expected grow by the day, so the date is part of the key
+    return fragment_cache.render('hod/_intern_table.html', entities('department', department),
+                                 load, user_id=user_id, vary=(date.today(), cursor))
+
+@hod_bp.route('/monitor')
+@role_required('hod')
+def monitor():
+    """Progress of every student in the department, optionally one level"""
+    level = request.args.get('level')
+    if level is not None and level not in LEVELS:
+        abort(400, description=f"level must be one of {', '.join(LEVELS)}")
+    report = DepartmentReport.rollup(current_department(), level)
+    return render_template('hod/monitor.html', report=report)
+
+def current_department():
+    """Department of the logged-in HOD"""
+    profile = current_user.get_profile_data()
+    if profile is None:
+        abort(403)
+    return profile['department']
+
+@hod_bp.route('/export/<dataset>.<fmt>')
+@role_required('hod')
+def export(dataset, fmt):
+    """Stream a department export (weekly logs, attendance or evaluations)"""
+    if dataset not in DATASETS or fmt not in FORMATS:
+        abort(404)
+    department = current_department()
+    try:
+        job = Export(current_app.extensions['db_manager'], dataset, department,
+                     **parse_filters(request.args))
+        total = job.count()
+        body = job.stream(fmt)
+    except ExportError as e:
+        abort(400, description=str(e))
+    
+    current_user.log_activity('export', entity_type=dataset)
+    response = Response(stream_with_context(body), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{job.filename(fmt)}"'
+    # Lets clients show progress for large exports
+    response.headers['X-Export-Rows'] = str(total)
+    return response
+
+@hod_bp.route('/summary/<int:placement_id>.pdf')
+@role_required('hod')
+def summary(placement_id):
+    """Download the summary PDF of a placement in the HOD's department"""
+    path = get_summary_pdf(get_read_db(), placement_id, current_app.config['PDF_CACHE_DIR'],
+                           department=current_department())
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/pdf', as_attachment=True,
+                     download_name=f'internship-summary-{placement_id}.pdf')
+
+@hod_bp.route('/summaries.zip')
+@role_required('hod')
+def summaries():
+    """Stream a ZIP of the department's summary PDFs (?status= to filter)"""
+    status = request.args.get('status')
+    if status is not None and status not in STATUSES:
+        abort(400, description=f"status must be one of {', '.join(STATUSES)}")
+    department = current_department()
+    config = current_app.config
+    # The pack is read while it streams, so it gets its own connection
+    # rather than holding one of the request pool's readers
+    conn = current_app.extensions['db_manager'].connect_readonly()
+    entries = department_pdfs(conn, department, config['PDF_CACHE_DIR'], status=status)
+    
+    current_user.log_activity('export', entity_type='summaries')
+    response = Response(stream_zip(entries, config['PDF_RENDER_WORKERS']),
+                        mimetype='application/zip')
+    response.call_on_close(conn.close)
+    filename = f"{department.replace(' ', '_')}-summaries.zip"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@hod_bp.route('/directory')
+@role_required('hod')
+def directory_search():
+    """Typeahead over the HOD's students and all supervisors"""
+    user_type = request.args.get('type')
+    if user_type is not None and user_type not in USER_TYPES:
+        abort(400, description='type must be student or supervisor')
+    results = directory.search(request.args.get('q', ''), user_type=user_type,
+                               department=current_department(),
+                               level=request.args.get('level'))
+    return jsonify({'results': results})
+
+@hod_bp.route('/logs/search')
+@role_required('hod')
+def log_search():
+    """Full-text search over the weekly logs of the HOD's department"""
+    status = request.args.get('status')
+    if status is not None and status not in LOG_STATUSES:
+        abort(400, description=f"status must be one of {', '.join(LOG_STATUSES)}")
+    results = WeeklyLog.search(request.args.get('q', ''), department=current_department(),
+                               status=status, limit=request.args.get('limit', 20, type=int))
+    return jsonify(search_json(results))
+
+@hod_bp.route('/analytics')
+@role_required('hod')
+def analytics():
+    """Evaluation analytics of the HOD's department as chart JSON"""
+    try:
+        report = EvaluationAnalytics.report(request.args.get('year'), current_department())
+    except ValueError as e:
+        abort(400, description=str(e))
+    return jsonify(report)
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Student routes
+"""
+
+from datetime import date
+from flask import Blueprint, abort, current_app, jsonify, render_template, request, send_file
+from flask_login import current_user
+from database.connection import get_read_db
+from database.versions import entities
+from models.attendance import Attendance, results_json
+from models.weekly_log import WeeklyLog
+from utils.auth import role_required
+from utils.fragments import fragment_cache
+from utils.pdf_generator import get_summary_pdf
+
+student_bp = Blueprint('student', __name__)
+
+@student_bp.route('/')
+@role_required('student')
+def dashboard():
+    """Dashboard"""
+    profile = current_user.get_profile_data()
+    if profile is None:
+        abort(403)
+    student_id = profile['id']
+    attendance = fragment_cache.render(
+        'student/_attendance.html',
+        entities('student', student_id, ('attendance', 'internship_placements')),
+        lambda: {'summaries': Attendance.summary_for_student(student_id)},
+        user_id=current_user.id)
+    timeline = fragment_cache.render(
+        'student/_log_timeline.html',
+        entities('student', student_id, ('weekly_logs',)),
+        lambda: {'page': WeeklyLog.list_for_student(student_id)},
+        user_id=current_user.id)
+    return render_template('student/dashboard.html', profile=profile,
+                           attendance=attendance, timeline=timeline)
+
+@student_bp.route('/attendance', methods=['POST'])
+@role_required('student')
+def mark_attendance():
+    """Record (or update) the student's own attendance for today"""
+    profile = current_user.get_profile_data()
+    if profile is None:
+        abort(403)
+    data = request.get_json(silent=True) or request.form
+    cell = {
+        'student_id': profile['id'],
+        'date': data.get('date') or date.today().isoformat(),
+        'status': data.get('status') or 'present'
+    }
+    for name in ('check_in_time', 'check_out_time', 'remarks'):
+        cell[name] = data.get(name)
+    
+    results = Attendance.mark_grid([cell], student_id=profile['id'])
+    status = 400 if results[0].result == 'rejected' else 200
+    return jsonify(results_json(results)), status
+
+@student_bp.route('/summary/<int:placement_id>.pdf')
+@role_required('student')
+def summary(placement_id):
+    """Download the summary PDF of one of the student's own placements"""
+    profile = current_user.get_profile_data()
+    if profile is None:
+        abort(403)
+    path = get_summary_pdf(get_read_db(), placement_id, current_app.config['PDF_CACHE_DIR'],
+                           student_id=profile['id'])
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/pdf', as_attachment=True,
+                     download_name=f'internship-summary-{placement_id}.pdf')
\ No newline at end of file
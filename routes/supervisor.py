@@ -0,0 +1,72 @@
+"""
+Organization supervisor routes
+"""
+
+from flask import Blueprint, abort, jsonify, render_template, request
+from flask_login import current_user
+from database.versions import entities
+from models.attendance import Attendance, expand_grid, results_json
+from models.internship import Internship
+from models.weekly_log import STATUSES as LOG_STATUSES
+from models.weekly_log import WeeklyLog, search_json
+from utils.auth import role_required
+from utils.fragments import fragment_cache
+
+supervisor_bp = Blueprint('supervisor', __name__)
+
+@supervisor_bp.route('/')
+@role_required('supervisor')
+def dashboard():
+    """Dashboard"""
+    email = current_user.email
+    cursor = request.args.get('cursor')
+    try:
+        interns = fragment_cache.render(
+            'supervisor/_intern_table.html',
+            entities('supervisor', email, ('students', 'attendance', 'internship_placements')),
+            lambda: {'interns': Internship.list_for_supervisor(email, cursor=cursor),
+                     'cursor': cursor},
+            user_id=current_user.id, vary=(cursor,))
+    except ValueError as e:
+        abort(400, description=str(e))
+    return render_template('supervisor/dashboard.html', profile=current_user.get_profile_data(),
+                           interns=interns)
+
+@supervisor_bp.route('/attendance', methods=['POST'])
+@role_required('supervisor')
+def mark_attendance():
+    """Mark attendance for many interns and days in one request
+    
+    Takes JSON, either {"cells": [{"student_id", "date", "status", ...}]}
+    or a grid {"dates": [...], "marks": {"<student_id>": [status per date]}}.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        abort(400, description='Expected a JSON object')
+    try:
+        if 'cells' in payload:
+            cells = payload['cells']
+            if not isinstance(cells, list) or not all(isinstance(cell, dict) for cell in cells):
+                raise ValueError('cells must be a list of objects')
+        else:
+            cells = expand_grid(payload.get('dates', []), payload.get('marks', {}))
+        if not cells:
+            raise ValueError('No attendance cells given')
+        results = Attendance.mark_grid(cells, supervisor_email=current_user.email)
+    except ValueError as e:
+        abort(400, description=str(e))
+    
+    current_user.log_activity('mark_attendance', entity_type='attendance')
+    return jsonify(results_json(results))
+
+@supervisor_bp.route('/logs/search')
+@role_required('supervisor')
+def log_search():
+    """Full-text search over the weekly logs of the supervisor's interns"""
+    status = request.args.get('status')
+    if status is not None and status not in LOG_STATUSES:
+        abort(400, description=f"status must be one of {', '.join(LOG_STATUSES)}")
+    results = WeeklyLog.search(request.args.get('q', ''), supervisor_email=current_user.email,
+                               placement_id=request.args.get('placement_id', type=int),
+                               status=status, limit=request.args.get('limit', 20, type=int))
+    return jsonify(search_json(results))
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Shared fixtures: an application on a migrated, empty database file
+"""
+
+import pytest
+from app import create_app
+from config import config
+from database.connection import get_db
+from database.migrations import migrate
+from models import analytics, reporting
+from utils.auth import hash_password
+
+PASSWORD = 'password123'
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # A file rather than :memory: so pooled readers see WAL snapshots as in production
+    monkeypatch.setattr(config['testing'], 'SQLALCHEMY_DATABASE_URI',
+                        f"sqlite:///{tmp_path / 'bids.db'}")
+    # Years and departments repeat across test databases, so start every test with
+    # empty score tables and report snapshots
+    analytics._tables.clear()
+    reporting._snapshots.clear()
+    app = create_app('testing')
+    uploads = tmp_path / 'uploads'
+    app.config.update(
+        ARCHIVE_DIR=str(tmp_path / 'archive'),
+        PDF_CACHE_DIR=str(tmp_path / 'pdf_cache'),
+        UPLOAD_FOLDER=str(uploads),
+        WORKFLOW_CHARTS_PATH=str(uploads / 'workflow_charts'),
+        WORKSPACE_PHOTOS_PATH=str(uploads / 'workspace_photos'),
+        DOCUMENTS_PATH=str(uploads / 'documents'),
+        COMPLIANCE_EMAIL=False
+    )
+    with app.app_context():
+        migrate(get_db())
+        yield app
+    app.extensions['db_manager'].close()
+
+@pytest.fixture
+def db(app):
+    """The app context's writer connection"""
+    return get_db()
+
+@pytest.fixture
+def make(db):
+    return Factory(db)
+
+@pytest.fixture
+def login(app):
+    """Return a test client logged in as the given user id"""
+    def login(user_id):
+        email = get_db().execute('SELECT email FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+        client = app.test_client()
+        response = client.post('/auth/login', data={'email': email, 'password': PASSWORD})
+        assert response.status_code == 302
+        return client
+    return login
+
+class Factory:
+    """Inserts rows straight into the database, committing each one"""
+    
+    def __init__(self, db):
+        self.db = db
+        self.count = 0
+        self._password_hash = None
+    
+    def _insert(self, table, **values):
+        cursor = self.db.execute(
+            f"INSERT INTO {table} ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+            list(values.values()))
+        self.db.commit()
+        return cursor.lastrowid
+    
+    def user(self, user_type, full_name=None, email=None, **values):
+        self.count += 1
+        if self._password_hash is None:
+            self._password_hash = hash_password(PASSWORD)
+        return self._insert('users', email=email or f'{user_type}{self.count}@example.com',
+                            password_hash=self._password_hash,
+                            full_name=full_name or f'{user_type.title()} {self.count}',
+                            user_type=user_type, **values)
+    
+    def student(self, full_name=None, department='Computer Science', level='300', **values):
+        """Returns the students.id of a new student account"""
+        user_id = self.user('student', full_name, **values)
+        return self._insert('students', user_id=user_id, student_id=f'BU/{self.count:05d}',
+                            department=department, level=level,
+                            matriculation_number=f'MAT{self.count:05d}')
+    
+    def student_user(self, student_id):
+        """The user id of a students.id"""
+        return self.db.execute('SELECT user_id FROM students WHERE id = ?',
+                               (student_id,)).fetchone()[0]
+    
+    def hod(self, department='Computer Science'):
+        """Returns the user id of a new HOD"""
+        user_id = self.user('hod')
+        self._insert('hods', user_id=user_id, staff_id=f'STAFF{self.count:05d}',
+                     department=department, designation='Head of Department')
+        return user_id
+    
+    def supervisor(self, organization_name='Acme Ltd', full_name=None):
+        """Returns the user id of a new organization supervisor"""
+        user_id = self.user('supervisor', full_name)
+        self._insert('organization_supervisors', user_id=user_id,
+                     organization_name=organization_name)
+        return user_id
+    
+    def placement(self, student_id, start_date='2024-09-02', end_date='2024-12-20',
+                  status='active', supervisor_email='supervisor@example.com', **values):
+        values.setdefault('organization_name', 'Acme Ltd')
+        values.setdefault('department', 'Engineering')
+        return self._insert('internship_placements', student_id=student_id,
+                            organization_address='1 Main Street',
+                            supervisor_name='Sam Supervisor', supervisor_email=supervisor_email,
+                            start_date=start_date, end_date=end_date, status=status, **values)
+    
+    def row(self, table, **values):
+        return self._insert(table, **values)
\ No newline at end of file
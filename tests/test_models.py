@@ -0,0 +1,899 @@
+"""
+Model and data-layer tests
+"""
+
+import json
+import os
+import sqlite3
+from datetime import date, timedelta
+import pytest
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from database import versions
+from database.archive import archive_path, archive_year, history
+from database.importer import import_users
+from database.migrations import BASELINE_PATH, LATEST, SCHEMA_PATH, current_version, migrate
+from models.analytics import ScoreTable
+from models.attendance import Attendance, expand_grid
+from models.compliance import Compliance
+from models.file_upload import FileUpload
+from models.notification import Notification
+from models.reporting import DepartmentReport
+from models.user import User
+from models.weekly_log import WeeklyLog
+from tests.conftest import PASSWORD
+from utils.audit import rollover_activity_logs
+from utils.auth import hash_password, needs_rehash
+
+# Archiving
+
+YEAR = '2023/2024'
+PLACEMENT_TABLES = (('internship_placements', 'id'), ('attendance', 'placement_id'),
+                    ('weekly_logs', 'placement_id'), ('evaluations', 'placement_id'),
+                    ('file_uploads', 'placement_id'), ('attendance_summary', 'placement_id'))
+
+def _archive(app):
+    return archive_year(app.extensions['db_manager'], YEAR, app.config['ARCHIVE_DIR'], '2024/2025')
+
+def _rows(conn, sql, params=()):
+    return [dict(row) for row in conn.execute(sql, params)]
+
+def _open_archive(app):
+    conn = sqlite3.connect(archive_path(app.config['ARCHIVE_DIR'], YEAR),
+                           detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+@pytest.fixture
+def year_data(make):
+    student = make.student()
+    old = make.placement(student, '2023-09-11', '2023-12-15', status='completed')
+    running = make.placement(student, '2023-10-02', '2024-06-28', status='active')
+    new = make.placement(student, '2024-09-02', '2024-12-20', status='completed')
+    for placement, day in ((old, '2023-09-11'), (running, '2023-10-02'), (new, '2024-09-02')):
+        make.row('attendance', student_id=student, placement_id=placement, date=day,
+                 status='present')
+        make.row('weekly_logs', student_id=student, placement_id=placement, week_number=1,
+                 week_start_date=day, week_end_date=day, activities=f'Week one of {placement}')
+    evaluator = make.hod()
+    make.row('evaluations', student_id=student, placement_id=old, evaluator_id=evaluator,
+             evaluator_type='hod', overall_rating=4)
+    make.row('file_uploads', student_id=student, placement_id=old, file_type='document',
+             file_name='letter.pdf', file_path='documents/letter.pdf')
+    make.row('activity_logs', user_id=evaluator, action='login', created_at='2023-10-01 09:00:00')
+    make.row('activity_logs', user_id=evaluator, action='login', created_at='2024-10-01 09:00:00')
+    return {'student': student, 'old': old, 'running': running, 'new': new}
+
+def test_archive_moves_finished_placements_of_the_year(app, db, year_data):
+    before = {table: _rows(db, f'SELECT * FROM {table} WHERE {column} = ?', (year_data['old'],))
+              for table, column in PLACEMENT_TABLES}
+    
+    moved = _archive(app)
+    
+    assert moved == {'internship_placements': 1, 'attendance': 1, 'weekly_logs': 1,
+                     'evaluations': 1, 'file_uploads': 1, 'attendance_summary': 1,
+                     'activity_logs': 1}
+    # Copied column for column, then deleted from the live database
+    archive = _open_archive(app)
+    for table, column in PLACEMENT_TABLES:
+        assert _rows(archive, f'SELECT * FROM {table}') == before[table]
+        assert _rows(db, f'SELECT * FROM {table} WHERE {column} = ?', (year_data['old'],)) == []
+    assert [str(row['created_at']) for row in _rows(archive, 'SELECT * FROM activity_logs')] == [
+        '2023-10-01 09:00:00']
+    archive.close()
+    
+    live = {row['id'] for row in _rows(db, 'SELECT id FROM internship_placements')}
+    assert live == {year_data['running'], year_data['new']}
+    assert len(_rows(db, 'SELECT * FROM weekly_logs')) == 2
+
+def test_archive_rerun_and_current_year(app, year_data):
+    _archive(app)
+    assert set(_archive(app).values()) == {0}
+    with pytest.raises(ValueError):
+        archive_year(app.extensions['db_manager'], '2024/2025', app.config['ARCHIVE_DIR'],
+                     '2024/2025')
+
+def test_archive_copies_by_column_name(app, db, year_data):
+    # An archive made before created_at existed, with its columns in another order
+    columns = [row[1] for row in db.execute('PRAGMA table_info(internship_placements)')
+               if row[1] != 'created_at']
+    path = archive_path(app.config['ARCHIVE_DIR'], YEAR)
+    os.makedirs(app.config['ARCHIVE_DIR'])
+    archive = sqlite3.connect(path)
+    archive.execute(f"CREATE TABLE internship_placements ({', '.join(reversed(columns))})")
+    archive.close()
+    expected = _rows(db, 'SELECT * FROM internship_placements WHERE id = ?', (year_data['old'],))
+    
+    _archive(app)
+    
+    # The hand-made columns have no declared types, so compare as text
+    archive = _open_archive(app)
+    archived = _rows(archive, f"SELECT {', '.join(expected[0])} FROM internship_placements")
+    archive.close()
+    assert [{k: str(v) for k, v in row.items()} for row in archived] == [
+        {k: str(v) for k, v in row.items()} for row in expected]
+
+def test_history_views_span_live_and_archived_rows(app, year_data):
+    _archive(app)
+    with history(app.extensions['db_manager'], app.config['ARCHIVE_DIR']) as conn:
+        placements = {row['id']: row['archive_year'] for row in conn.execute(
+            'SELECT id, archive_year FROM all_internship_placements WHERE student_id = ?',
+            (year_data['student'],))}
+        logs = conn.execute('SELECT COUNT(*) FROM all_weekly_logs').fetchone()[0]
+    assert placements == {year_data['old']: YEAR, year_data['running']: None,
+                          year_data['new']: None}
+    assert logs == 3
+    
+    from models.internship import Internship
+    with current_app.test_request_context():
+        history_ids = [row['id'] for row in Internship.history_for_student(year_data['student'])]
+    assert history_ids == [year_data['new'], year_data['running'], year_data['old']]
+
+def test_archive_and_history_include_rolled_over_months(app, db, make, year_data):
+    make.row('activity_logs', user_id=make.user('admin'), action='logout',
+             created_at='2023-11-05 17:00:00')
+    manager = app.extensions['db_manager']
+    rollover_activity_logs(manager, older_than_days=0)
+    assert _rows(db, 'SELECT * FROM activity_logs') == []
+    
+    def logs():
+        with history(manager, app.config['ARCHIVE_DIR']) as conn:
+            return sorted((str(row['created_at']), row['archive_year']) for row in conn.execute(
+                'SELECT created_at, archive_year FROM all_activity_logs'))
+    
+    assert logs() == [('2023-10-01 09:00:00', None), ('2023-11-05 17:00:00', None),
+                      ('2024-10-01 09:00:00', None)]
+    
+    assert _archive(app)['activity_logs'] == 2
+    assert logs() == [('2023-10-01 09:00:00', YEAR), ('2023-11-05 17:00:00', YEAR),
+                      ('2024-10-01 09:00:00', None)]
+    tables = [row[0] for row in db.execute(
+        "SELECT name FROM sqlite_master WHERE name LIKE 'activity_logs_%' ORDER BY name")]
+    assert tables == ['activity_logs_2024_10']
+
+# Compliance
+
+# Reporting week for this date: Monday 2025-03-10 to Sunday 2025-03-16
+TODAY = date(2025, 3, 19)
+
+def _notifications(db, user_id):
+    return [(row['type'], row['message']) for row in db.execute(
+        'SELECT type, message FROM notifications WHERE user_id = ? ORDER BY id', (user_id,))]
+
+def _student_user(db, student_id):
+    return db.execute('SELECT user_id FROM students WHERE id = ?', (student_id,)).fetchone()[0]
+
+@pytest.fixture
+def interns(make):
+    """Three interns of one supervisor, placed from Monday 2025-02-24 (week 3 is due)"""
+    hod = make.hod()
+    supervisor = make.supervisor()
+    email = make.db.execute('SELECT email FROM users WHERE id = ?', (supervisor,)).fetchone()[0]
+    placed = {}
+    for name in ('silent', 'behind', 'current'):
+        student = make.student(full_name=name.title())
+        placed[name] = (student, make.placement(student, '2025-02-24', '2025-06-27',
+                                                supervisor_email=email))
+    for name, weeks in (('behind', (2,)), ('current', (1, 2, 3))):
+        student, placement = placed[name]
+        for week in weeks:
+            make.row('weekly_logs', student_id=student, placement_id=placement,
+                     week_number=week, week_start_date='2025-02-24',
+                     week_end_date='2025-02-28', activities='Work', status='submitted')
+    return hod, supervisor, placed
+
+def test_missing_log_week_number_and_escalation(app, db, interns):
+    hod, supervisor, placed = interns
+    
+    run, = Compliance.run(today=TODAY, checks=('missing_log',))
+    
+    assert (run.period, run.placements, run.reminders, run.escalations) == ('2025-W11', 2, 2, 2)
+    reminder = ('reminder', 'Your weekly log for week 3 has not been submitted yet.')
+    assert _notifications(db, _student_user(db, placed['silent'][0])) == [reminder]
+    assert _notifications(db, _student_user(db, placed['behind'][0])) == [reminder]
+    assert _notifications(db, _student_user(db, placed['current'][0])) == []
+    # Only 'silent' has missed two weeks in a row (weeks 2 and 3)
+    alert = ('alert', '1 of your interns have not submitted a weekly log for 2 weeks in a row.')
+    assert _notifications(db, supervisor) == [alert]
+    assert _notifications(db, hod) == [alert]
+    
+    # Once per check and week unless forced
+    again, = Compliance.run(today=TODAY, checks=('missing_log',))
+    assert again.skipped and len(_notifications(db, hod)) == 1
+    forced, = Compliance.run(today=TODAY, checks=('missing_log',), force=True)
+    assert not forced.skipped and len(_notifications(db, hod)) == 2
+
+def test_attendance_gap_counts_unmarked_weekdays(app, db, make, interns):
+    hod, supervisor, placed = interns
+    student, placement = placed['current']
+    for day in ('2025-03-10', '2025-03-11', '2025-03-12'):
+        make.row('attendance', student_id=student, placement_id=placement, date=day,
+                 status='present')
+    
+    run, = Compliance.run(today=TODAY, checks=('attendance_gap',))
+    
+    assert (run.placements, run.reminders) == (3, 3)
+    assert _notifications(db, _student_user(db, student)) == [
+        ('reminder', '2 day(s) in the week of 2025-03-10 have no attendance record.')]
+    assert _notifications(db, _student_user(db, placed['silent'][0])) == [
+        ('reminder', '5 day(s) in the week of 2025-03-10 have no attendance record.')]
+    # Two interns reach COMPLIANCE_GAP_DAYS (3); the one with two gaps does not
+    assert _notifications(db, hod) == [
+        ('alert', '2 of your interns have 3 or more unmarked days in the week of 2025-03-10.')]
+
+# Evaluation analytics
+
+def _scores(placement, by_hod, score, level='300'):
+    """A score row with every criterion set to score"""
+    return ((placement, placement + 10, by_hod, 'Computer Science', level, 'Acme Ltd')
+            + (score,) * 6)
+
+@pytest.fixture
+def scores():
+    return ScoreTable('2024/2025', [
+        # Both sides rated 1 and 2: HOD one point above, then one below
+        _scores(1, 1, 5), _scores(1, 0, 4),
+        _scores(2, 1, 2), _scores(2, 0, 3),
+        # Supervisor only; 4 ties with 2
+        _scores(3, 0, 1, level='400'), _scores(4, 0, 2.5),
+        # Nothing rated
+        _scores(5, 0, None)
+    ])
+
+def test_analytics_gaps_pair_hod_and_supervisor_scores(scores):
+    gaps = scores.report()['gaps']
+    
+    hod, supervisor, gap = (series['data'] for series in gaps['series'])
+    assert hod == [3.5] * 6 and supervisor == [3.5] * 6 and gap == [0.0] * 6
+    assert gaps['mean_absolute_gap'] == [1.0] * 6
+    assert gaps['correlation'] == [1.0] * 6
+    assert gaps['pairs'] == [2] * 6
+    assert gaps['overall_gap']['data'] == [0, 0, 0, 1, 0, 1, 0, 0, 0]
+
+def test_analytics_ranks_share_percentiles_on_ties(scores):
+    ranks = scores.report()['ranks']
+    
+    assert ranks['placement_id'] == [1, 2, 4, 3]
+    assert ranks['student_id'] == [11, 12, 14, 13]
+    assert ranks['level'] == ['300', '300', '300', '400']
+    assert ranks['score'] == [4.5, 2.5, 2.5, 1.0]
+    assert ranks['percentile'] == [87.5, 50.0, 50.0, 12.5]
+
+def test_analytics_department_filter(scores):
+    assert scores.report('Computer Science')['placements'] == 5
+    empty = scores.report('Mathematics')
+    assert (empty['evaluations'], empty['ranks']['placement_id']) == (0, [])
+    assert empty['gaps']['pairs'] == [0] * 6
+
+# Bulk import
+
+CSV_HEADER = ('user_type,email,full_name,password,student_id,department,level,'
+              'matriculation_number,organization_name,organization_address,'
+              'placement_department,supervisor_name,supervisor_email,start_date,end_date')
+
+def _import(app, tmp_path, name, text, chunk_size=2):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return import_users(app.extensions['db_manager'], str(path), chunk_size=chunk_size,
+                        workers=1)
+
+def test_import_csv_creates_users_and_placements(app, db, make, tmp_path):
+    make.student('Existing', email='taken@example.com')
+    before = versions.current(db, ['students', 'students:department:Computer Science'])
+    lines = [
+        CSV_HEADER,
+        ',Ada@Example.com,Ada Lovelace,secret1,BU/10001,Computer Science,300,M10001,'
+        'Acme Ltd,1 Main Street,Engineering,Sam Supervisor,Sam@Acme.com,2024-09-02,2024-12-20',
+        'supervisor,grace@example.com,Grace Hopper,secret2,,,,,Navy Labs,,,,,,',
+        'student,alan@example.com,Alan Turing,secret3,BU/10002,Computer Science,250,M10002,'
+        ',,,,,,',
+        'student,taken@example.com,Someone Else,secret4,BU/10003,Computer Science,300,M10003,'
+        ',,,,,,',
+        'student,barbara@example.com,Barbara Liskov,secret5,BU/10004,Computer Science,400,'
+        'M10001,,,,,,,',
+        'student,edsger@example.com,Edsger Dijkstra,,BU/10005,Computer Science,400,M10005,'
+        ',,,,,,',
+        'student,donald@example.com,Donald Knuth,secret6,BU/10006,Computer Science,300,M10006,'
+        'Acme Ltd,,,,,,'
+    ]
+    
+    report = _import(app, tmp_path, 'users.csv', '\n'.join(lines) + '\n')
+    
+    assert (report.rows, report.users, report.placements, report.duplicates) == (7, 2, 1, 2)
+    assert report.errors == [
+        (4, 'level must be one of 200, 300, 400'),
+        (7, 'missing password'),
+        (8, 'incomplete placement, missing end_date, organization_address, '
+            'placement_department, start_date, supervisor_email, supervisor_name'),
+        (5, 'duplicate email taken@example.com'),
+        (6, 'duplicate student_id or matriculation_number')
+    ]
+    users = {row['email']: row['user_type'] for row in db.execute('SELECT * FROM users')}
+    assert users == {'taken@example.com': 'student', 'ada@example.com': 'student',
+                     'grace@example.com': 'supervisor'}
+    placement = db.execute(
+        '''SELECT s.student_id, ip.supervisor_email, ip.department FROM internship_placements ip
+           JOIN students s ON s.id = ip.student_id''').fetchone()
+    assert tuple(placement) == ('BU/10001', 'sam@acme.com', 'Engineering')
+    assert db.execute('SELECT organization_name FROM organization_supervisors').fetchone()[0] == (
+        'Navy Labs')
+    after = versions.current(db, ['students', 'students:department:Computer Science'])
+    assert after[0] == before[0] and after[1] > before[1]
+
+def test_import_jsonl_reports_bad_rows_per_line(app, db, tmp_path):
+    student = {'email': 'ada@example.com', 'full_name': 'Ada Lovelace', 'password': 'secret1',
+               'student_id': 'BU/10001', 'department': 'Computer Science', 'level': 300,
+               'matriculation_number': 'M10001'}
+    lines = [
+        json.dumps(student),
+        '{not json',
+        json.dumps(['a list']),
+        json.dumps({**student, 'email': 42}),
+        '',
+        json.dumps({**student, 'email': 'alan@example.com', 'level': True}),
+        json.dumps({**student, 'email': 'grace@example.com', 'user_type': 'admin'}),
+        json.dumps({**student, 'email': 'ada@example.com', 'student_id': 'BU/10002'})
+    ]
+    
+    report = _import(app, tmp_path, 'users.jsonl', '\n'.join(lines), chunk_size=10)
+    
+    assert (report.rows, report.users, report.duplicates) == (7, 1, 1)
+    assert [line for line, _ in report.errors] == [2, 3, 4, 6, 7, 8]
+    messages = dict(report.errors)
+    assert messages[2].startswith('invalid JSON')
+    assert messages[3] == 'not an object'
+    assert messages[4] == 'email must be text'
+    assert messages[6] == 'level must be text or a number'
+    assert messages[7] == "unsupported user_type 'admin'"
+    assert messages[8] == 'duplicate email ada@example.com'
+    level, = db.execute("SELECT level FROM students WHERE student_id = 'BU/10001'").fetchone()
+    assert level == '300'
+
+# Migrations
+
+def _schema_of(conn):
+    """Every table's columns and every index, trigger and view's SQL"""
+    schema = {}
+    for kind, name, sql in conn.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"):
+        if kind == 'table':
+            schema[name] = [tuple(column) for column in conn.execute(
+                f'PRAGMA table_xinfo("{name}")')]
+        else:
+            schema[name] = ' '.join((sql or '').split())
+    return schema
+
+def _built_from(path, script):
+    conn = sqlite3.connect(path)
+    with open(script) as f:
+        conn.executescript(f.read())
+    return conn
+
+def test_migrations_build_the_schema_sql_database(tmp_path):
+    migrated = sqlite3.connect(tmp_path / 'migrated.db')
+    migrate(migrated)
+    written = _built_from(tmp_path / 'written.db', SCHEMA_PATH)
+    
+    assert _schema_of(migrated) == _schema_of(written)
+    # A database built from schema.sql starts at version 0 and must migrate cleanly
+    migrate(written)
+    assert current_version(written) == LATEST
+    assert _schema_of(migrated) == _schema_of(written)
+
+def test_baseline_database_upgrades_with_backfill(tmp_path):
+    conn = _built_from(tmp_path / 'baseline.db', BASELINE_PATH)
+    conn.executescript('''
+        INSERT INTO users (id, email, password_hash, full_name, user_type)
+        VALUES (1, 'ada@example.com', 'x', 'Ada Lovelace', 'student');
+        INSERT INTO students (id, user_id, student_id, department, level, matriculation_number)
+        VALUES (1, 1, 'BU/00001', 'Computer Science', '300', 'MAT00001');
+        INSERT INTO internship_placements
+            (id, student_id, organization_name, organization_address, department,
+             supervisor_name, supervisor_email, start_date, end_date)
+        VALUES (1, 1, 'Acme Ltd', '1 Main Street', 'Engineering', 'Sam', 'sam@acme.com',
+                '2024-09-02', '2024-12-20');
+        INSERT INTO attendance (student_id, placement_id, date, status) VALUES
+            (1, 1, '2024-09-02', 'present'), (1, 1, '2024-09-03', 'late'),
+            (1, 1, '2024-09-04', 'present');
+        INSERT INTO notifications (user_id, title, message, type, is_read) VALUES
+            (1, 'A', 'a', 'info', 0), (1, 'B', 'b', 'info', 1), (1, 'C', 'c', 'info', 0);
+        INSERT INTO weekly_logs (student_id, placement_id, week_number, week_start_date,
+                                 week_end_date, activities)
+        VALUES (1, 1, 1, '2024-09-02', '2024-09-06', 'Configured the staging router');
+    ''')
+    
+    applied = migrate(conn)
+    
+    assert [version for version, _ in applied] == list(range(1, LATEST + 1))
+    assert conn.execute(
+        'SELECT days_present, days_late, total_days FROM attendance_summary').fetchall() == [
+        (2, 1, 3)]
+    assert conn.execute('SELECT user_id, unread FROM notification_counters').fetchall() == [
+        (1, 2)]
+    assert conn.execute("SELECT rowid FROM weekly_logs_fts WHERE weekly_logs_fts MATCH 'router'"
+                        ).fetchall() == [(1,)]
+    assert migrate(conn) == []
+
+# Attendance
+
+MONDAY = date(2024, 9, 2)
+
+@pytest.fixture
+def placed(make):
+    """Two interns of one supervisor (one placed from Wednesday) and another supervisor's"""
+    supervisor = make.supervisor()
+    email = make.db.execute('SELECT email FROM users WHERE id = ?', (supervisor,)).fetchone()[0]
+    interns = []
+    for start in ('2024-09-02', '2024-09-04'):
+        student = make.student()
+        interns.append((student, make.placement(student, start, '2024-09-13',
+                                                supervisor_email=email)))
+    other = make.student()
+    make.placement(other, '2024-09-02', '2024-09-13', supervisor_email='other@example.com')
+    return email, interns, other
+
+def _marks(db):
+    return [(row['student_id'], str(row['date']), row['status'], row['marked_by'])
+            for row in db.execute('SELECT * FROM attendance ORDER BY student_id, date')]
+
+def test_mark_grid_checks_each_cell(app, db, placed):
+    email, ((first, _), (second, _)), other = placed
+    cells = [
+        {'student_id': first, 'date': '2024-09-02', 'status': 'present', 'check_in_time': '08:50'},
+        {'student_id': second, 'date': '2024-09-02', 'status': 'present'},
+        {'student_id': other, 'date': '2024-09-02', 'status': 'present'},
+        {'student_id': first, 'date': '2024-09-03', 'status': 'asleep'},
+        {'student_id': first, 'date': '2024-09-03', 'status': 'late', 'check_in_time': '9am'},
+        {'student_id': first, 'date': '2024-09-30', 'status': 'present'},
+        {'student_id': first, 'date': '2024-09-03', 'status': 'late'},
+        {'student_id': first, 'date': '2024-09-03', 'status': 'absent'},
+        {'student_id': first, 'date': 'Tuesday', 'status': 'late'}
+    ]
+    
+    results = Attendance.mark_grid(cells, supervisor_email=email.upper(),
+                                   today=MONDAY + timedelta(days=7))
+    
+    assert [(result.result, result.message) for result in results] == [
+        ('inserted', None),
+        ('rejected', 'date is outside the placement period'),
+        ('rejected', 'student is not one of your interns'),
+        ('rejected', 'status must be one of present, absent, late, excused'),
+        ('rejected', 'check_in_time must be HH:MM'),
+        ('rejected', 'date is in the future'),
+        ('inserted', None),
+        ('rejected', 'student and date appear more than once'),
+        ('rejected', 'student_id and a YYYY-MM-DD date are required')
+    ]
+    assert _marks(db) == [(first, '2024-09-02', 'present', 'supervisor'),
+                          (first, '2024-09-03', 'late', 'supervisor')]
+    
+    # Resubmitting updates what changed; omitted times keep their stored value
+    results = Attendance.mark_grid([
+        {'student_id': first, 'date': MONDAY, 'status': 'present'},
+        {'student_id': first, 'date': '2024-09-03', 'status': 'excused', 'remarks': 'Clinic'}
+    ], supervisor_email=email, today=MONDAY + timedelta(days=7))
+    assert [result.result for result in results] == ['unchanged', 'updated']
+    row = db.execute("SELECT * FROM attendance WHERE date = '2024-09-02'").fetchone()
+    assert row['check_in_time'] == '08:50'
+
+def test_summary_triggers_match_a_rebuild(app, db, make):
+    student = make.student()
+    placement = make.placement(student, '2024-09-02', '2024-09-13')
+    other = make.placement(student, '2025-01-06', '2025-04-04')
+    for n, status in enumerate(('present', 'late', 'absent', 'present', 'excused')):
+        make.row('attendance', student_id=student, placement_id=placement,
+                 date=(MONDAY + timedelta(days=n)).isoformat(), status=status)
+    db.execute("UPDATE attendance SET status = 'present' WHERE status = 'absent'")
+    db.execute('UPDATE attendance SET placement_id = ? WHERE status = ?', (other, 'late'))
+    db.execute("DELETE FROM attendance WHERE status = 'excused'")
+    db.commit()
+    
+    def summary():
+        return [tuple(row) for row in db.execute(
+            'SELECT * FROM attendance_summary WHERE total_days > 0 '
+            'ORDER BY student_id, placement_id')]
+    
+    maintained = summary()
+    assert maintained == [(student, placement, 3, 0, 0, 0, 3), (student, other, 0, 0, 1, 0, 1)]
+    Attendance.rebuild_summary(db)
+    db.commit()
+    assert summary() == maintained
+
+def test_expand_grid_needs_one_status_per_date():
+    assert expand_grid(['2024-09-02', '2024-09-03'], {'7': ['present', '']}) == [
+        {'student_id': '7', 'date': '2024-09-02', 'status': 'present'}]
+    for dates, marks in ((['2024-09-02'], {'7': []}), ('2024-09-02', {'7': ['present']}),
+                         (['2024-09-02'], [['present']]), (['2024-09-02'], {'7': 'present'})):
+        with pytest.raises(ValueError):
+            expand_grid(dates, marks)
+
+def test_autofill_marks_unmarked_weekdays_absent(app, db, make, placed):
+    email, ((first, placement), (second, _)), other = placed
+    make.row('attendance', student_id=first, placement_id=placement, date='2024-09-03',
+             status='present', marked_by='supervisor')
+    terminated = make.student()
+    make.placement(terminated, '2024-09-02', '2024-09-13', status='terminated')
+    
+    # Monday to Monday: six weekdays for the first and other intern, four for the second
+    added = Attendance.autofill_absent(db, through=date(2024, 9, 9))
+    db.commit()
+    
+    assert added == 5 + 4 + 6
+    marks = _marks(db)
+    assert (first, '2024-09-03', 'present', 'supervisor') in marks
+    assert {mark[1] for mark in marks} == {'2024-09-02', '2024-09-03', '2024-09-04',
+                                           '2024-09-05', '2024-09-06', '2024-09-09'}
+    assert {mark[0] for mark in marks} == {first, second, other}
+    assert [mark for mark in marks if mark[0] == second][0][1:] == (
+        '2024-09-04', 'absent', 'autofill')
+    # Only the new window on a rerun, and nothing twice
+    assert Attendance.autofill_absent(db, through=date(2024, 9, 10), since=date(2024, 9, 9)) == 3
+    assert Attendance.autofill_absent(db, through=date(2024, 9, 10)) == 0
+
+# Users
+
+def test_user_get_serves_repeat_lookups_from_the_cache(app, make):
+    user_id = make.user('admin', 'Ada Admin')
+    misses = User.cache_stats()['users']['misses']
+    
+    assert User.get(user_id).full_name == User.get(str(user_id)).full_name == 'Ada Admin'
+    assert User.cache_stats()['users']['misses'] == misses + 1
+    assert User.get(user_id + 1) is None
+    assert User.get('not an id') is None
+
+def test_authenticate_checks_password_and_active_flag(app, db, make):
+    user_id = make.user('admin', email='ada@example.com')
+    
+    user = User.authenticate('ada@example.com', PASSWORD)
+    assert (user.id, user.is_authenticated) == (user_id, True)
+    assert User.authenticate('ada@example.com', 'wrong password') is None
+    assert User.authenticate('nobody@example.com', PASSWORD) is None
+    
+    db.execute('UPDATE users SET is_active = 0 WHERE id = ?', (user_id,))
+    db.commit()
+    assert User.authenticate('ada@example.com', PASSWORD) is None
+
+def test_login_upgrades_old_hashes(app, db, make):
+    user_id = make.user('admin', email='ada@example.com')
+    db.execute('UPDATE users SET password_hash = ? WHERE id = ?',
+               (generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000'), user_id))
+    db.commit()
+    
+    def stored():
+        return db.execute('SELECT password_hash FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+    
+    assert User.authenticate('ada@example.com', 'wrong password') is None
+    assert stored().startswith('pbkdf2:sha256:1000$')
+    assert User.authenticate('ada@example.com', PASSWORD).id == user_id
+    assert stored().startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert User.authenticate('ada@example.com', PASSWORD).id == user_id
+    
+    # The method comes from the app's config
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    assert needs_rehash(stored())
+    assert hash_password(PASSWORD).startswith('pbkdf2:sha256:2000$')
+
+def test_last_login_writes_are_coalesced(app, db, make):
+    writer = app.extensions['last_login_writer']
+    writer.flush_interval = 60
+    first, second = make.user('admin', email='ada@example.com'), make.user('admin')
+    
+    User.authenticate('ada@example.com', PASSWORD)
+    latest = User.authenticate('ada@example.com', PASSWORD).last_login
+    User.authenticate(User.get(second).email, PASSWORD)
+    assert db.execute('SELECT COUNT(last_login) FROM users').fetchone()[0] == 0
+    
+    writer.flush()
+    assert writer.written == 2
+    assert db.execute('SELECT last_login FROM users WHERE id = ?',
+                      (first,)).fetchone()[0] == latest
+
+def test_notification_pages_walk_every_row_once(app, db, make):
+    user_id = make.user('admin')
+    # Shared timestamps make the id the tie-breaker between pages
+    for n in range(7):
+        make.row('notifications', user_id=user_id, title=f'Note {n}', message='-', type='info',
+                 is_read=n % 2, created_at=f'2025-03-0{1 + n // 3} 09:00:00')
+    expected = [row['id'] for row in db.execute(
+        'SELECT id FROM notifications ORDER BY created_at DESC, id DESC')]
+    user = User.get(user_id)
+    
+    seen, cursor = [], None
+    while True:
+        page = user.get_notifications(cursor=cursor, limit=3)
+        seen.extend(row['id'] for row in page)
+        if not page.has_more:
+            break
+        cursor = page.next_cursor
+    assert seen == expected
+    
+    unread = user.get_notifications(unread_only=True, limit=10)
+    assert [row['title'] for row in unread] == ['Note 6', 'Note 4', 'Note 2', 'Note 0']
+    with pytest.raises(ValueError):
+        user.get_notifications(cursor='not a cursor')
+
+def test_views_match_the_raw_tables(app, db, make):
+    students = [make.student(), make.student(department='Chemistry'), make.student()]
+    active = make.placement(students[0])
+    make.placement(students[1], status='completed')
+    other = make.placement(students[1])
+    statuses = ('present', 'present', 'late', 'absent', 'excused', 'present')
+    for n, status in enumerate(statuses):
+        student, placement = (students[0], active) if n % 2 else (students[1], other)
+        make.row('attendance', student_id=student, placement_id=placement,
+                 date=f'2024-09-{10 + n}', status=status)
+    
+    assert sorted(row['id'] for row in db.execute('SELECT id FROM active_internships')) == [
+        row['id'] for row in db.execute(
+            "SELECT id FROM internship_placements WHERE status = 'active' ORDER BY id")]
+    
+    summary = {row['student_id']: tuple(row)[3:] for row in db.execute(
+        'SELECT * FROM student_attendance_summary')}
+    raw = {student: tuple(db.execute(
+        """SELECT COALESCE(SUM(status = 'present'), 0), COALESCE(SUM(status = 'absent'), 0),
+                  COALESCE(SUM(status = 'late'), 0), COALESCE(SUM(status = 'excused'), 0),
+                  COUNT(*)
+           FROM attendance WHERE student_id = ?""", (student,)).fetchone())
+        for student in students}
+    assert summary == raw
+    assert raw[students[2]] == (0, 0, 0, 0, 0)
+
+def test_user_cache_drops_only_the_changed_user(app, db, make):
+    first, second = make.user('admin'), make.user('admin')
+    assert {User.get(first).id, User.get(second).id} == {first, second}
+    db.execute("UPDATE users SET full_name = 'Grace Hopper' WHERE id = ?", (first,))
+    db.commit()
+    hits = User.cache_stats()['users']['hits']
+    
+    assert User.get(first).full_name == 'Grace Hopper'
+    assert User.get(second).id == second
+    assert User.cache_stats()['users']['hits'] == hits + 1
+
+def test_user_cache_follows_profile_changes(app, db, make):
+    student = make.student(level='300')
+    user = User.get(make.student_user(student))
+    assert user.get_profile_data()['level'] == '300'
+    
+    db.execute("UPDATE students SET level = '400' WHERE id = ?", (student,))
+    db.commit()
+    assert user.get_profile_data()['level'] == '400'
+
+# Weekly log search
+
+def test_search_index_follows_inserts_updates_and_deletes(app, db, make):
+    student = make.student()
+    placement = make.placement(student)
+    log = make.row('weekly_logs', student_id=student, placement_id=placement, week_number=1,
+                   week_start_date='2024-09-02', week_end_date='2024-09-06',
+                   activities='Configured the firewall')
+    
+    def found(text):
+        return [row['id'] for row in WeeklyLog.search(text)]
+    
+    assert found('firewall') == [log]
+    db.execute("UPDATE weekly_logs SET activities = 'Wrote unit tests', "
+               "hod_comment = 'Good coverage' WHERE id = ?", (log,))
+    db.commit()
+    assert found('firewall') == []
+    assert found('unit tests') == found('coverage') == [log]
+    
+    db.execute('DELETE FROM weekly_logs WHERE id = ?', (log,))
+    db.commit()
+    assert found('unit tests') == []
+    # Raises if the index differs from the weekly_logs rows
+    db.execute("INSERT INTO weekly_logs_fts (weekly_logs_fts, rank) VALUES ('integrity-check', 1)")
+    db.rollback()
+
+# Notifications
+
+def test_notification_counters_follow_fan_out_reads_and_compact(app, db, make):
+    junior, senior = (make.student_user(make.student(level=level)) for level in ('300', '400'))
+    chemist = make.student_user(make.student(department='Chemistry'))
+    inactive = make.student_user(make.student())
+    db.execute('UPDATE users SET is_active = 0 WHERE id = ?', (inactive,))
+    db.commit()
+    hod = make.hod()
+    users = (junior, senior, chemist, inactive, hod)
+    
+    def unread():
+        return [Notification.unread_count(user_id) for user_id in users]
+    
+    assert Notification.fan_out('Logs due', 'Friday', 'reminder',
+                                department='Computer Science') == 2
+    assert Notification.fan_out('Level 400', 'Briefing', level='400') == 1
+    assert Notification.fan_out('Staff', 'Meeting', user_type='hod') == 1
+    assert unread() == [1, 2, 0, 0, 1]
+    
+    first = db.execute('SELECT MIN(id) FROM notifications WHERE user_id = ?',
+                       (senior,)).fetchone()[0]
+    assert Notification.mark_read(junior, first) == 0
+    assert Notification.mark_read(senior, first) == 1
+    assert Notification.mark_read(senior, first) == 0
+    assert Notification.mark_all_read(senior) == 1
+    assert Notification.mark_all_read(hod) == 1
+    assert unread() == [1, 0, 0, 0, 0]
+    
+    # Only read notifications past the cutoff go
+    db.execute("UPDATE notifications SET read_at = datetime('now', '-40 days') "
+               'WHERE user_id = ?', (senior,))
+    db.commit()
+    with app.extensions['db_manager'].transaction() as conn:
+        assert Notification.compact(conn) == 2
+    assert db.execute('SELECT COUNT(*) FROM notifications').fetchone()[0] == 2
+    assert unread() == [1, 0, 0, 0, 0]
+    
+    def counters():
+        return dict(db.execute('SELECT user_id, unread FROM notification_counters '
+                               'WHERE unread > 0').fetchall())
+    
+    maintained = counters()
+    Notification.rebuild_counters(db)
+    db.commit()
+    assert counters() == maintained == {junior: 1}
+
+# Reporting
+
+REPORT_DAY = date(2024, 10, 1)
+
+@pytest.fixture
+def department(make):
+    """Students in every state: unplaced, placed twice, other level, other department"""
+    students = [make.student(level='300') for _ in range(3)] + [make.student(level='400')]
+    make.student(department='Chemistry')
+    make.placement(students[0], '2024-01-08', '2024-03-29', status='completed')
+    placements = [make.placement(students[0], '2024-09-02', '2024-12-20'),
+                  make.placement(students[1], '2024-09-16', '2024-09-27', status='completed'),
+                  make.placement(students[3], '2024-09-09', '2024-12-20')]
+    supervisor, hod = make.supervisor(), make.hod()
+    for n, status in enumerate(('present', 'late', 'absent', 'present', 'excused', 'late')):
+        student, placement = ((students[0], placements[0]) if n % 3
+                              else (students[3], placements[2]))
+        make.row('attendance', student_id=student, placement_id=placement,
+                 date=(date(2024, 9, 9) + timedelta(days=n)).isoformat(), status=status)
+    for week, status in enumerate(('submitted', 'reviewed', 'draft', 'reviewed', 'submitted')):
+        student, placement = ((students[0], placements[0]) if week < 3
+                              else (students[1], placements[1]))
+        start = date(2024, 9, 2) + timedelta(weeks=week)
+        make.row('weekly_logs', student_id=student, placement_id=placement,
+                 week_number=week + 1, week_start_date=start.isoformat(),
+                 week_end_date=(start + timedelta(days=6)).isoformat(),
+                 activities='Work', status=status)
+    for placement, student, evaluator, kind, rating in (
+            (placements[0], students[0], supervisor, 'supervisor', 4),
+            (placements[0], students[0], hod, 'hod', 3),
+            (placements[2], students[3], supervisor, 'supervisor', 5)):
+        make.row('evaluations', student_id=student, placement_id=placement,
+                 evaluator_id=evaluator, evaluator_type=kind, overall_rating=rating)
+    return students
+
+def _naive_rollup(db, department, level=None):
+    """Per-student figures computed one student and one table at a time"""
+    rows = []
+    for student in db.execute('SELECT * FROM students WHERE department = ? ORDER BY id',
+                              (department,)).fetchall():
+        if level is not None and student['level'] != level:
+            continue
+        placements = db.execute('SELECT * FROM internship_placements WHERE student_id = ?',
+                                (student['id'],)).fetchall()
+        placement = max(placements, default=None, key=lambda p: (
+            p['status'] == 'active', str(p['start_date']), p['id']))
+        row = {'student_id': student['id'],
+               'placement_id': placement['id'] if placement else None}
+        marks = logs = evaluations = []
+        if placement:
+            marks = [r['status'] for r in db.execute(
+                'SELECT status FROM attendance WHERE student_id = ? AND placement_id = ?',
+                (student['id'], placement['id']))]
+            logs = [r['status'] for r in db.execute(
+                'SELECT status FROM weekly_logs WHERE placement_id = ?', (placement['id'],))]
+            evaluations = db.execute('SELECT * FROM evaluations WHERE placement_id = ?',
+                                     (placement['id'],)).fetchall()
+            start = date.fromisoformat(str(placement['start_date']))
+            end = min(REPORT_DAY, date.fromisoformat(str(placement['end_date'])))
+            row['logs_expected'] = max(0, ((end - start).days + 1) // 7)
+        else:
+            row['logs_expected'] = 0
+        row['total_days'] = len(marks)
+        row['days_present'] = marks.count('present')
+        row['days_late'] = marks.count('late')
+        row['attendance_rate'] = (round(100.0 * (marks.count('present') + marks.count('late'))
+                                        / len(marks), 1) if marks else None)
+        row['logs_submitted'] = sum(status != 'draft' for status in logs)
+        row['logs_pending_review'] = logs.count('submitted')
+        kinds = {e['evaluator_type'] for e in evaluations}
+        row['evaluation_status'] = ('complete' if kinds == {'hod', 'supervisor'}
+                                    else 'partial' if kinds else 'pending')
+        row['average_rating'] = (round(sum(e['overall_rating'] for e in evaluations)
+                                       / len(evaluations), 2) if evaluations else None)
+        rows.append(row)
+    return rows
+
+def test_rollup_matches_a_naive_computation(app, db, department):
+    for level in (None, '300', '400'):
+        report = DepartmentReport.build(db, 'Computer Science', level, today=REPORT_DAY)
+        naive = _naive_rollup(db, 'Computer Science', level)
+        built = sorted(report['students'], key=lambda row: row['student_id'])
+        assert [{key: row[key] for key in expected}
+                for row, expected in zip(built, naive)] == naive
+        assert len(built) == len(naive)
+        
+        totals = report['totals']
+        attended = sum(row['days_present'] + row['days_late'] for row in naive)
+        days = sum(row['total_days'] for row in naive)
+        assert totals['students'] == len(naive)
+        assert totals['placed'] == sum(row['placement_id'] is not None for row in naive)
+        assert totals['attendance_rate'] == (round(100.0 * attended / days, 1) if days else None)
+        assert totals['logs_expected'] == sum(row['logs_expected'] for row in naive)
+        assert totals['pending_reviews'] == sum(row['logs_pending_review'] for row in naive)
+    
+    # The paged rows are the same rows, a level at a time
+    paged, cursor = [], None
+    while True:
+        page = DepartmentReport.page('Computer Science', cursor=cursor, limit=2, today=REPORT_DAY)
+        paged.extend(page)
+        if not page.has_more:
+            break
+        cursor = page.next_cursor
+    report = DepartmentReport.build(db, 'Computer Science', today=REPORT_DAY)
+    assert sorted(paged, key=lambda row: row['student_id']) == sorted(
+        report['students'], key=lambda row: row['student_id'])
+    assert [row['level'] for row in paged] == ['300', '300', '300', '400']
+
+def test_rollup_snapshot_is_rebuilt_after_a_write(app, db, department):
+    first = DepartmentReport.rollup('Computer Science')
+    assert DepartmentReport.rollup('Computer Science') is first
+    assert DepartmentReport.rollup('Computer Science', '400') is not first
+    
+    # Writers bump the counters in the same transaction, as the models do
+    student = first['students'][0]
+    with app.extensions['db_manager'].transaction() as conn:
+        conn.execute('INSERT INTO weekly_logs (student_id, placement_id, week_number, '
+                     'week_start_date, week_end_date, activities, status) '
+                     "VALUES (?, ?, 9, '2024-10-28', '2024-11-03', 'Work', 'submitted')",
+                     (student['student_id'], student['placement_id']))
+        versions.bump(conn, 'weekly_logs', [student['student_id']])
+    
+    second = DepartmentReport.rollup('Computer Science')
+    assert second is not first
+    assert second['totals']['pending_reviews'] == first['totals']['pending_reviews'] + 1
+    
+    # Other departments' writes leave the snapshot alone
+    chemist = db.execute("SELECT id FROM students WHERE department = 'Chemistry'").fetchone()[0]
+    with app.extensions['db_manager'].transaction() as conn:
+        conn.execute("UPDATE students SET level = '200' WHERE id = ?", (chemist,))
+        versions.bump(conn, 'students', [chemist])
+    assert DepartmentReport.rollup('Computer Science') is second
+
+# File uploads
+
+def test_get_for_user_follows_ownership_department_and_supervision(app, db, make):
+    supervisor, other_supervisor = make.supervisor(), make.supervisor()
+    email = db.execute('SELECT email FROM users WHERE id = ?', (supervisor,)).fetchone()[0]
+    owner, classmate = make.student(), make.student()
+    chemist = make.student(department='Chemistry')
+    uploads = {}
+    for name, student, supervisor_email in (('own', owner, email),
+                                            ('classmate', classmate, 'x@example.com'),
+                                            ('chemist', chemist, email)):
+        placement = make.placement(student, supervisor_email=supervisor_email)
+        uploads[name] = make.row('file_uploads', student_id=student, placement_id=placement,
+                                 file_type='document', file_name=f'{name}.pdf',
+                                 file_path=f'documents/{name}.pdf')
+    users = {'owner': make.student_user(owner), 'classmate': make.student_user(classmate),
+             'hod': make.hod(), 'chemistry hod': make.hod('Chemistry'),
+             'supervisor': supervisor, 'other supervisor': other_supervisor,
+             'admin': make.user('admin')}
+    
+    visible = {name: sorted(upload for upload, upload_id in uploads.items()
+                            if FileUpload.get_for_user(upload_id, User.get(user_id)))
+               for name, user_id in users.items()}
+    assert visible == {
+        'owner': ['own'],
+        'classmate': ['classmate'],
+        'hod': ['classmate', 'own'],
+        'chemistry hod': ['chemist'],
+        'supervisor': ['chemist', 'own'],
+        'other supervisor': [],
+        'admin': ['chemist', 'classmate', 'own']
+    }
+    assert FileUpload.get_for_user(max(uploads.values()) + 1, User.get(users['admin'])) is None
\ No newline at end of file
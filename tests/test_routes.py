@@ -0,0 +1,278 @@
+"""
+Route tests
+"""
+
+import csv
+import io
+from datetime import date, timedelta
+from werkzeug.datastructures import FileStorage
+from models.file_upload import FileUpload
+
+# Sessions
+
+def test_deactivated_account_is_logged_out(app, db, make, login):
+    user_id = make.student_user(make.student())
+    client = login(user_id)
+    # Requests share the fixture's app context, and with it the user kept in g,
+    # so each one gets its own to load the user through the cache
+    with app.app_context():
+        assert client.get('/student/').status_code == 200
+    
+    # Another worker deactivating the account reaches this one through user_changes
+    db.execute('UPDATE users SET is_active = 0 WHERE id = ?', (user_id,))
+    db.commit()
+    with app.app_context():
+        response = client.get('/student/')
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith('/auth/login')
+
+# Metrics
+
+def test_sampled_requests_get_server_timing_and_metrics(app, make, login):
+    tracer = app.extensions['sql_tracer']
+    tracer.sample_rate = 1.0
+    client = login(make.user('admin'))
+    
+    response = client.get('/admin/')
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert 'queries", app;dur=' in response.headers['Server-Timing']
+    
+    tracer.sample_rate = 0.0
+    assert 'Server-Timing' not in client.get('/admin/').headers
+    
+    metrics = client.get('/admin/metrics')
+    assert metrics.mimetype == 'text/plain'
+    text = metrics.get_data(as_text=True)
+    labels = '{blueprint="admin",endpoint="admin.dashboard"}'
+    assert f'bids_request_duration_seconds_count{labels} 2' in text
+    assert f'bids_request_queries_count{labels} 1' in text
+    assert 'bids_db_pool_hits_total{pool="reader"}' in text
+    
+    # A fresh context, as the fixture's one keeps the admin in g
+    student = make.student_user(make.student())
+    with app.app_context():
+        assert login(student).get('/admin/metrics').status_code == 403
+
+def test_login_is_turned_away_while_the_verifier_is_full(app, make):
+    make.user('admin', email='ada@example.com')
+    verifier = app.extensions['password_verifier']
+    verifier.workers, verifier.queue_depth = 1, 0
+    verifier._pool()
+    client = app.test_client()
+    form = {'email': 'ada@example.com', 'password': 'password123'}
+    
+    # The only slot taken, as by a check still running
+    verifier._slots.acquire()
+    try:
+        assert client.post('/auth/login', data=form).status_code == 503
+    finally:
+        verifier._slots.release()
+    assert verifier.stats()['rejected'] == 1
+    assert client.post('/auth/login', data=form).status_code == 302
+
+# Directory
+
+def test_hod_directory_is_scoped_to_the_department(app, make, login):
+    hod = make.hod()
+    make.student('Ada Lovelace')
+    make.student('Ada Yonath', department='Chemistry')
+    make.supervisor('Ada Consulting', full_name='Sam Okafor')
+    client = login(hod)
+    
+    results = client.get('/hod/directory?q=ada').get_json()['results']
+    assert sorted(result['full_name'] for result in results) == ['Ada Lovelace', 'Sam Okafor']
+    
+    results = client.get('/hod/directory?q=ada&type=supervisor').get_json()['results']
+    assert [result['full_name'] for result in results] == ['Sam Okafor']
+    assert client.get('/hod/directory?q=ada&type=admin').status_code == 400
+
+# Weekly log search
+
+def test_log_search_is_scoped_to_the_department_or_interns(app, db, make, login):
+    hod = make.hod()
+    supervisor = make.supervisor()
+    email = db.execute('SELECT email FROM users WHERE id = ?', (supervisor,)).fetchone()[0]
+    logs = {}
+    for name, department, supervisor_email in (('ours', 'Computer Science', email),
+                                               ('theirs', 'Computer Science', 'x@example.com'),
+                                               ('chemistry', 'Chemistry', email)):
+        student = make.student(department=department)
+        placement = make.placement(student, supervisor_email=supervisor_email)
+        logs[name] = make.row('weekly_logs', student_id=student, placement_id=placement,
+                              week_number=1, week_start_date='2024-09-02',
+                              week_end_date='2024-09-06', status='submitted',
+                              activities=f'Tuned <database> indexes ({name})')
+    
+    def ids(client, query):
+        response = client.get(f'/{query}')
+        assert response.status_code == 200
+        return sorted(result['id'] for result in response.get_json()['results'])
+    
+    client = login(hod)
+    assert ids(client, 'hod/logs/search?q=databa') == [logs['ours'], logs['theirs']]
+    result = client.get('/hod/logs/search?q=indexes+ours').get_json()['results'][0]
+    assert '<mark>indexes</mark>' in result['snippet'] and '&lt;database&gt;' in result['snippet']
+    assert ids(client, 'hod/logs/search?q=database&status=draft') == []
+    assert client.get('/hod/logs/search?q=database&status=lost').status_code == 400
+    
+    with app.app_context():
+        client = login(supervisor)
+        assert ids(client, 'supervisor/logs/search?q=database') == [
+            logs['ours'], logs['chemistry']]
+        assert ids(client, 'supervisor/logs/search?q=') == []
+
+# Analytics
+
+def test_hod_analytics_for_a_year(app, make, login):
+    hod = make.hod()
+    supervisor = make.supervisor()
+    student = make.student()
+    other = make.student(department='Chemistry')
+    for student_id, score in ((student, 4), (other, 2)):
+        placement = make.placement(student_id, '2024-09-02', '2024-12-20')
+        make.row('evaluations', student_id=student_id, placement_id=placement,
+                 evaluator_id=supervisor, evaluator_type='supervisor', punctuality=score,
+                 overall_rating=score)
+    client = login(hod)
+    
+    report = client.get('/hod/analytics?year=2024/2025').get_json()
+    assert (report['year'], report['department']) == ('2024/2025', 'Computer Science')
+    assert report['evaluations'] == 1
+    assert report['distribution']['mean'][0] == 4.0
+    assert client.get('/hod/analytics?year=2024/2026').status_code == 400
+
+# Attendance
+
+def _attendance(db, student_id):
+    return [(str(row['date']), row['status'], row['marked_by']) for row in db.execute(
+        'SELECT * FROM attendance WHERE student_id = ? ORDER BY date', (student_id,))]
+
+def test_student_marks_only_today_and_never_over_a_supervisor(app, db, make, login):
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    student = make.student()
+    placement = make.placement(student, (today - timedelta(days=30)).isoformat(),
+                               (today + timedelta(days=30)).isoformat())
+    make.row('attendance', student_id=student, placement_id=placement, date=yesterday.isoformat(),
+             status='absent', marked_by='autofill')
+    client = login(make.student_user(student))
+    
+    # Checking in, then out, on the same day updates the student's own mark
+    response = client.post('/student/attendance', json={'check_in_time': '08:55'})
+    assert response.status_code == 200
+    assert response.get_json()['counts'] == {'inserted': 1}
+    response = client.post('/student/attendance', json={'check_out_time': '17:05'})
+    assert response.get_json()['counts'] == {'updated': 1}
+    
+    response = client.post('/student/attendance',
+                           json={'date': yesterday.isoformat(), 'status': 'excused'})
+    assert response.status_code == 400
+    assert response.get_json()['results'][0]['message'] == "only today's attendance can be marked"
+    
+    # A supervisor's absence stands
+    db.execute("UPDATE attendance SET status = 'absent', marked_by = 'supervisor' WHERE date = ?",
+               (today.isoformat(),))
+    db.commit()
+    response = client.post('/student/attendance', json={'status': 'present'})
+    assert response.status_code == 400
+    assert _attendance(db, student) == [(yesterday.isoformat(), 'absent', 'autofill'),
+                                        (today.isoformat(), 'absent', 'supervisor')]
+def test_supervisor_attendance_payload_shapes(app, db, make, login):
+    supervisor = make.supervisor()
+    email = db.execute('SELECT email FROM users WHERE id = ?', (supervisor,)).fetchone()[0]
+    student = make.student()
+    make.placement(student, '2024-09-02', '2024-12-20', supervisor_email=email)
+    client = login(supervisor)
+    
+    for payload in ([], {'cells': {}}, {'cells': [1, 2]}, {'cells': []},
+                    {'dates': '2024-09-02', 'marks': {}}, {'dates': ['2024-09-02'], 'marks': []},
+                    {'dates': ['2024-09-02'], 'marks': {str(student): 'present'}}):
+        assert client.post('/supervisor/attendance', json=payload).status_code == 400, payload
+    
+    response = client.post('/supervisor/attendance', json={
+        'dates': ['2024-09-02', '2024-09-03'],
+        'marks': {str(student): ['present', 'late'], '999': ['present', '']}})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['counts'] == {'inserted': 2, 'rejected': 1}
+    assert body['results'][2] == {'student_id': 999, 'date': '2024-09-02', 'status': 'present',
+                                  'result': 'rejected',
+                                  'message': 'student is not one of your interns'}
+    assert _attendance(db, student) == [('2024-09-02', 'present', 'supervisor'),
+                                        ('2024-09-03', 'late', 'supervisor')]
+
+# Exports
+
+def test_csv_export_streams_the_filtered_department_rows(app, make, login):
+    hod = make.hod()
+    rows = []
+    for department, level in (('Computer Science', '300'), ('Computer Science', '400'),
+                              ('Chemistry', '300')):
+        student = make.student(department=department, level=level)
+        placement = make.placement(student, organization_name=f'{department} Labs')
+        for week, status in enumerate(('reviewed', 'submitted', 'draft'), 1):
+            start = date(2024, 9, 2) + timedelta(weeks=week - 1)
+            make.row('weekly_logs', student_id=student, placement_id=placement,
+                     week_number=week, week_start_date=start.isoformat(),
+                     week_end_date=(start + timedelta(days=4)).isoformat(), status=status,
+                     activities='Wrote "quoted", commas\nand lines')
+            rows.append((department, level, week, status))
+    
+    def export(query=''):
+        response = client.get(f'/hod/export/weekly_logs.csv{query}')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        body = response.get_data()
+        assert body.startswith(b'\xef\xbb\xbf')
+        header, *lines = csv.reader(io.StringIO(body[3:].decode('utf-8')))
+        assert header[:5] == ['Student ID', 'Name', 'Level', 'Organization', 'Week']
+        assert response.headers['X-Export-Rows'] == str(len(lines))
+        assert {line[3] for line in lines} <= {'Computer Science Labs'}
+        assert all(line[8] == 'Wrote "quoted", commas\nand lines' for line in lines)
+        return [(line[2], int(line[4]), line[7]) for line in lines]
+    
+    client = login(hod)
+    ours = [(level, week, status) for department, level, week, status in rows
+            if department == 'Computer Science']
+    assert export() == ours
+    assert export('?level=400') == [row for row in ours if row[0] == '400']
+    assert export('?status=draft') == [row for row in ours if row[2] == 'draft']
+    assert export('?date_from=2024-09-09&date_to=2024-09-09') == [
+        row for row in ours if row[1] == 2]
+    
+    assert client.get('/hod/export/weekly_logs.csv?status=present').status_code == 400
+    assert client.get('/hod/export/weekly_logs.csv?date_from=9/9/2024').status_code == 400
+    assert client.get('/hod/export/weekly_logs.csv?level=900').status_code == 400
+    assert client.get('/hod/export/payroll.csv').status_code == 404
+    assert client.get('/hod/export/attendance.csv?status=present').status_code == 200
+
+# Files
+
+def test_downloads_are_access_checked_and_cached_by_content(app, make, login):
+    owner, classmate = make.student(), make.student()
+    placement = make.placement(owner)
+    upload = FileUpload.create(owner, placement, 'document',
+                               FileStorage(io.BytesIO(b'%PDF-1.4 offer'), filename='offer.pdf'))
+    
+    with app.app_context():
+        client = login(make.student_user(owner))
+        response = client.get(f'/files/{upload}')
+        assert response.status_code == 200
+        assert response.get_data() == b'%PDF-1.4 offer'
+        assert 'offer.pdf' in response.headers['Content-Disposition']
+        assert 'immutable' not in response.headers.get('Cache-Control', '')
+        tag = response.headers['ETag'].strip('"')
+        
+        versioned = client.get(f'/files/{upload}?v={tag}')
+        assert 'immutable' in versioned.headers['Cache-Control']
+        assert client.get(f'/files/{upload}', headers={'If-None-Match': f'"{tag}"'}
+                          ).status_code == 304
+        # Only workspace photos have renditions
+        assert client.get(f'/files/{upload}?size=thumb').status_code == 404
+        assert client.get(f'/files/{upload + 1}').status_code == 404
+    
+    with app.app_context():
+        client = login(make.student_user(classmate))
+        assert client.get(f'/files/{upload}').status_code == 404
+    with app.app_context():
+        assert app.test_client().get(f'/files/{upload}').status_code == 302
\ No newline at end of file
@@ -0,0 +1,691 @@
+"""
+Utility tests
+"""
+
+import email
+import gc
+import io
+import os
+import random
+import runpy
+import socketserver
+import sqlite3
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+import pytest
+from flask import g
+from jinja2 import ChoiceLoader, DictLoader
+from app import create_app, warm_up
+from config import config
+from database import versions
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from database.connection import PoolTimeout, get_read_db
+from database.tracing import TracedCursor, normalize_sql
+from models.file_upload import FileUpload
+from models.internship import Internship
+from models.notification import Notification
+from models.student import Student
+from utils.audit import AuditWriter, rollover_activity_logs
+from utils.directory import Directory
+from utils.email import MailQueue
+from utils.export import Export
+from utils.fragments import DiskStore, FragmentCache
+from utils.pagination import MAX_PAGE_SIZE, encode_cursor
+from utils.pdf_generator import department_pdfs, get_summary_pdf, stream_zip
+from utils.uploads import UploadError, reconcile, rendition_path, save_upload
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+# Connection pools
+
+def test_request_writes_hand_the_writer_back(app, make):
+    manager = app.extensions['db_manager']
+    user_id = make.user('student')
+    busy = manager.writer.stats()['open'] - manager.writer.stats()['idle']
+    
+    # A fresh app context, so nothing is held in g yet
+    with app.app_context(), app.test_request_context():
+        Notification.create(user_id, 'Welcome', 'Hello')
+        assert Notification.mark_all_read(user_id) == 1
+        stats = manager.writer.stats()
+        assert stats['open'] - stats['idle'] == busy
+
+def test_background_writers_do_not_wait_for_request_writers(app, make, audit):
+    manager = app.extensions['db_manager']
+    user_id = make.user('admin')
+    manager.writer.timeout = 0.1
+    held = []
+    try:
+        # Every request writer is taken
+        with pytest.raises(PoolTimeout):
+            while True:
+                held.append(manager.writer.acquire())
+        audit.manager = manager
+        audit.durability = 'immediate'
+        audit.record(user_id, 'login')
+        last_login = app.extensions['last_login_writer']
+        last_login.touch(user_id, '2025-03-14 09:00:00')
+        last_login.flush()
+    finally:
+        for conn in held:
+            manager.writer.release(conn)
+    
+    assert audit.written == 1 and audit.failures == 0
+    assert manager.stats()['background']['open'] >= 1
+
+# Audit writer
+
+class FlakyManager:
+    """A ConnectionManager whose first `failures` transactions fail"""
+    
+    def __init__(self, manager, failures):
+        self.manager = manager
+        self.failures = failures
+    
+    @contextmanager
+    def transaction(self, conn=None, background=False):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        with self.manager.transaction(conn, background) as conn:
+            yield conn
+
+@pytest.fixture
+def audit(app):
+    writer = AuditWriter()
+    writer.flush_interval = 0.01
+    writer.max_retries = 3
+    yield writer
+    writer.close()
+
+def test_audit_immediate_failure_is_retried_in_the_background(app, db, make, audit):
+    user_id = make.user('admin')
+    audit.durability = 'immediate'
+    audit.manager = FlakyManager(app.extensions['db_manager'], failures=1)
+    
+    audit.record(user_id, 'login')
+    
+    _wait_for(lambda: audit.written == 1)
+    assert audit.failures == 1
+    assert [tuple(row) for row in db.execute('SELECT user_id, action FROM activity_logs')] == [
+        (user_id, 'login')]
+    assert audit.stats()['retrying'] == 0
+
+def test_audit_drops_rows_after_max_retries(app, db, make, audit, caplog):
+    user_id = make.user('admin')
+    audit.manager = FlakyManager(app.extensions['db_manager'], failures=100)
+    audit.record(user_id, 'login')
+    audit.record(user_id, 'logout')
+    
+    audit.flush()
+    
+    _wait_for(lambda: audit.dropped == 2)
+    assert audit.stats()['pending'] == audit.stats()['retrying'] == 0
+    dead = [record.getMessage() for record in caplog.records
+            if record.name == 'utils.audit.dead_letter']
+    assert len(dead) == 2 and "'logout'" in dead[1]
+    
+    # Later rows are not stuck behind the dropped batch
+    audit.manager.failures = 0
+    audit.record(user_id, 'export')
+    audit.flush()
+    _wait_for(lambda: audit.written == 1)
+    assert [row[0] for row in db.execute('SELECT action FROM activity_logs')] == ['export']
+
+def test_rollover_copies_into_older_month_tables_by_column_name(app, db, make):
+    user_id = make.user('admin')
+    # A month table from before entity_type existed, with its columns in another order
+    db.execute('CREATE TABLE activity_logs_2024_03 (created_at, action, user_id, id)')
+    db.commit()
+    make.row('activity_logs', user_id=user_id, action='export', entity_type='placement',
+             created_at='2024-03-04 10:00:00')
+    make.row('activity_logs', user_id=user_id, action='login',
+             created_at='2024-04-01 08:00:00')
+    
+    moved = rollover_activity_logs(app.extensions['db_manager'], older_than_days=0)
+    
+    assert moved == {'activity_logs_2024_03': 1, 'activity_logs_2024_04': 1}
+    row = db.execute('SELECT * FROM activity_logs_2024_03').fetchone()
+    assert (row['user_id'], row['action'], row['entity_type'], str(row['created_at'])) == (
+        user_id, 'export', 'placement', '2024-03-04 10:00:00')
+    assert db.execute('SELECT COUNT(*) FROM activity_logs').fetchone()[0] == 0
+
+# Directory
+
+def _index_state(directory):
+    return {
+        'names': list(directory._names),
+        'name_ids': list(directory._name_ids),
+        'words': list(directory._words),
+        'postings': {word: list(ids) for word, ids in directory._postings.items()},
+        'identifiers': list(directory._identifiers),
+        'identifier_ids': list(directory._identifier_ids),
+        'trigrams': {gram: sorted(ids) for gram, ids in directory._trigrams.items()}
+    }
+
+def _names(results):
+    return [result['full_name'] for result in results]
+
+def test_directory_applies_changes_incrementally(app, db, make):
+    directory = app.extensions['directory']
+    ada = make.student('Ada Lovelace')
+    alan = make.student('Alan Turing', department='Mathematics')
+    make.supervisor('Navy Labs', full_name='Grace Hopper')
+    assert _names(directory.search('ada')) == ['Ada Lovelace']
+    assert _names(directory.search('navy')) == ['Grace Hopper']
+    
+    ada_user = db.execute('SELECT user_id FROM students WHERE id = ?', (ada,)).fetchone()[0]
+    db.execute("UPDATE users SET full_name = 'Augusta King' WHERE id = ?", (ada_user,))
+    db.execute('UPDATE users SET is_active = 0 WHERE id = '
+               '(SELECT user_id FROM students WHERE id = ?)', (alan,))
+    db.commit()
+    make.student('Barbara Liskov')
+    make.student('Adele Goldberg')
+    
+    assert _names(directory.search('lovelace')) == []
+    assert _names(directory.search('augusta')) == ['Augusta King']
+    assert _names(directory.search('turing')) == []
+    assert _names(directory.search('ad')) == ['Adele Goldberg']
+    assert _names(directory.search('liskov', department='Computer Science')) == ['Barbara Liskov']
+    stats = directory.stats()
+    assert (stats['loads'], stats['refreshes']) == (1, 1)
+    
+    # The patched index matches one built from scratch
+    fresh = Directory()
+    fresh.app = app
+    fresh.search('x')
+    assert fresh.stats()['loads'] == 1
+    assert _index_state(directory) == _index_state(fresh)
+
+# Email queue
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib; refuses the server's refuse addresses"""
+    
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+    
+    def handle(self):
+        self.server.sessions += 1
+        self.reply('220 localhost ready')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO', 'NOOP'):
+                self.reply('250 localhost')
+            elif verb in ('MAIL', 'RSET'):
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                if address in self.server.refuse:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                self.server.messages.append((recipients, email.message_from_bytes(data)))
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.refuse = set()
+        self.sessions = 0
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def mail(app, smtp_server):
+    """A queue sending to smtp_server, drained by the test rather than workers"""
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp_server.server_address[1],
+                      MAIL_USE_TLS=False, MAIL_USERNAME=None, MAIL_SUPPRESS_SEND=False,
+                      MAIL_QUEUE_WORKERS=0, MAIL_BATCH_SIZE=2, MAIL_MAX_RECIPIENTS=2,
+                      MAIL_MAX_ATTEMPTS=2, MAIL_RETRY_BACKOFF=60, MAIL_RATE_LIMIT=0)
+    return MailQueue(app)
+
+def _queue(db):
+    return [tuple(row) for row in db.execute(
+        'SELECT recipients, status, attempts FROM email_queue ORDER BY id')]
+
+def test_mail_queue_batches_and_bccs_shared_messages(app, db, mail, smtp_server):
+    recipients = ['C@example.com', 'a@example.com', 'b@example.com', 'a@example.com']
+    assert mail.enqueue(recipients, 'Digest', 'This week') == 2
+    assert mail.enqueue('d@example.com', 'Hello', 'Hi Dee') == 1
+    
+    assert mail.drain() == 3
+    assert [(to, message['To']) for to, message in smtp_server.messages] == [
+        (['a@example.com', 'b@example.com'], mail.config['sender']),
+        (['c@example.com'], 'c@example.com'),
+        (['d@example.com'], 'd@example.com')]
+    # Two batches of at most two over one SMTP session
+    assert (mail.stats()['batches'], mail.stats()['sent'], smtp_server.sessions) == (2, 3, 1)
+    assert {status for _, status, _ in _queue(db)} == {'sent'}
+
+def test_mail_queue_backs_off_then_dead_letters(app, db, mail, smtp_server):
+    smtp_server.refuse.add('gone@example.com')
+    mail.enqueue('gone@example.com', 'Hello', 'Anyone there?')
+    
+    assert mail.drain() == 1
+    assert _queue(db) == [('gone@example.com', 'pending', 1)]
+    row = db.execute("""SELECT last_error, (julianday(next_attempt_at) - julianday('now')) * 86400
+                        FROM email_queue""").fetchone()
+    assert 'gone@example.com' in row[0] and 50 < row[1] <= 60
+    assert mail.drain() == 0
+    
+    db.execute("UPDATE email_queue SET next_attempt_at = datetime('now')")
+    db.commit()
+    assert mail.drain() == 1
+    assert _queue(db) == [('gone@example.com', 'dead', 2)]
+    assert (mail.stats()['retried'], mail.stats()['dead']) == (1, 1)
+    assert smtp_server.messages == []
+
+def test_mail_queue_reclaims_rows_of_a_crashed_worker(app, db, mail, smtp_server):
+    claims = (('stale@example.com', '-20 minutes'), ('busy@example.com', '-1 minute'))
+    for address, claimed in claims:
+        db.execute("""INSERT INTO email_queue
+                          (recipients, subject, body, status, attempts, claimed_at)
+                      VALUES (?, 'Hello', 'Hi', 'sending', 1, datetime('now', ?))""",
+                   (address, claimed))
+    db.commit()
+    
+    assert mail.drain() == 1
+    assert _queue(db) == [('stale@example.com', 'sent', 2), ('busy@example.com', 'sending', 1)]
+
+def test_mail_queued_in_a_transaction_waits_for_wake(app, mail):
+    with app.extensions['db_manager'].transaction() as conn:
+        assert mail.enqueue('a@example.com', 'Hello', 'Hi', conn=conn) == 1
+        assert not mail._wakeup.is_set()
+    mail.wake()
+    assert mail._wakeup.is_set()
+
+# SQL tracing
+
+def test_normalize_sql_replaces_literals():
+    sql = """SELECT * FROM activity_logs_2024_03 -- rolled over
+             WHERE action = 'it''s' AND id IN (1, 2, 3) AND user_id IN (?, ?)
+               AND score > -2.5"""
+    assert normalize_sql(sql) == ('SELECT * FROM activity_logs_2024_03 WHERE action = ? '
+                                  'AND id IN (?, ...) AND user_id IN (?, ...) AND score > ?')
+
+def test_only_traced_requests_time_their_statements(app):
+    tracer = app.extensions['sql_tracer']
+    
+    def cursor_type():
+        with app.app_context(), app.test_request_context():
+            app.preprocess_request()
+            return type(get_read_db().cursor()), g.get('sql_trace')
+    
+    tracer.sample_rate = 0.0
+    assert cursor_type() == (sqlite3.Cursor, None)
+    tracer.slow_query_all = True
+    kind, trace = cursor_type()
+    assert kind is TracedCursor and not trace.sampled
+    tracer.slow_query_all, tracer.sample_rate = False, 1.0
+    kind, trace = cursor_type()
+    assert kind is TracedCursor and trace.sampled
+
+# Summary PDFs
+
+def test_summary_pdf_is_rendered_again_only_when_its_data_changes(app, make):
+    student = make.student()
+    placement = make.placement(student)
+    cache_dir = app.config['PDF_CACHE_DIR']
+    
+    path = get_summary_pdf(get_read_db(), placement, cache_dir)
+    rendered = os.stat(path).st_mtime_ns
+    assert get_summary_pdf(get_read_db(), placement, cache_dir) == path
+    assert os.stat(path).st_mtime_ns == rendered
+    assert get_summary_pdf(get_read_db(), placement, cache_dir, department='Chemistry') is None
+    
+    make.row('weekly_logs', student_id=student, placement_id=placement, week_number=1,
+             week_start_date='2024-09-02', week_end_date='2024-09-06', activities='Onboarding')
+    changed = get_summary_pdf(get_read_db(), placement, cache_dir)
+    assert changed != path and not os.path.exists(path)
+    assert os.listdir(cache_dir) == [os.path.basename(changed)]
+
+def test_department_zip_streams_cached_and_new_summaries(app, make):
+    cache_dir = app.config['PDF_CACHE_DIR']
+    cached = make.placement(make.student())
+    fresh = make.placement(make.student())
+    make.placement(make.student(department='Chemistry'))
+    get_summary_pdf(get_read_db(), cached, cache_dir)
+    
+    chunks = list(stream_zip(department_pdfs(get_read_db(), 'Computer Science', cache_dir),
+                             workers=1))
+    
+    assert len(chunks) > 2
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        members = archive.infolist()
+        assert [member.filename.rsplit('-', 1)[1] for member in members] == [
+            f'{cached}.pdf', f'{fresh}.pdf']
+        assert {member.compress_type for member in members} == {zipfile.ZIP_STORED}
+        assert all(archive.read(member).startswith(b'%PDF') for member in members)
+    assert len(os.listdir(cache_dir)) == 2
+
+# Keyset pagination
+
+def _walk(fetch, limit):
+    """Ids of every page fetch(cursor) returns, checking each page's size"""
+    ids, cursor = [], None
+    while True:
+        page = fetch(cursor)
+        assert 0 < len(page) <= limit
+        ids.extend(row['id'] for row in page)
+        if not page.has_more:
+            return ids
+        cursor = page.next_cursor
+
+def test_keyset_pages_follow_the_sort_key(app, db, make):
+    for level in ('400', '200', '300', '200', '400', '300', '200'):
+        make.student(level=level)
+    make.student(department='Chemistry')
+    
+    def expected(sql, *params):
+        return [row[0] for row in db.execute(sql, params)]
+    
+    assert _walk(lambda cursor: Student.list_by_department('Computer Science', cursor=cursor,
+                                                           limit=3), 3) == expected(
+        "SELECT id FROM students WHERE department = 'Computer Science' ORDER BY level, id")
+    assert _walk(lambda cursor: Student.list_by_department('Computer Science', '200',
+                                                           cursor=cursor, limit=2), 2) == expected(
+        "SELECT id FROM students WHERE department = 'Computer Science' AND level = '200' "
+        'ORDER BY id')
+    
+    # Date keys with ties between placements
+    student = make.student()
+    for start in ('2024-09-09', '2024-09-02', '2024-09-09', '2024-09-02', '2024-09-16'):
+        make.placement(student, start_date=start, supervisor_email='sam@example.com')
+    assert _walk(lambda cursor: Internship.list_for_supervisor('sam@example.com', cursor=cursor,
+                                                                limit=2), 2) == expected(
+        "SELECT id FROM internship_placements WHERE supervisor_email = 'sam@example.com' "
+        'ORDER BY start_date, id')
+
+def test_keyset_cursor_survives_inserts_before_it(app, db, make):
+    students = [make.student(level='300') for _ in range(4)]
+    first = Student.list_by_department('Computer Science', limit=2)
+    assert [row['id'] for row in first] == students[:2]
+    
+    # A row sorting before the cursor neither repeats nor skips anything
+    make.student(level='200')
+    rest = Student.list_by_department('Computer Science', cursor=first.next_cursor, limit=10)
+    assert [row['id'] for row in rest] == students[2:]
+
+def test_keyset_rejects_bad_cursors_and_caps_the_page(app, make):
+    for _ in range(MAX_PAGE_SIZE + 1):
+        make.student()
+    with pytest.raises(ValueError):
+        Student.list_by_department('Computer Science', cursor='not-a-cursor')
+    with pytest.raises(ValueError):
+        # A one-column cursor for a two-column key
+        Student.list_by_department('Computer Science', cursor=encode_cursor([1]))
+    page = Student.list_by_department('Computer Science', limit=MAX_PAGE_SIZE * 10)
+    assert len(page) == MAX_PAGE_SIZE and page.has_more
+
+# Uploads
+
+def _file(data, filename):
+    return FileStorage(io.BytesIO(data), filename=filename)
+
+def _stored_files(folder):
+    return sorted(os.path.relpath(os.path.join(root, name), folder)
+                  for root, _, files in os.walk(folder) for name in files)
+
+def test_uploads_are_stored_once_per_content(app):
+    config = app.config
+    first = save_upload(_file(b'%PDF-1.4 offer letter', 'Offer Letter.pdf'), 'document', config)
+    again = save_upload(_file(b'%PDF-1.4 offer letter', 'copy.pdf'), 'completion_letter', config)
+    other = save_upload(_file(b'%PDF-1.4 logbook', 'logbook.pdf'), 'document', config)
+    
+    digest = first.sha256
+    assert first.file_path == f'documents/{digest[:2]}/{digest[2:4]}/{digest}.pdf'
+    assert (first.file_name, first.size, first.deduplicated) == ('Offer_Letter.pdf', 21, False)
+    assert (again.file_path, again.file_name, again.deduplicated) == (
+        first.file_path, 'copy.pdf', True)
+    assert other.file_path != first.file_path
+    assert _stored_files(config['UPLOAD_FOLDER']) == sorted([first.file_path, other.file_path])
+    
+    config['MAX_CONTENT_LENGTH'] = 8
+    for storage, file_type in ((_file(b'', 'empty.pdf'), 'document'),
+                               (_file(b'MZ', 'tool.exe'), 'document'),
+                               (_file(b'%PDF-1.4', 'photo.pdf'), 'workspace_photo'),
+                               (_file(b'%PDF-1.4 too large', 'big.pdf'), 'document'),
+                               (_file(b'%PDF', 'letter.pdf'), 'passport')):
+        with pytest.raises(UploadError):
+            save_upload(storage, file_type, config)
+    # Rejected uploads leave no temporary files behind
+    assert len(_stored_files(config['UPLOAD_FOLDER'])) == 2
+
+def test_reconcile_reports_orphans_and_missing_files(app, db, make):
+    config = app.config
+    student = make.student()
+    placement = make.placement(student)
+    photo = io.BytesIO()
+    Image.new('RGB', (40, 30), 'teal').save(photo, 'PNG')
+    upload = FileUpload.create(student, placement, 'workspace_photo',
+                               _file(photo.getvalue(), 'desk.png'))
+    path = os.path.join(config['UPLOAD_FOLDER'], db.execute(
+        'SELECT file_path FROM file_uploads WHERE id = ?', (upload,)).fetchone()[0])
+    _wait_for(lambda: all(os.path.exists(rendition_path(path, size)) for size in ('thumb', 'web')))
+    
+    stray = save_upload(_file(b'%PDF-1.4 never recorded', 'stray.pdf'), 'document', config)
+    fresh = save_upload(_file(b'%PDF-1.4 row not committed yet', 'new.pdf'), 'document', config)
+    stray_path = os.path.join(config['UPLOAD_FOLDER'], stray.file_path)
+    # Everything but the fresh upload is old enough to be judged
+    hour_ago = time.time() - 7200
+    for root, _, files in os.walk(config['UPLOAD_FOLDER']):
+        for name in files:
+            if fresh.sha256 not in name:
+                os.utime(os.path.join(root, name), (hour_ago, hour_ago))
+    make.row('file_uploads', student_id=student, placement_id=placement, file_type='document',
+             file_name='lost.pdf', file_path='documents/00/00/lost.pdf')
+    
+    orphans, missing = reconcile(db, config)
+    assert orphans == [os.path.normpath(stray_path)]
+    assert missing == [os.path.normpath('documents/00/00/lost.pdf')]
+
+# Exports
+
+def test_export_streams_in_batches_and_reports_progress(app, make):
+    for n in range(5):
+        student = make.student()
+        make.row('attendance', student_id=student, placement_id=make.placement(student),
+                 date=f'2024-09-0{2 + n}', status='present')
+    reports = []
+    job = Export(app.extensions['db_manager'], 'attendance', 'Computer Science',
+                 progress=lambda job, done: reports.append((job.rows, done)), batch_size=2)
+    
+    assert job.count() == 5
+    chunks = list(job.stream('csv'))
+    # The header, then one chunk per fetchmany() batch
+    assert len(chunks) == 4
+    assert b''.join(chunks).count(b'\r\n') == 6
+    assert reports == [(5, True)]
+
+# Preforking
+
+GUNICORN_CONF = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py')
+
+def test_create_app_opens_nothing_until_used(tmp_path, monkeypatch):
+    path = tmp_path / 'fresh.db'
+    monkeypatch.setattr(config['testing'], 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+    threads = set(threading.enumerate())
+    
+    app = create_app('testing')
+    warm_up(app)
+    
+    # Threads may have finished meanwhile, but none were started
+    assert set(threading.enumerate()) <= threads
+    manager = app.extensions['db_manager']
+    assert [pool.stats()['open'] for pool in (manager.reader, manager.writer,
+                                              manager.background)] == [0, 0, 0]
+    assert not path.exists()
+    templates = app.jinja_env.list_templates(extensions=['html'])
+    assert templates and len(app.jinja_env.cache) >= len(templates)
+
+def test_forked_worker_starts_with_empty_pools(app, make):
+    make.user('admin')
+    manager = app.extensions['db_manager']
+    verifier = app.extensions['password_verifier']
+    reader = manager.reader.acquire()
+    manager.reader.release(reader)
+    executor = verifier._pool()
+    
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_end)
+            conn = manager.reader.acquire()
+            users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+            report = (conn is not reader, manager.reader.stats()['open'],
+                      manager.reader.hits, users, verifier._pool() is not executor)
+            os.write(write_end, repr(report).encode())
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as f:
+        report = f.read()
+    os.waitpid(pid, 0)
+    
+    assert report == repr((True, 1, 0, 1, True))
+    # The parent's pool and executor are untouched
+    assert manager.reader.acquire() is reader
+    manager.reader.release(reader)
+    assert verifier._pool() is executor
+
+def test_gunicorn_hooks_warm_up_freeze_and_reseed(app):
+    hooks = runpy.run_path(GUNICORN_CONF)
+    assert hooks['preload_app'] is True
+    
+    def server(preload):
+        return SimpleNamespace(cfg=SimpleNamespace(preload_app=preload),
+                               app=SimpleNamespace(wsgi=lambda: app))
+    
+    hooks['when_ready'](server(False))
+    assert gc.get_freeze_count() == 0
+    assert len(app.jinja_env.cache) == 0
+    try:
+        hooks['when_ready'](server(True))
+        assert gc.get_freeze_count() > 0
+        assert len(app.jinja_env.cache) >= len(app.jinja_env.list_templates(extensions=['html']))
+    finally:
+        gc.unfreeze()
+    
+    random.seed(1)
+    inherited = random.random()
+    random.seed(1)
+    hooks['post_fork'](server(True), None)
+    assert random.random() != inherited
+
+# Fragment cache
+
+@pytest.fixture
+def fragments(app, tmp_path):
+    """A fragment cache for a template echoing its context, and its load() calls"""
+    app.jinja_env.loader = ChoiceLoader([DictLoader({'_n.html': '<b>{{ n }}</b>'}),
+                                         app.jinja_env.loader])
+    app.config.update(FRAGMENT_CACHE_SIZE=2, FRAGMENT_MAX_BYTES=64,
+                      FRAGMENT_CACHE_DIR=str(tmp_path / 'fragments'))
+    loads = []
+    
+    def render(cache, n, entities=(), **kwargs):
+        def load():
+            loads.append(n)
+            return {'n': n}
+        return str(cache.render('_n.html', entities, load, **kwargs))
+    return render, loads
+
+def test_fragment_keys_follow_the_data_versions(app, make, fragments):
+    render, loads = fragments
+    cache = FragmentCache(app)
+    first, second = make.student(), make.student()
+    depends = versions.entities('student', first, ('attendance',))
+    
+    assert render(cache, 1, depends) == '<b>1</b>'
+    assert render(cache, 2, depends) == '<b>1</b>'
+    assert render(cache, 3, depends, user_id=7) == '<b>3</b>'
+    
+    # Another student's write leaves the key alone; this student's moves it
+    with app.extensions['db_manager'].transaction() as conn:
+        versions.bump(conn, 'attendance', [second])
+    assert render(cache, 4, depends) == '<b>1</b>'
+    with app.extensions['db_manager'].transaction() as conn:
+        versions.bump(conn, 'attendance', [first])
+    assert render(cache, 5, depends) == '<b>5</b>'
+    with app.extensions['db_manager'].transaction() as conn:
+        versions.bump(conn, 'attendance')
+    assert render(cache, 6, depends) == '<b>6</b>'
+    assert loads == [1, 3, 5, 6]
+    
+    counts = cache.stats()['fragments']['_n.html']
+    assert (counts['memory'], counts['miss']) == (2, 4)
+
+def test_fragments_are_evicted_least_recently_used_first(app, fragments):
+    render, loads = fragments
+    cache = FragmentCache(app)
+    
+    for n in (1, 2, 1, 3):
+        render(cache, n, vary=(n,))
+    assert len(cache.memory) == 2
+    # 2 was least recently used when 3 came in; the disk store still has it
+    render(cache, 1, vary=(1,))
+    render(cache, 2, vary=(2,))
+    assert loads == [1, 2, 3]
+    counts = cache.stats()['fragments']['_n.html']
+    assert (counts['memory'], counts['disk']) == (2, 1)
+    
+    # Another worker's cache reads the renders from the shared directory
+    other = FragmentCache(app)
+    assert render(other, 9, vary=(3,)) == '<b>3</b>'
+    # Fragments over FRAGMENT_MAX_BYTES are rendered every time
+    big = 'x' * 64
+    render(cache, big, vary=('big',))
+    render(cache, big, vary=('big',))
+    assert loads[-2:] == [big, big]
+    
+    cache.enabled = False
+    render(cache, 1, vary=(1,))
+    assert loads[-1] == 1
+
+def test_disk_store_prunes_least_recently_used_files(tmp_path):
+    store = DiskStore(str(tmp_path), max_bytes=1000)
+    now = time.time()
+    for n in range(6):
+        store.set(f'key{n}', str(n) * 150)
+        os.utime(store._path(f'key{n}'), (now - 600 + n, now - 600 + n))
+    # Reading a file makes it recent again
+    assert store.get('key0') == '0' * 150
+    
+    # Each write past a tenth of the limit prunes, down to 90% of it
+    assert store.prune() == 0
+    store.set('key6', '6' * 150)
+    assert store.evictions == 1
+    assert [store.get(f'key{n}') is not None for n in range(7)] == [
+        True, False, True, True, True, True, True]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
\ No newline at end of file
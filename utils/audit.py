@@ -0,0 +1,249 @@
+"""
+Buffered audit trail writer for activity_logs
+
+Rows are queued in memory and group-committed from a background thread with
+a single executemany per batch, so request handlers no longer pay for an
+fsync per logged action or compete with real data writes for the lock.
+
+A batch that fails to write is retried by the background thread (started
+on the first failure in immediate mode too) up to AUDIT_MAX_RETRIES times.
+After that its rows are dropped and each one is logged on the
+utils.audit.dead_letter logger, so the queue can never wedge on them.
+"""
+
+import atexit
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+logger = logging.getLogger(__name__)
+dead_letters = logging.getLogger(__name__ + '.dead_letter')
+
+INSERT_SQL = '''INSERT INTO activity_logs
+    (user_id, action, entity_type, entity_id, ip_address, user_agent, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)'''
+
+# 'batched' group-commits from the background thread; 'immediate' writes and
+# commits inside the request like the original log_activity did
+DURABILITY_MODES = ('batched', 'immediate')
+
+class AuditWriter:
+    """In-process queue that group-commits activity log rows"""
+    
+    def __init__(self, app=None):
+        self.manager = None
+        self.durability = 'batched'
+        self.flush_size = 200
+        self.flush_interval = 1.0
+        self.max_pending = 10000
+        self.max_retries = 3
+        
+        self._pending = []
+        self._retries = []  # (rows, failed attempts) batches
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        
+        # Counters
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Bind to the application's connection manager and config"""
+        self.manager = app.extensions['db_manager']
+        self.durability = app.config.get('AUDIT_DURABILITY', 'batched')
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f'Unknown AUDIT_DURABILITY {self.durability!r}')
+        self.flush_size = app.config.get('AUDIT_FLUSH_SIZE', 200)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+        self.max_pending = app.config.get('AUDIT_MAX_PENDING', 10000)
+        self.max_retries = app.config.get('AUDIT_MAX_RETRIES', 3)
+        app.extensions['audit_writer'] = self
+        atexit.register(self.close)
+    
+    def record(self, user_id, action, entity_type=None, entity_id=None,
+               ip_address=None, user_agent=None):
+        """Queue one activity log row"""
+        # Stamp the row now, not when the batch is flushed. Same format as
+        # the column's CURRENT_TIMESTAMP default.
+        created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        row = (user_id, action, entity_type, entity_id, ip_address,
+               user_agent, created_at)
+        
+        if self.durability == 'immediate':
+            self._write([row])
+            return
+        
+        self._ensure_thread()
+        with self._lock:
+            self._pending.append(row)
+            backlog = len(self._pending)
+            if backlog >= self.flush_size:
+                self._wakeup.notify()
+        
+        # The writer has fallen behind, make the caller pay for a flush
+        # rather than growing the queue without bound
+        if backlog >= self.max_pending:
+            self.flush()
+    
+    def flush(self, final=False):
+        """Write every pending row now, batches awaiting a retry included
+        
+        With final set, rows that still fail are dropped rather than queued
+        again, as nothing would be left to retry them.
+        """
+        with self._lock:
+            batches, self._retries = self._retries, []
+            if self._pending:
+                batches.append((self._pending, 0))
+                self._pending = []
+        for rows, attempts in batches:
+            self._write(rows, attempts, final)
+    
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush(final=True)
+    
+    def _ensure_thread(self):
+        """Start the flusher thread, again after a fork if needed"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Rows queued in the parent belong to the parent
+                self._pending = []
+                self._retries = []
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name='audit-writer', daemon=True
+            )
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                # Failed batches wait one interval, which spaces out retries
+                if not self._stopping and len(self._pending) < self.flush_size:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+    
+    def _write(self, rows, attempts=0, final=False):
+        try:
+            with self.manager.transaction(background=True) as conn:
+                conn.executemany(INSERT_SQL, rows)
+        except Exception:
+            self.failures += 1
+            attempts += 1
+            if final or attempts >= self.max_retries:
+                logger.exception('Dropping %d audit rows after %d failed attempts',
+                                 len(rows), attempts)
+                for row in rows:
+                    dead_letters.error('%r', row)
+                # Counted once logged, so stats never run ahead of the dead letters
+                self.dropped += len(rows)
+                return
+            logger.exception('Failed to write %d audit rows (attempt %d of %d)',
+                             len(rows), attempts, self.max_retries)
+            # Immediate mode only starts the thread when something needs a retry
+            self._ensure_thread()
+            with self._lock:
+                self._retries.append((rows, attempts))
+            return
+        self.written += len(rows)
+        self.batches += 1
+    
+    def stats(self):
+        """Return writer counters"""
+        with self._lock:
+            pending = len(self._pending)
+            retrying = sum(len(rows) for rows, _ in self._retries)
+        return {
+            'durability': self.durability,
+            'pending': pending,
+            'retrying': retrying,
+            'written': self.written,
+            'batches': self.batches,
+            'failures': self.failures,
+            'dropped': self.dropped
+        }
+
+# The current app's writer (create_app() makes one per app)
+audit_writer = LocalProxy(lambda: current_app.extensions['audit_writer'])
+
+def archive_table_name(month):
+    """Archive table for a 'YYYY-MM' month"""
+    if not re.fullmatch(r'\d{4}-\d{2}', month):
+        raise ValueError(f'Invalid month {month!r}')
+    return 'activity_logs_' + month.replace('-', '_')
+
+def rollover_activity_logs(manager, older_than_days=90):
+    """Move old activity_logs rows into per-month archive tables
+    
+    Rows older than the cutoff are copied into activity_logs_YYYY_MM and
+    deleted from activity_logs in one write transaction, which keeps the
+    live table and idx_activity_logs_user sized to recent activity. Returns
+    a dict of archive table name to rows moved. archive_year() later moves
+    a past academic year's month tables into that year's archive file.
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+    moved = {}
+    
+    with manager.transaction() as conn:
+        cursor = conn.cursor()
+        columns = [(row[1], row[2]) for row in cursor.execute('PRAGMA table_info(activity_logs)')]
+        names = ', '.join(name for name, _ in columns)
+        cursor.execute(
+            '''SELECT DISTINCT strftime('%Y-%m', created_at)
+               FROM activity_logs WHERE created_at < ?''',
+            (cutoff,)
+        )
+        months = [row[0] for row in cursor.fetchall() if row[0]]
+        
+        for month in months:
+            table = archive_table_name(month)
+            # Archive tables carry the rows only, no constraints or indexes to maintain
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                f"({', '.join(f'{name} {kind}' for name, kind in columns)})"
+            )
+            # A month table made before a migration added columns gets them,
+            # and rows are copied by column name rather than position
+            present = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+            for name, kind in columns:
+                if name not in present:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {kind}')
+            cursor.execute(
+                f'''INSERT INTO {table} ({names})
+                    SELECT {names} FROM activity_logs
+                    WHERE created_at < ? AND strftime('%Y-%m', created_at) = ?''',
+                (cutoff, month)
+            )
+            moved[table] = cursor.rowcount
+            cursor.execute(
+                '''DELETE FROM activity_logs
+                   WHERE created_at < ? AND strftime('%Y-%m', created_at) = ?''',
+                (cutoff, month)
+            )
+    return moved
\ No newline at end of file
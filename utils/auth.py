@@ -0,0 +1,216 @@
+"""
+Password hashing and login helpers
+
+Password checks run on a small bounded thread pool (hashlib's scrypt
+releases the GIL) so a burst of logins cannot pin every request worker on
+CPU; once the pool and its queue are full further logins are turned away
+with LoginBusy instead of piling up. last_login updates are coalesced in
+memory and written in batches.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import wraps
+from flask import abort, current_app
+from flask_login import current_user, login_required
+from werkzeug.local import LocalProxy
+from werkzeug.security import check_password_hash, generate_password_hash
+from utils.metrics import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+class LoginBusy(Exception):
+    """Raised when the password verification queue is full"""
+
+def hash_password(password, method=None):
+    """Hash a password with method, by default the app's PASSWORD_HASH_METHOD"""
+    return generate_password_hash(
+        password, method=method or current_app.config['PASSWORD_HASH_METHOD'])
+
+def needs_rehash(password_hash, method=None):
+    """True if a stored hash was made with different parameters"""
+    return password_hash.split('$', 1)[0] != (
+        method or current_app.config['PASSWORD_HASH_METHOD'])
+
+def role_required(*user_types):
+    """Restrict a view to logged-in users of the given types"""
+    def decorator(view):
+        @wraps(view)
+        @login_required
+        def wrapped(*args, **kwargs):
+            if current_user.user_type not in user_types:
+                abort(403)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+class PasswordVerifier:
+    """Bounded executor for password hash checks"""
+    
+    def __init__(self, app=None):
+        self.workers = 2
+        self.queue_depth = 16
+        self.timeout = 10.0
+        self.method = None
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.workers = app.config.get('LOGIN_HASH_WORKERS', 2)
+        self.queue_depth = app.config.get('LOGIN_QUEUE_DEPTH', 16)
+        self.timeout = app.config.get('LOGIN_HASH_TIMEOUT', 10.0)
+        # Pool threads have no app context to read it from
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        app.extensions['password_verifier'] = self
+    
+    def _pool(self):
+        # Created lazily, and again in a forked worker
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='password-hash'
+                    )
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_depth)
+                    self._pid = os.getpid()
+        return self._executor
+    
+    def _submit(self, fn, *args):
+        pool = self._pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self.rejected += 1
+            raise LoginBusy('Too many logins in progress, try again shortly')
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise LoginBusy('Password check timed out')
+    
+    def verify(self, password_hash, password):
+        """Check a password against its hash on the pool"""
+        return self._submit(check_password_hash, password_hash, password)
+    
+    def hash(self, password):
+        """Hash a password on the pool"""
+        return self._submit(hash_password, password, self.method)
+    
+    def stats(self):
+        in_flight = 0
+        if self._slots is not None:
+            # BoundedSemaphore has no public counter
+            in_flight = self.workers + self.queue_depth - self._slots._value
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue_depth,
+            'in_flight': in_flight,
+            'rejected': self.rejected
+        }
+
+class LastLoginWriter:
+    """Coalesces last_login updates and writes them in batches"""
+    
+    def __init__(self, app=None):
+        self.manager = None
+        self.flush_interval = 5.0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self.written = 0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.manager = app.extensions['db_manager']
+        self.flush_interval = app.config.get('LAST_LOGIN_FLUSH_INTERVAL', 5.0)
+        app.extensions['last_login_writer'] = self
+        atexit.register(self.close)
+    
+    def touch(self, user_id, when):
+        """Record a login; only the latest per user is written"""
+        self._ensure_thread()
+        with self._lock:
+            self._pending[user_id] = when
+    
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            with self.manager.transaction(background=True) as conn:
+                conn.executemany(
+                    'UPDATE users SET last_login = ? WHERE id = ?',
+                    [(when, user_id) for user_id, when in pending.items()]
+                )
+        except Exception:
+            logger.exception('Failed to write %d last_login updates', len(pending))
+            with self._lock:
+                # Keep newer logins recorded while we were writing
+                for user_id, when in pending.items():
+                    self._pending.setdefault(user_id, when)
+            return
+        self.written += len(pending)
+    
+    def close(self):
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+    
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._pending = {}
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name='last-login-writer', daemon=True
+            )
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+# The current app's instances (create_app() makes one of each per app)
+password_verifier = LocalProxy(lambda: current_app.extensions['password_verifier'])
+last_login_writer = LocalProxy(lambda: current_app.extensions['last_login_writer'])
+login_latency = LatencyTracker()
+
+def login_stats():
+    """Login latency percentiles and verifier queue state for this worker"""
+    return {
+        'latency': login_latency.stats(),
+        'verifier': password_verifier.stats(),
+        'last_login_pending': len(last_login_writer._pending)
+    }
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+In-process caching helpers
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry time-to-live"""
+    
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entry"""
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, key):
+        """Drop a single entry"""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class SharedEpoch:
+    """Cross-process invalidation signal backed by a small counter file
+    
+    Caches are per worker, so an invalidation in one gunicorn worker has to
+    reach the others. Bumping replaces the file with one holding the next
+    counter value; every worker sees the new inode/mtime on its next check,
+    which costs a single stat() call.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._seen = self._read()
+    
+    def _read(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+    
+    def bump(self):
+        """Signal every process that cached data is stale
+        
+        If the file cannot be written the failure is logged and this
+        process's next changed() returns True, so at least its own caches
+        are dropped rather than trusted.
+        """
+        try:
+            try:
+                with open(self.path, 'rb') as f:
+                    value = int(f.read() or 0)
+            except (OSError, ValueError):
+                value = 0
+            # Write aside and rename so readers never see a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.',
+                                            prefix='.epoch-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(str(value + 1).encode())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            logger.exception('Could not bump cache epoch %s; other workers keep stale entries '
+                             'until they expire', self.path)
+            self._seen = False
+    
+    def changed(self):
+        """Return True once for each bump made since the last check"""
+        current = self._read()
+        if current != self._seen:
+            self._seen = current
+            return True
+        return False
+
+class DataVersion:
+    """Detects commits to a database with PRAGMA data_version
+    
+    data_version only moves when another connection commits, so the
+    watcher keeps a dedicated connection that never writes and sees every
+    commit, from this process or any other. A check is one PRAGMA.
+    """
+    
+    def __init__(self, connect):
+        self._connect = connect
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def current(self):
+        """Return the current data version"""
+        with self._lock:
+            # The watcher connection is reopened in a forked worker
+            if self._conn is None or self._pid != os.getpid():
+                self._conn = self._connect()
+                self._pid = os.getpid()
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
\ No newline at end of file
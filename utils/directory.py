@@ -0,0 +1,392 @@
+"""
+Student and supervisor directory for typeahead
+
+Each worker keeps the directory in memory: one __slots__ entry per active
+student or supervisor and four indexes over them:
+
+- the normalized full names, as a sorted list searched with bisect;
+- the distinct name and organization words, sorted, each with an array
+  of user ids in name order;
+- the identifiers (email, student and matriculation numbers), sorted
+  the same way for exact and prefix matches;
+- array-backed trigram postings for matches anywhere in a name, email,
+  number or organization.
+
+A one-word lookup walks these in rank order and stops after `limit` hits.
+Longer queries intersect the word postings of each query word first and
+only fall back to trigrams when that finds too few.
+
+The index is loaded on first use. Later lookups check PRAGMA data_version
+(one PRAGMA on a watcher connection) and, when another connection has
+committed, re-read only the users that triggers have listed in
+directory_changes since the last refresh.
+"""
+
+import bisect
+import re
+import sys
+import threading
+import time
+from array import array
+from flask import current_app
+from werkzeug.local import LocalProxy
+from database.connection import get_read_db
+from utils.cache import DataVersion
+
+USER_TYPES = ('student', 'supervisor')
+
+_WORD = re.compile(r'[\s.@_\-/]+')
+
+ENTRY_QUERY = '''
+SELECT u.id, u.user_type, u.full_name, u.email,
+       s.student_id, s.matriculation_number, s.department, s.level,
+       os.organization_name
+FROM users u
+LEFT JOIN students s ON s.user_id = u.id
+LEFT JOIN organization_supervisors os ON os.user_id = u.id
+WHERE u.is_active = 1 AND u.user_type IN ('student', 'supervisor')
+'''
+
+def normalize(text):
+    """Lowercase with runs of whitespace collapsed"""
+    return ' '.join((text or '').casefold().split())
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _insert(keys, ids, key, uid):
+    i = bisect.bisect_left(keys, key)
+    keys.insert(i, key)
+    ids.insert(i, uid)
+
+def _delete(keys, ids, key):
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+        del ids[i]
+
+def _prefixed(keys, ids, prefix):
+    """User ids of the sorted keys starting with prefix, in key order"""
+    i = bisect.bisect_left(keys, prefix)
+    while i < len(keys) and keys[i].startswith(prefix):
+        yield ids[i]
+        i += 1
+
+class Entry:
+    """One directory row"""
+    
+    __slots__ = ('user_id', 'user_type', 'full_name', 'email', 'student_id',
+                 'matriculation_number', 'department', 'level', 'organization_name',
+                 'name', 'words', 'text')
+    
+    def __init__(self, row):
+        self.user_id = row['id']
+        self.user_type = _intern(row['user_type'])
+        self.full_name = row['full_name']
+        self.email = row['email']
+        self.student_id = row['student_id']
+        self.matriculation_number = row['matriculation_number']
+        # Shared by many entries, so stored once
+        self.department = _intern(row['department'])
+        self.level = _intern(row['level'])
+        self.organization_name = _intern(row['organization_name'])
+        
+        self.name = normalize(self.full_name)
+        organization = normalize(self.organization_name)
+        self.words = tuple(sorted({sys.intern(word)
+                                   for word in _WORD.split(f'{self.name} {organization}')
+                                   if word}))
+        self.text = '\0'.join(filter(None, [self.name, *self.identifiers(), organization]))
+    
+    def identifiers(self):
+        """Email, student and matriculation numbers"""
+        return [normalize(value) for value in
+                (self.email, self.student_id, self.matriculation_number) if value]
+    
+    def matches(self, term):
+        """Whether one query word matches this entry"""
+        if len(term) >= 3:
+            return term in self.text
+        return any(word.startswith(term) for word in self.words)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'user_type': self.user_type,
+            'full_name': self.full_name,
+            'email': self.email,
+            'student_id': self.student_id,
+            'matriculation_number': self.matriculation_number,
+            'department': self.department,
+            'level': self.level,
+            'organization_name': self.organization_name
+        }
+
+class Directory:
+    """Per-worker typeahead index over students and supervisors"""
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.max_results = 10
+        self.reload_threshold = 2000
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._reset()
+        
+        # Counters
+        self.loads = 0
+        self.refreshes = 0
+        self.load_time = 0.0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        self.max_results = app.config.get('DIRECTORY_MAX_RESULTS', 10)
+        self.reload_threshold = app.config.get('DIRECTORY_RELOAD_THRESHOLD', 2000)
+        app.extensions['directory'] = self
+    
+    def _reset(self):
+        self._entries = {}
+        self._names = []         # 'name\0user id', sorted
+        self._name_ids = array('i')
+        self._words = []         # distinct words, sorted
+        self._postings = {}      # word -> user ids in name order
+        self._identifiers = []   # 'identifier\0user id', sorted
+        self._identifier_ids = array('i')
+        self._trigrams = {}      # trigram -> user ids
+        self._version = None
+        self._seq = None
+    
+    # Index maintenance
+    
+    def _order(self, uid):
+        return self._entries[uid].name, uid
+    
+    def _index(self, entry, ordered=False):
+        """Add an entry; ordered means entries arrive in name order (bulk load)"""
+        uid = entry.user_id
+        self._entries[uid] = entry
+        key = f'{entry.name}\0{uid}'
+        if ordered:
+            self._names.append(key)
+            self._name_ids.append(uid)
+        else:
+            _insert(self._names, self._name_ids, key, uid)
+            for identifier in entry.identifiers():
+                _insert(self._identifiers, self._identifier_ids, f'{identifier}\0{uid}', uid)
+        
+        for word in entry.words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = array('i')
+                if not ordered:
+                    bisect.insort(self._words, word)
+            if ordered:
+                postings.append(uid)
+            else:
+                postings.insert(bisect.bisect(postings, self._order(uid), key=self._order), uid)
+        for gram in _trigrams(entry.text):
+            self._trigrams.setdefault(gram, array('i')).append(uid)
+    
+    def _unindex(self, uid):
+        entry = self._entries.get(uid)
+        if entry is None:
+            return
+        _delete(self._names, self._name_ids, f'{entry.name}\0{uid}')
+        for identifier in entry.identifiers():
+            _delete(self._identifiers, self._identifier_ids, f'{identifier}\0{uid}')
+        
+        for word in entry.words:
+            postings = self._postings[word]
+            postings.remove(uid)
+            if not postings:
+                del self._postings[word]
+                del self._words[bisect.bisect_left(self._words, word)]
+        for gram in _trigrams(entry.text):
+            postings = self._trigrams[gram]
+            postings.remove(uid)
+            if not postings:
+                del self._trigrams[gram]
+        del self._entries[uid]
+    
+    def _load(self, db):
+        """Build the whole index in bulk"""
+        start = time.perf_counter()
+        seq = db.execute('SELECT COALESCE(MAX(seq), 0) FROM directory_changes').fetchone()[0]
+        entries = [Entry(row) for row in db.execute(ENTRY_QUERY)]
+        entries.sort(key=lambda entry: (entry.name, entry.user_id))
+        self._reset()
+        for entry in entries:
+            self._index(entry, ordered=True)
+        self._words = sorted(self._postings)
+        identifiers = sorted((f'{identifier}\0{entry.user_id}', entry.user_id)
+                             for entry in entries for identifier in entry.identifiers())
+        self._identifiers = [key for key, _ in identifiers]
+        self._identifier_ids = array('i', (uid for _, uid in identifiers))
+        self._seq = seq
+        self.loads += 1
+        self.load_time = time.perf_counter() - start
+    
+    def _refresh(self):
+        """Load the index, or apply changes committed since the last check"""
+        if self._watcher is None:
+            manager = self.app.extensions['db_manager']
+            self._watcher = DataVersion(manager.connect_readonly)
+        version = self._watcher.current()
+        if version == self._version:
+            return
+        db = get_read_db()
+        if self._seq is None:
+            self._load(db)
+            self._version = version
+            return
+        
+        changes = db.execute(
+            'SELECT seq, user_id FROM directory_changes WHERE seq > ? ORDER BY seq',
+            (self._seq,)).fetchall()
+        if len(changes) > self.reload_threshold:
+            self._load(db)
+        elif changes:
+            ids = [row['user_id'] for row in changes]
+            marks = ', '.join('?' * len(ids))
+            rows = db.execute(f'{ENTRY_QUERY} AND u.id IN ({marks})', ids).fetchall()
+            for uid in ids:
+                self._unindex(uid)
+            for row in rows:
+                self._index(Entry(row))
+            self._seq = changes[-1]['seq']
+            self.refreshes += 1
+        self._version = version
+    
+    # Lookups
+    
+    def _word_prefixed(self, prefix):
+        words = self._words
+        i = bisect.bisect_left(words, prefix)
+        while i < len(words) and words[i].startswith(prefix):
+            yield words[i]
+            i += 1
+    
+    def _word_ids(self, term):
+        """User ids with a name or organization word starting with term"""
+        ids = set()
+        for word in self._word_prefixed(term):
+            ids.update(self._postings[word])
+        return ids
+    
+    def _containing(self, term):
+        """User ids whose text may contain term (trigram postings intersected)"""
+        postings = []
+        for gram in _trigrams(term):
+            found = self._trigrams.get(gram)
+            if found is None:
+                return set()
+            postings.append(found)
+        postings.sort(key=len)
+        ids = set(postings[0])
+        for found in postings[1:]:
+            # Few candidates left: checking their text beats another pass
+            if not ids or len(ids) * 16 < len(found):
+                break
+            ids.intersection_update(found)
+        return ids
+    
+    def _intersect(self, terms, lookup):
+        ids = None
+        for term in sorted(terms, key=len, reverse=True):
+            found = lookup(term)
+            ids = found if ids is None else ids & found
+            if not ids:
+                break
+        return ids
+    
+    def _substring_matches(self, terms):
+        """User ids containing every term anywhere, in name order"""
+        def candidates(term):
+            return self._containing(term) if len(term) >= 3 else self._word_ids(term)
+        
+        entries = self._entries
+        matches = [entries[uid] for uid in self._intersect(terms, candidates)
+                   if all(entries[uid].matches(term) for term in terms)]
+        matches.sort(key=lambda entry: (entry.name, entry.user_id))
+        for entry in matches:
+            yield entry.user_id
+    
+    def _ranked(self, terms, phrase):
+        """User ids matching every term, best first (may repeat)
+        
+        A generator, so search() stops walking once it has enough.
+        """
+        names = self._names, self._name_ids
+        identifiers = self._identifiers, self._identifier_ids
+        if len(terms) == 1:
+            yield from _prefixed(*identifiers, f'{phrase}\0')
+            yield from _prefixed(*names, phrase)
+            for word in self._word_prefixed(phrase):
+                yield from self._postings[word]
+            yield from _prefixed(*identifiers, phrase)
+            if len(phrase) >= 3:
+                yield from self._substring_matches(terms)
+            return
+        
+        yield from _prefixed(*names, phrase)
+        yield from sorted(self._intersect(terms, self._word_ids), key=self._order)
+        yield from self._substring_matches(terms)
+    
+    def search(self, query, user_type=None, department=None, level=None, limit=None):
+        """Ranked matches for a typeahead query, as dicts
+        
+        Exact identifiers come first, then full names starting with the
+        query, then names and organizations with a word starting with each
+        query word, then emails and numbers starting with the query, then
+        matches anywhere. department and level only narrow students.
+        """
+        phrase = normalize(query)
+        terms = phrase.split()
+        if not terms:
+            return []
+        limit = limit or self.max_results
+        
+        with self._lock:
+            self._refresh()
+            entries = self._entries
+            results = []
+            seen = set()
+            for uid in self._ranked(terms, phrase):
+                if uid in seen:
+                    continue
+                seen.add(uid)
+                entry = entries[uid]
+                if user_type is not None and entry.user_type != user_type:
+                    continue
+                if entry.user_type == 'student' and (
+                        (department is not None and entry.department != department)
+                        or (level is not None and entry.level != level)):
+                    continue
+                results.append(entry.to_dict())
+                if len(results) >= limit:
+                    break
+            return results
+    
+    def invalidate(self):
+        """Rebuild the index on the next lookup"""
+        with self._lock:
+            self._reset()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'words': len(self._words),
+                'trigrams': len(self._trigrams),
+                'loads': self.loads,
+                'refreshes': self.refreshes,
+                'load_time': round(self.load_time, 3)
+            }
+
+# The current app's directory (create_app() makes one per app)
+directory = LocalProxy(lambda: current_app.extensions['directory'])
\ No newline at end of file
@@ -0,0 +1,344 @@
+"""
+Persistent outbound email queue
+
+Messages are stored in the email_queue table and sent by background worker
+threads, never inline in a request. Each worker claims a batch of due rows,
+sends them over one reused SMTP session, and reschedules failures with
+exponential backoff until MAIL_MAX_ATTEMPTS, after which the row is parked
+as 'dead' for inspection. Sending is rate limited per process.
+"""
+
+import atexit
+import logging
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from flask import current_app, render_template
+from werkzeug.local import LocalProxy
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Token bucket shared by the worker threads of one process"""
+    
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available"""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class MailQueue:
+    """Queue emails in SQLite and drain them from worker threads"""
+    
+    def __init__(self, app=None):
+        self.manager = None
+        self.config = {}
+        self.limiter = None
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        
+        # Counters
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.batches = 0
+        self.connections = 0
+        self.send_time = 0.0
+        
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.manager = app.extensions['db_manager']
+        self.config = {
+            'server': app.config.get('MAIL_SERVER'),
+            'port': app.config.get('MAIL_PORT', 25),
+            'use_tls': app.config.get('MAIL_USE_TLS', False),
+            'username': app.config.get('MAIL_USERNAME'),
+            'password': app.config.get('MAIL_PASSWORD'),
+            'sender': app.config.get('MAIL_DEFAULT_SENDER'),
+            'workers': app.config.get('MAIL_QUEUE_WORKERS', 1),
+            'batch_size': app.config.get('MAIL_BATCH_SIZE', 50),
+            'max_recipients': app.config.get('MAIL_MAX_RECIPIENTS', 50),
+            'max_attempts': app.config.get('MAIL_MAX_ATTEMPTS', 5),
+            'backoff': app.config.get('MAIL_RETRY_BACKOFF', 60),
+            'poll_interval': app.config.get('MAIL_POLL_INTERVAL', 5.0),
+            'idle_timeout': app.config.get('MAIL_SMTP_IDLE_TIMEOUT', 30.0),
+            'suppress': app.config.get('MAIL_SUPPRESS_SEND', app.testing)
+        }
+        self.limiter = RateLimiter(app.config.get('MAIL_RATE_LIMIT', 5))
+        app.extensions['mail_queue'] = self
+        atexit.register(self.stop)
+    
+    # Enqueueing
+    
+    def enqueue(self, recipients, subject, body, html=None, conn=None):
+        """Queue a message for one or more recipients
+        
+        Several recipients share one message (they are BCC'd), split into
+        groups of MAIL_MAX_RECIPIENTS, so a digest to a whole class is a
+        handful of sends rather than one per student. Pass conn to enqueue
+        inside an existing write transaction, and call wake() once it has
+        committed; until then the workers could not see the rows. Returns
+        the queued row count.
+        """
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        recipients = sorted({r.strip().lower() for r in recipients if r and r.strip()})
+        if not recipients:
+            return 0
+        
+        size = self.config.get('max_recipients', 50)
+        rows = [(','.join(recipients[i:i + size]), subject, body, html)
+                for i in range(0, len(recipients), size)]
+        
+        sql = '''INSERT INTO email_queue (recipients, subject, body, html)
+                 VALUES (?, ?, ?, ?)'''
+        if conn is not None:
+            conn.executemany(sql, rows)
+            return len(rows)
+        with self.manager.transaction(background=True) as tx:
+            tx.executemany(sql, rows)
+        self.wake()
+        return len(rows)
+    
+    def wake(self):
+        """Start the workers if needed and have them claim newly committed mail"""
+        self._ensure_workers()
+        self._wakeup.set()
+    
+    def enqueue_template(self, recipients, subject, template, html_template=None,
+                         conn=None, **context):
+        """Render a template once and queue it for all recipients"""
+        body = render_template(template, **context)
+        html = render_template(html_template, **context) if html_template else None
+        return self.enqueue(recipients, subject, body, html, conn=conn)
+    
+    # Workers
+    
+    def _ensure_workers(self):
+        if self.config.get('workers', 0) <= 0:
+            return
+        if self._threads and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping = False
+            self._threads = []
+            for n in range(self.config['workers']):
+                thread = threading.Thread(target=self.run_worker,
+                                          name=f'mail-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def stop(self):
+        """Ask worker threads to finish their current batch and exit"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._pid == os.getpid():
+            for thread in self._threads:
+                thread.join(timeout=10)
+        self._threads = []
+    
+    def run_worker(self):
+        """Drain the queue until stopped, keeping the SMTP session warm"""
+        smtp = None
+        last_used = 0.0
+        while not self._stopping:
+            # Cleared before claiming, so mail committed during the batch
+            # cuts the next wait short instead of being lost
+            self._wakeup.clear()
+            sent = 0
+            try:
+                smtp, sent = self.process_batch(smtp)
+            except Exception:
+                logger.exception('Mail worker batch failed')
+            if sent:
+                last_used = time.monotonic()
+                continue
+            # Nothing due: drop an idle session and wait for new mail
+            if smtp is not None and time.monotonic() - last_used > self.config['idle_timeout']:
+                self._quit(smtp)
+                smtp = None
+            self._wakeup.wait(self.config['poll_interval'])
+        if smtp is not None:
+            self._quit(smtp)
+    
+    def drain(self):
+        """Send everything currently due from this thread, return messages sent"""
+        smtp = None
+        total = 0
+        try:
+            while True:
+                smtp, sent = self.process_batch(smtp)
+                if not sent:
+                    break
+                total += sent
+        finally:
+            if smtp is not None:
+                self._quit(smtp)
+        return total
+    
+    def process_batch(self, smtp=None):
+        """Claim and send one batch; returns (smtp session, rows handled)"""
+        rows = self._claim()
+        if not rows:
+            return smtp, 0
+        
+        start = time.perf_counter()
+        results = []
+        for row in rows:
+            self.limiter.acquire()
+            try:
+                smtp = self._send(smtp, row)
+                results.append((row, None))
+            except (smtplib.SMTPException, OSError) as e:
+                results.append((row, str(e) or e.__class__.__name__))
+                # Session state is unknown after a failure, start afresh
+                if smtp is not None:
+                    self._quit(smtp)
+                    smtp = None
+        self.send_time += time.perf_counter() - start
+        self.batches += 1
+        self._record(results)
+        return smtp, len(rows)
+    
+    def _claim(self):
+        """Atomically mark a batch of due messages as sending"""
+        with self.manager.transaction(background=True) as conn:
+            cursor = conn.cursor()
+            # Rows left in 'sending' by a crashed worker go back to the queue
+            cursor.execute(
+                '''UPDATE email_queue SET status = 'pending'
+                   WHERE status = 'sending' AND claimed_at < datetime('now', '-15 minutes')'''
+            )
+            cursor.execute(
+                '''UPDATE email_queue
+                   SET status = 'sending', attempts = attempts + 1,
+                       claimed_at = datetime('now')
+                   WHERE id IN (
+                       SELECT id FROM email_queue
+                       WHERE status = 'pending' AND next_attempt_at <= datetime('now')
+                       ORDER BY next_attempt_at, id
+                       LIMIT ?
+                   )
+                   RETURNING id, recipients, subject, body, html, attempts''',
+                (self.config['batch_size'],)
+            )
+            return cursor.fetchall()
+    
+    def _connect(self):
+        smtp = smtplib.SMTP(self.config['server'], self.config['port'], timeout=30)
+        if self.config['use_tls']:
+            smtp.starttls()
+        if self.config['username']:
+            smtp.login(self.config['username'], self.config['password'])
+        self.connections += 1
+        return smtp
+    
+    def _quit(self, smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+    
+    def _send(self, smtp, row):
+        recipients = row['recipients'].split(',')
+        message = EmailMessage()
+        message['Subject'] = row['subject']
+        message['From'] = self.config['sender']
+        if len(recipients) == 1:
+            message['To'] = recipients[0]
+        else:
+            # Recipients of a shared message must not see each other
+            message['To'] = self.config['sender']
+        message.set_content(row['body'])
+        if row['html']:
+            message.add_alternative(row['html'], subtype='html')
+        
+        if self.config['suppress']:
+            return smtp
+        if smtp is None:
+            smtp = self._connect()
+        try:
+            smtp.send_message(message, to_addrs=recipients)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle session, reconnect once
+            smtp = self._connect()
+            smtp.send_message(message, to_addrs=recipients)
+        return smtp
+    
+    def _record(self, results):
+        """Mark sent rows and reschedule or dead-letter failed ones"""
+        sent = [(row['id'],) for row, error in results if error is None]
+        retry = []
+        dead = []
+        for row, error in results:
+            if error is None:
+                continue
+            if row['attempts'] >= self.config['max_attempts']:
+                dead.append((error, row['id']))
+            else:
+                delay = self.config['backoff'] * 2 ** (row['attempts'] - 1)
+                retry.append((error, f'+{int(delay)} seconds', row['id']))
+        
+        with self.manager.transaction(background=True) as conn:
+            conn.executemany(
+                '''UPDATE email_queue SET status = 'sent', sent_at = datetime('now'),
+                   last_error = NULL WHERE id = ?''',
+                sent
+            )
+            conn.executemany(
+                '''UPDATE email_queue SET status = 'pending', last_error = ?,
+                   next_attempt_at = datetime('now', ?) WHERE id = ?''',
+                retry
+            )
+            conn.executemany(
+                '''UPDATE email_queue SET status = 'dead', last_error = ?
+                   WHERE id = ?''',
+                dead
+            )
+        
+        self.sent += len(sent)
+        self.retried += len(retry)
+        self.dead += len(dead)
+        for error, row_id in dead:
+            logger.error('Email %s dead-lettered: %s', row_id, error)
+    
+    def stats(self):
+        """Return worker counters and throughput for this process"""
+        return {
+            'sent': self.sent,
+            'retried': self.retried,
+            'dead': self.dead,
+            'batches': self.batches,
+            'smtp_connections': self.connections,
+            'messages_per_second': round(self.sent / self.send_time, 2) if self.send_time else 0.0
+        }
+
+# The current app's queue (create_app() makes one per app)
+mail_queue = LocalProxy(lambda: current_app.extensions['mail_queue'])
\ No newline at end of file
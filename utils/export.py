@@ -0,0 +1,242 @@
+"""
+Streaming department exports
+
+Rows are read with fetchmany() from a dedicated read-only connection (not
+one of the request pool's readers, which a long download would tie up) and
+written out batch by batch, so memory stays flat however large the export
+is. CSV is produced directly as a generator; XLSX goes through openpyxl's
+write-only workbook into a temporary file that is then streamed back.
+Queries are driven from students by department so rows come out in index
+order and SQLite never has to sort the whole result.
+"""
+
+import codecs
+import csv
+import io
+import logging
+import os
+import tempfile
+import time
+from datetime import date
+from models import attendance, evaluation, weekly_log
+from models.student import LEVELS
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+PROGRESS_EVERY = 10000
+CHUNK_SIZE = 64 * 1024
+
+_STUDENTS = '''FROM students s
+               JOIN users u ON s.user_id = u.id'''
+
+DATASETS = {
+    'weekly_logs': {
+        'columns': ['Student ID', 'Name', 'Level', 'Organization', 'Week',
+                    'Week Start', 'Week End', 'Status', 'Activities', 'Skills Learned',
+                    'Challenges', 'Supervisor Comment', 'HOD Comment', 'Submitted At'],
+        'select': '''SELECT s.student_id, u.full_name, s.level, ip.organization_name,
+                            wl.week_number, wl.week_start_date, wl.week_end_date, wl.status,
+                            wl.activities, wl.skills_learned, wl.challenges,
+                            wl.supervisor_comment, wl.hod_comment, wl.submitted_at''',
+        'joins': '''JOIN weekly_logs wl ON wl.student_id = s.id
+                    JOIN internship_placements ip ON wl.placement_id = ip.id''',
+        'date': 'wl.week_start_date',
+        'status': 'wl.status',
+        'statuses': weekly_log.STATUSES,
+        'order': 's.level, s.id, wl.week_number'
+    },
+    'attendance': {
+        'columns': ['Student ID', 'Name', 'Level', 'Organization', 'Date', 'Status',
+                    'Check In', 'Check Out', 'Remarks'],
+        'select': '''SELECT s.student_id, u.full_name, s.level, ip.organization_name,
+                            a.date, a.status, a.check_in_time, a.check_out_time, a.remarks''',
+        'joins': '''JOIN attendance a ON a.student_id = s.id
+                    JOIN internship_placements ip ON a.placement_id = ip.id''',
+        'date': 'a.date',
+        'status': 'a.status',
+        'statuses': attendance.STATUSES,
+        'order': 's.level, s.id, a.date'
+    },
+    'evaluations': {
+        'columns': ['Student ID', 'Name', 'Level', 'Organization', 'Evaluator',
+                    'Evaluator Type', 'Punctuality', 'Communication', 'Professionalism',
+                    'Technical Skills', 'Initiative', 'Overall', 'Comments',
+                    'Recommendation', 'Evaluated At'],
+        'select': '''SELECT s.student_id, u.full_name, s.level, ip.organization_name,
+                            ev.full_name, e.evaluator_type, e.punctuality, e.communication,
+                            e.professionalism, e.technical_skills, e.initiative,
+                            e.overall_rating, e.comments, e.recommendation, e.evaluated_at''',
+        'joins': '''JOIN evaluations e ON e.student_id = s.id
+                    JOIN internship_placements ip ON e.placement_id = ip.id
+                    JOIN users ev ON e.evaluator_id = ev.id''',
+        'date': 'date(e.evaluated_at)',
+        # Evaluations have no status; the filter picks the evaluator type
+        'status': 'e.evaluator_type',
+        'statuses': evaluation.EVALUATOR_TYPES,
+        'order': 's.level, s.id, e.evaluated_at'
+    }
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+class ExportError(ValueError):
+    """Raised for an export that cannot be produced"""
+
+def parse_filters(args):
+    """Read level/status/date filters from request args"""
+    filters = {}
+    for name in ('level', 'status'):
+        if args.get(name):
+            filters[name] = args[name]
+    for name in ('date_from', 'date_to'):
+        if args.get(name):
+            try:
+                filters[name] = date.fromisoformat(args[name])
+            except ValueError:
+                raise ExportError(f'{name} must be a YYYY-MM-DD date')
+    return filters
+
+def build_query(dataset, department, level=None, status=None, date_from=None, date_to=None):
+    """Return (sql, count_sql, params) for a dataset"""
+    if dataset not in DATASETS:
+        raise ExportError(f'Unknown export: {dataset}')
+    spec = DATASETS[dataset]
+    if level and level not in LEVELS:
+        raise ExportError(f"level must be one of {', '.join(LEVELS)}")
+    if status and status not in spec['statuses']:
+        raise ExportError(f"status must be one of {', '.join(spec['statuses'])} "
+                          f"for {dataset}")
+    
+    where = ['s.department = ?']
+    params = [department]
+    if level:
+        where.append('s.level = ?')
+        params.append(level)
+    if status:
+        where.append(f"{spec['status']} = ?")
+        params.append(status)
+    if date_from:
+        where.append(f"{spec['date']} >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        where.append(f"{spec['date']} <= ?")
+        params.append(date_to.isoformat())
+    
+    body = f"{_STUDENTS} {spec['joins']} WHERE {' AND '.join(where)}"
+    sql = f"{spec['select']} {body} ORDER BY {spec['order']}"
+    return sql, f'SELECT COUNT(*) {body}', params
+
+class Export:
+    """One export run; iterate csv() or xlsx() for the file's bytes"""
+    
+    def __init__(self, manager, dataset, department, progress=None,
+                 batch_size=BATCH_SIZE, **filters):
+        self.manager = manager
+        self.dataset = dataset
+        self.department = department
+        self.sql, self.count_sql, self.params = build_query(dataset, department, **filters)
+        self.progress = progress
+        self.batch_size = batch_size
+        self.total = None
+        self.rows = 0
+        self.started = None
+    
+    @property
+    def columns(self):
+        return DATASETS[self.dataset]['columns']
+    
+    def count(self):
+        """Count the rows up front so progress can be reported"""
+        pool = self.manager.reader
+        conn = pool.acquire()
+        try:
+            self.total = conn.execute(self.count_sql, self.params).fetchone()[0]
+        finally:
+            pool.release(conn)
+        return self.total
+    
+    def batches(self):
+        """Yield lists of rows, one fetchmany() at a time"""
+        self.started = time.perf_counter()
+        conn = self.manager.connect_readonly()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self.sql, self.params)
+            next_report = PROGRESS_EVERY
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                self.rows += len(rows)
+                yield rows
+                if self.rows >= next_report:
+                    self._report()
+                    next_report += PROGRESS_EVERY
+        finally:
+            # Also reached when the client goes away mid-download
+            cursor.close()
+            conn.close()
+        self._report(done=True)
+    
+    def _report(self, done=False):
+        elapsed = time.perf_counter() - self.started
+        logger.info('Export %s/%s: %d%s rows in %.1fs%s', self.department, self.dataset,
+                    self.rows, f'/{self.total}' if self.total is not None else '',
+                    elapsed, ' (done)' if done else '')
+        if self.progress is not None:
+            self.progress(self, done)
+    
+    def csv(self):
+        """Yield the export as UTF-8 CSV (with a BOM so Excel reads it)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.columns)
+        yield codecs.BOM_UTF8 + buffer.getvalue().encode('utf-8')
+        for rows in self.batches():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+    
+    def xlsx(self, workbook_class):
+        """Yield the export as an XLSX workbook"""
+        workbook = workbook_class(write_only=True)
+        sheet = workbook.create_sheet(self.dataset.replace('_', ' ').title())
+        sheet.append(self.columns)
+        for rows in self.batches():
+            for row in rows:
+                sheet.append(tuple(row))
+        
+        # Write-only sheets spool to disk; the zip is assembled on save
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            workbook.save(path)
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.unlink(path)
+    
+    def stream(self, fmt):
+        if fmt == 'csv':
+            return self.csv()
+        if fmt == 'xlsx':
+            # Checked before streaming starts so the error can still be a 400
+            try:
+                from openpyxl import Workbook
+            except ImportError:
+                raise ExportError('XLSX export needs openpyxl installed')
+            return self.xlsx(Workbook)
+        raise ExportError(f'Unknown format: {fmt}')
+    
+    def filename(self, fmt):
+        department = self.department.replace(' ', '_')
+        return f'{department}-{self.dataset}-{date.today().isoformat()}.{fmt}'
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""
+Rendered template fragment cache
+
+Dashboards are mostly a few expensive sections (a student's attendance
+widget and log timeline, a supervisor's or HOD's intern table) whose data
+changes a few times a day. FragmentCache.render() keeps their HTML under a
+key made of the template, the user and the data_versions counters the
+section depends on (database/versions.py):
+    
+    fragment_cache.render('student/_attendance.html',
+                          entities('student', student_id, ('attendance',)),
+                          lambda: {'summaries': Attendance.summary_for_student(student_id)},
+                          user_id=current_user.id)
+
+The counters are read (one query) before load() runs, so HTML built from
+newer data can sit under an older key but never the other way round.
+Nothing is invalidated: writes bump the counters and the next render of
+an affected section misses.
+
+Entries live in a per-worker LRU of FRAGMENT_CACHE_SIZE entries, each at
+most FRAGMENT_MAX_BYTES. With FRAGMENT_CACHE_DIR set they are also written
+there, one file per key, so gunicorn workers share each other's renders;
+the directory is pruned to FRAGMENT_DISK_MAX_BYTES, least recently used
+first.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from flask import current_app, render_template
+from markupsafe import Markup
+from werkzeug.local import LocalProxy
+from database.connection import get_read_db
+from database.versions import current
+from utils.cache import LRUCache
+from utils.metrics import Counter, Histogram, gauge
+
+logger = logging.getLogger(__name__)
+
+RESULTS = ('memory', 'disk', 'miss')
+
+class DiskStore:
+    """Fragments shared between processes, one file per key"""
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._written = 0
+        self._lock = threading.Lock()
+    
+    def _path(self, key):
+        return os.path.join(self.directory,
+                            hashlib.sha256(key.encode()).hexdigest() + '.html')
+    
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                html = f.read().decode()
+                # mtime is the recency prune() goes by; a minute is precise enough
+                if time.time() - os.fstat(f.fileno()).st_mtime > 60:
+                    os.utime(f.fileno())
+        except OSError:
+            return None
+        return html
+    
+    def set(self, key, html):
+        data = html.encode()
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        
+        # Scan the directory after every tenth of the limit written
+        with self._lock:
+            self._written += len(data)
+            due = self._written > self.max_bytes // 10
+            if due:
+                self._written = 0
+        if due:
+            self.prune()
+    
+    def prune(self):
+        """Delete the least recently used files until under 90% of max_bytes"""
+        files = []
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.html'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return 0
+        
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                # Another worker got there first
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self.evictions += removed
+        return removed
+    
+    def stats(self):
+        return {'directory': self.directory, 'max_bytes': self.max_bytes,
+                'evictions': self.evictions}
+
+class FragmentCache:
+    """Rendered HTML of template sections keyed on the data versions behind them"""
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.max_bytes = 64 * 1024
+        self.memory = LRUCache(maxsize=1024)
+        self.disk = None
+        self.lookups = Counter('bids_fragment_cache_lookups_total',
+                               'Fragment cache lookups by where they were served from.',
+                               labels=('fragment', 'result'))
+        self.render_time = Histogram('bids_fragment_render_seconds',
+                                     'Time to load and render a fragment on a miss.',
+                                     labels=('fragment',))
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('FRAGMENT_CACHE_ENABLED', True)
+        self.max_bytes = app.config.get('FRAGMENT_MAX_BYTES', 64 * 1024)
+        self.memory = LRUCache(maxsize=app.config.get('FRAGMENT_CACHE_SIZE', 1024))
+        directory = app.config.get('FRAGMENT_CACHE_DIR')
+        self.disk = (DiskStore(directory, app.config.get('FRAGMENT_DISK_MAX_BYTES',
+                                                         256 * 1024 * 1024))
+                     if directory else None)
+        app.extensions['fragment_cache'] = self
+    
+    @staticmethod
+    def key(template, entities, user_id=None, vary=()):
+        """Cache key: template, user, counter values and any extra vary values"""
+        versions = current(get_read_db(), entities) if entities else ()
+        parts = [template, str(user_id)]
+        parts += [f'{name}={version}' for name, version in zip(entities, versions)]
+        parts += [str(value) for value in vary]
+        return '\0'.join(parts)
+    
+    def render(self, template, entities, load, user_id=None, vary=()):
+        """HTML of template rendered with the context load() returns
+        
+        entities are the data_versions counters the section depends on;
+        load() only runs on a miss. vary adds values the output depends on
+        that no counter tracks (today's date, say).
+        """
+        if not self.enabled:
+            return Markup(render_template(template, **load()))
+        
+        entities = list(entities)
+        key = self.key(template, entities, user_id, vary)
+        html = self.memory.get(key)
+        if html is not None:
+            self.lookups.inc(template, 'memory')
+            return Markup(html)
+        if self.disk is not None:
+            html = self.disk.get(key)
+            if html is not None:
+                self.lookups.inc(template, 'disk')
+                self.memory.set(key, html)
+                return Markup(html)
+        
+        self.lookups.inc(template, 'miss')
+        start = time.perf_counter()
+        html = render_template(template, **load())
+        self.render_time.observe(time.perf_counter() - start, template)
+        if len(html.encode()) <= self.max_bytes:
+            self.memory.set(key, html)
+            if self.disk is not None:
+                try:
+                    self.disk.set(key, html)
+                except OSError:
+                    logger.exception('Failed to store fragment %s', template)
+        return Markup(html)
+    
+    def clear(self):
+        """Drop this worker's entries (the disk store is left alone)"""
+        self.memory.clear()
+    
+    def stats(self):
+        """Lookups and hit rate per fragment, with the stores' counters"""
+        fragments = {}
+        for (template, result), count in self.lookups.values().items():
+            fragments.setdefault(template, dict.fromkeys(RESULTS, 0))[result] = count
+        for counts in fragments.values():
+            lookups = sum(counts[result] for result in RESULTS)
+            counts['hit_rate'] = round((lookups - counts['miss']) / lookups, 4) if lookups else 0.0
+        return {
+            'fragments': fragments,
+            'memory': self.memory.stats(),
+            'disk': self.disk.stats() if self.disk is not None else None
+        }
+    
+    def metrics(self):
+        """Exposition line groups for /admin/metrics"""
+        fragments = self.stats()['fragments']
+        return [
+            self.lookups.render(),
+            self.render_time.render(),
+            gauge('bids_fragment_cache_hit_ratio', 'Share of fragment lookups served from cache.',
+                  [([('fragment', template)], counts['hit_rate'])
+                   for template, counts in sorted(fragments.items())]),
+            gauge('bids_fragment_cache_entries', 'Fragments held in this worker.',
+                  [([], len(self.memory))])
+        ]
+
+# The current app's cache (create_app() makes one per app)
+fragment_cache = LocalProxy(lambda: current_app.extensions['fragment_cache'])
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Lightweight in-process metrics
+"""
+
+import bisect
+import math
+import threading
+from collections import deque
+
+# Seconds; the Prometheus client defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class LatencyTracker:
+    """Keeps the most recent latency samples and reports percentiles"""
+    
+    def __init__(self, window=2048):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+    
+    def observe(self, seconds):
+        """Record one sample, in seconds"""
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+    
+    def percentiles(self, points=(50, 90, 99)):
+        """Return {p50: ms, ...} over the current window (nearest rank)"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {f'p{p}': None for p in points}
+        result = {}
+        for p in points:
+            rank = max(1, math.ceil(p / 100 * len(samples)))
+            result[f'p{p}'] = round(samples[rank - 1] * 1000, 3)
+        return result
+    
+    def stats(self):
+        """Return count, mean and percentiles in milliseconds"""
+        stats = {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else None
+        }
+        stats.update(self.percentiles())
+        return stats
+    
+    def render(self, name, help, points=(50, 90, 99)):
+        """Exposition lines for the window as a Prometheus summary (seconds)"""
+        lines = [f'# HELP {name} {help}', f'# TYPE {name} summary']
+        for point, ms in self.percentiles(points).items():
+            if ms is not None:
+                quantile = f'{int(point[1:]) / 100:g}'
+                lines.append(f'{name}{_labels([("quantile", quantile)])} {ms / 1000:.6f}')
+        with self._lock:
+            count, total = self.count, self.total
+        lines.append(f'{name}_sum {total:.6f}')
+        lines.append(f'{name}_count {count}')
+        return lines
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Histogram:
+    """Labelled histogram with fixed buckets, rendered in Prometheus format"""
+    
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+    
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    def render(self):
+        """Return the exposition lines for every series"""
+        with self._lock:
+            snapshot = [(values, list(counts), total)
+                        for values, (counts, total) in self._series.items()]
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for values, counts, total in sorted(snapshot):
+            pairs = list(zip(self.labels, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else f'{bound:g}'
+                lines.append(f'{self.name}_bucket{_labels(pairs + [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(pairs)} {total:.6f}')
+            lines.append(f'{self.name}_count{_labels(pairs)} {cumulative}')
+        return lines
+
+class Counter:
+    """Labelled monotonically increasing counter"""
+    
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def values(self):
+        """Current value of every series, by label values"""
+        with self._lock:
+            return dict(self._values)
+    
+    def render(self):
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for values, value in snapshot:
+            lines.append(f'{self.name}{_labels(list(zip(self.labels, values)))} {value}')
+        return lines
+
+def gauge(name, help, samples):
+    """Exposition lines for a gauge from [(label pairs, value)]"""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} gauge']
+    for pairs, value in samples:
+        lines.append(f'{name}{_labels(pairs)} {value}')
+    return lines
+
+def counter(name, help, samples):
+    """Exposition lines for a counter kept elsewhere, from [(label pairs, value)]"""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} counter']
+    for pairs, value in samples:
+        lines.append(f'{name}{_labels(pairs)} {value}')
+    return lines
+
+def render_prometheus(*groups):
+    """Join exposition lines into a text/plain scrape body"""
+    return '\n'.join(line for lines in groups for line in lines) + '\n'
@@ -0,0 +1,105 @@
+"""
+Keyset (cursor) pagination helpers
+
+Pages are fetched with a WHERE (k1, k2, ...) > (?, ?, ...) predicate on the
+sort key instead of OFFSET, so page 50 walks the same few index entries as
+page 1 and no request ever reads more than one page of rows.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+MAX_PAGE_SIZE = 100
+
+class Page:
+    """One page of rows plus the cursor for the next page"""
+    
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+    
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def __repr__(self):
+        return f'<Page {len(self.items)} items, has_more={self.has_more}>'
+
+def _plain(value):
+    # PARSE_DECLTYPES hands back date/datetime objects; compare against the
+    # same text SQLite stores
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def encode_cursor(values):
+    """Encode sort key values as an opaque URL-safe cursor"""
+    raw = json.dumps([_plain(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid pagination cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid pagination cursor')
+    return values
+
+def keyset_paginate(db, select, where, params, keys, cursor=None,
+                    limit=20, descending=False):
+    """Fetch one page of a query ordered by a unique key
+    
+    select     -- 'SELECT ... FROM ... JOIN ...' without WHERE/ORDER BY
+    where      -- list of filter conditions, ANDed together
+    params     -- parameters for the filter conditions
+    keys       -- list of (sql expression, result column) pairs forming a
+                  unique sort key, e.g. [('n.created_at', 'created_at'),
+                  ('n.id', 'id')]
+    cursor     -- next_cursor from the previous page, None for the first
+    
+    Returns a Page. An index whose columns match the equality filters
+    followed by the sort key turns each page into a short range scan, so
+    leave columns already pinned by an equality filter out of keys.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    where = list(where)
+    params = list(params)
+    expressions = [expr for expr, _ in keys]
+    
+    if cursor:
+        values = decode_cursor(cursor, len(keys))
+        operator = '<' if descending else '>'
+        placeholders = ', '.join('?' * len(values))
+        where.append(f"({', '.join(expressions)}) {operator} ({placeholders})")
+        params.extend(values)
+    
+    direction = 'DESC' if descending else 'ASC'
+    query = select
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    query += ' ORDER BY ' + ', '.join(f'{expr} {direction}' for expr in expressions)
+    query += ' LIMIT ?'
+    params.append(limit + 1)
+    
+    cursor_obj = db.cursor()
+    cursor_obj.execute(query, params)
+    rows = cursor_obj.fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[column] for _, column in keys])
+    return Page(rows, next_cursor)
\ No newline at end of file
@@ -0,0 +1,343 @@
+"""
+Internship summary PDFs
+
+Rendered summaries are cached on disk under a name derived from a hash of
+everything that goes into them (placement, attendance totals, weekly logs
+and evaluations), so an unchanged summary is never rendered twice and any
+change to the data produces a new file. Department packs render the missing
+summaries in a process pool and stream them out as a ZIP one file at a time.
+"""
+
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+# Bump when the layout changes so cached files are re-rendered
+TEMPLATE_VERSION = 1
+CHUNK_SIZE = 64 * 1024
+
+def _plain(value):
+    # Dates and timestamps come back as objects under PARSE_DECLTYPES
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+# Every query walks the selected placements in the same order, so a summary
+# is assembled by reading each result set in step rather than per placement
+SUMMARY_ORDER = 's.level, s.student_id, ip.id'
+
+PLACEMENTS_QUERY = '''SELECT ip.*, s.student_id AS student_number, s.level,
+                             s.department AS student_department, s.matriculation_number,
+                             u.full_name AS student_name, u.email AS student_email
+                      FROM internship_placements ip
+                      JOIN students s ON ip.student_id = s.id
+                      JOIN users u ON s.user_id = u.id
+                      WHERE {where}
+                      ORDER BY {order}'''
+
+ATTENDANCE_QUERY = '''SELECT ip.id, sa.days_present, sa.days_absent, sa.days_late,
+                             sa.days_excused, sa.total_days
+                      FROM internship_placements ip
+                      JOIN students s ON ip.student_id = s.id
+                      JOIN attendance_summary sa
+                           ON sa.student_id = ip.student_id AND sa.placement_id = ip.id
+                      WHERE {where}
+                      ORDER BY {order}'''
+
+LOGS_QUERY = '''SELECT ip.id, wl.week_number, wl.week_start_date, wl.week_end_date,
+                       wl.activities, wl.skills_learned, wl.challenges,
+                       wl.supervisor_comment, wl.hod_comment, wl.status
+                FROM weekly_logs wl
+                JOIN internship_placements ip ON wl.placement_id = ip.id
+                JOIN students s ON ip.student_id = s.id
+                WHERE {where}
+                ORDER BY {order}, wl.week_number'''
+
+EVALUATIONS_QUERY = '''SELECT ip.id, e.evaluator_type, u.full_name AS evaluator_name,
+                              e.punctuality, e.communication, e.professionalism,
+                              e.technical_skills, e.initiative, e.overall_rating,
+                              e.comments, e.recommendation, e.evaluated_at
+                       FROM evaluations e
+                       JOIN users u ON e.evaluator_id = u.id
+                       JOIN internship_placements ip ON e.placement_id = ip.id
+                       JOIN students s ON ip.student_id = s.id
+                       WHERE {where}
+                       ORDER BY {order}, e.evaluated_at, e.id'''
+
+class _Rows:
+    """Ordered result set read one placement's rows at a time"""
+    
+    def __init__(self, conn, query, params):
+        self._cursor = conn.execute(query, params)
+        self._next = self._cursor.fetchone()
+    
+    def take(self, placement_id):
+        rows = []
+        while self._next is not None and self._next[0] == placement_id:
+            row = dict(self._next)
+            del row['id']
+            rows.append(row)
+            self._next = self._cursor.fetchone()
+        return rows
+
+def summaries(conn, where, params):
+    """Yield (placement_id, data) for the placements matching where, lazily
+    
+    Four queries cover the whole selection however many placements it has,
+    and only the summary being yielded is held in memory.
+    """
+    def run(query):
+        return _Rows(conn, query.format(where=where, order=SUMMARY_ORDER), params)
+    
+    # Each statement would otherwise read its own snapshot, and a write
+    # committed between them could pair logs with stale totals
+    began = not conn.in_transaction
+    if began:
+        conn.execute('BEGIN')
+    try:
+        attendance = run(ATTENDANCE_QUERY)
+        logs = run(LOGS_QUERY)
+        evaluations = run(EVALUATIONS_QUERY)
+        placements = conn.execute(PLACEMENTS_QUERY.format(where=where, order=SUMMARY_ORDER),
+                                  params)
+        for placement in placements:
+            placement_id = placement['id']
+            totals = attendance.take(placement_id)
+            data = {
+                'placement': dict(placement),
+                'attendance': totals[0] if totals else {},
+                'logs': logs.take(placement_id),
+                'evaluations': evaluations.take(placement_id)
+            }
+            yield placement_id, json.loads(json.dumps(data, default=_plain))
+    finally:
+        if began and conn.in_transaction:
+            conn.commit()
+
+def _selection(placement_id=None, department=None, student_id=None, status=None):
+    clauses, params = [], []
+    for column, value in (('ip.id', placement_id), ('s.department', department),
+                          ('ip.student_id', student_id), ('ip.status', status)):
+        if value is not None:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    return ' AND '.join(clauses) or '1', params
+
+def summary_data(conn, placement_id, department=None, student_id=None):
+    """Collect everything shown on a placement's summary as plain data
+    
+    department and student_id restrict the lookup to placements the caller
+    may see; anything else is reported as missing.
+    """
+    where, params = _selection(placement_id, department, student_id)
+    for _, data in summaries(conn, where, params):
+        return data
+    return None
+
+def content_hash(data):
+    """Stable hash of a summary's data and the template version"""
+    payload = json.dumps([TEMPLATE_VERSION, data], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def cache_path(cache_dir, placement_id, digest):
+    return os.path.join(cache_dir, f'summary-{placement_id}-{digest[:32]}.pdf')
+
+def render_summary(data, path):
+    """Render one summary PDF to path (safe to run in a worker process)"""
+    # ReportLab is only needed here, import it on first use
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    
+    styles = getSampleStyleSheet()
+    placement = data['placement']
+    attendance = data['attendance']
+    
+    def para(text, style='BodyText'):
+        return Paragraph(escape(str(text or '')).replace('\n', '<br/>'), styles[style])
+    
+    story = [
+        para('Internship Summary', 'Title'),
+        para(f"{placement['student_name']} ({placement['student_number']}), "
+             f"{placement['student_department']}, {placement['level']} level"),
+        para(f"{placement['organization_name']}, {placement['organization_address']}"),
+        para(f"Supervisor: {placement['supervisor_name']} ({placement['supervisor_email']})"),
+        para(f"Period: {placement['start_date']} to {placement['end_date']} "
+             f"({placement['status']})"),
+        Spacer(1, 0.5 * cm),
+        para('Attendance', 'Heading2')
+    ]
+    
+    attendance_table = Table([
+        ['Present', 'Absent', 'Late', 'Excused', 'Total'],
+        [attendance.get('days_present', 0), attendance.get('days_absent', 0),
+         attendance.get('days_late', 0), attendance.get('days_excused', 0),
+         attendance.get('total_days', 0)]
+    ])
+    attendance_table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey)
+    ]))
+    story.append(attendance_table)
+    
+    story.append(para('Weekly Logs', 'Heading2'))
+    for log in data['logs']:
+        story.append(para(f"Week {log['week_number']} ({log['week_start_date']} to "
+                          f"{log['week_end_date']}), {log['status']}", 'Heading4'))
+        story.append(para(log['activities']))
+        if log['skills_learned']:
+            story.append(para(f"Skills learned: {log['skills_learned']}"))
+        if log['challenges']:
+            story.append(para(f"Challenges: {log['challenges']}"))
+        if log['supervisor_comment']:
+            story.append(para(f"Supervisor: {log['supervisor_comment']}"))
+        if log['hod_comment']:
+            story.append(para(f"HOD: {log['hod_comment']}"))
+    
+    story.append(para('Evaluations', 'Heading2'))
+    for evaluation in data['evaluations']:
+        story.append(para(f"{evaluation['evaluator_name']} ({evaluation['evaluator_type']}), "
+                          f"overall {evaluation['overall_rating']}/5", 'Heading4'))
+        story.append(para(
+            f"Punctuality {evaluation['punctuality']}, communication "
+            f"{evaluation['communication']}, professionalism {evaluation['professionalism']}, "
+            f"technical skills {evaluation['technical_skills']}, initiative "
+            f"{evaluation['initiative']}"
+        ))
+        if evaluation['comments']:
+            story.append(para(evaluation['comments']))
+    
+    # Write next to the target and rename so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        SimpleDocTemplate(tmp_path, pagesize=A4,
+                          title=f"Internship summary {placement['student_number']}").build(story)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+def _prune(cache_dir, placement_id, keep):
+    """Remove stale renders of a placement"""
+    for old in glob.glob(os.path.join(cache_dir, f'summary-{placement_id}-*.pdf')):
+        if old != keep:
+            try:
+                os.unlink(old)
+            except OSError:
+                pass
+
+def get_summary_pdf(conn, placement_id, cache_dir, department=None, student_id=None):
+    """Return the path of a placement's summary PDF, rendering only if changed"""
+    data = summary_data(conn, placement_id, department, student_id)
+    if data is None:
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(cache_dir, placement_id, content_hash(data))
+    if not os.path.exists(path):
+        render_summary(data, path)
+        _prune(cache_dir, placement_id, path)
+    return path
+
+class _ZipStream:
+    """Write-only sink that lets zipfile produce output incrementally"""
+    
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self._offset
+    
+    def flush(self):
+        pass
+    
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def department_pdfs(conn, department, cache_dir, status=None):
+    """Yield (archive name, cached path, data) for a department's placements
+    
+    Entries are produced as the ZIP is written, so the department is never
+    held in memory at once; conn must stay open until the stream ends.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    where, params = _selection(department=department, status=status)
+    for placement_id, data in summaries(conn, where, params):
+        path = cache_path(cache_dir, placement_id, content_hash(data))
+        number = data['placement']['student_number'].replace('/', '-')
+        yield f'{number}-placement-{placement_id}.pdf', path, data
+
+def _render_pool(workers):
+    """Process pool whose workers do not inherit this process's state
+    
+    Forking a threaded server process copies its locks mid-use and its open
+    SQLite handles, so workers come from a fork server (or are spawned
+    where there is none).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+def stream_zip(entries, workers=None):
+    """Yield a ZIP of the given summaries, rendering cache misses in parallel
+    
+    Entries are consumed a few renders ahead of the one being written, so
+    workers stay busy without the whole list being materialized. Only one
+    PDF chunk is held in memory at a time; members are stored uncompressed
+    because PDF content is already compressed.
+    """
+    ahead = 2 * (workers or os.cpu_count() or 1)
+    entries = iter(entries)
+    queue = deque()
+    sink = _ZipStream()
+    # Started on the first cache miss, so fully cached packs spawn no workers
+    pool = None
+    
+    def fill():
+        nonlocal pool
+        for name, path, data in entries:
+            render = None
+            if not os.path.exists(path):
+                if pool is None:
+                    pool = _render_pool(workers)
+                render = pool.submit(render_summary, data, path)
+            queue.append((name, path, render))
+            if len(queue) >= ahead:
+                break
+    
+    try:
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+            fill()
+            while queue:
+                name, path, render = queue.popleft()
+                if render is not None:
+                    render.result()
+                with archive.open(name, 'w') as member, open(path, 'rb') as f:
+                    while True:
+                        chunk = f.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        member.write(chunk)
+                        yield sink.take()
+                fill()
+            # The central directory is written on close
+        yield sink.take()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
\ No newline at end of file
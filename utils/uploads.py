@@ -0,0 +1,298 @@
+"""
+Upload storage
+
+Uploads are streamed to a temporary file in chunks while being hashed and
+then stored under their sha256 (<folder>/ab/cd/<sha256>.<ext>), so the same
+photo uploaded by several students, or several times, is kept once on disk.
+file_uploads.file_path holds the path relative to UPLOAD_FOLDER. Workspace
+photos get a thumbnail and a web-size JPEG rendered next to the original on
+a background thread pool.
+"""
+
+import atexit
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from flask import Response, current_app, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.local import LocalProxy
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+TYPE_FOLDERS = {
+    'workflow_chart': 'WORKFLOW_CHARTS_PATH',
+    'workspace_photo': 'WORKSPACE_PHOTOS_PATH',
+    'document': 'DOCUMENTS_PATH',
+    'completion_letter': 'DOCUMENTS_PATH'
+}
+RENDITION_TYPES = {'workspace_photo'}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+TMP_PREFIX = '.upload-'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_CONTENT_NAME = re.compile(r'[0-9a-f]{64}(?:_(?:thumb|web))?')
+
+StoredFile = namedtuple('StoredFile', 'file_path file_name sha256 size deduplicated')
+
+class UploadError(ValueError):
+    """Raised for uploads that cannot be stored"""
+
+def file_extension(filename):
+    filename = secure_filename(filename or '')
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def content_path(folder, digest, extension):
+    """Sharded content-addressed path for a hash"""
+    return os.path.join(folder, digest[:2], digest[2:4], f'{digest}.{extension}')
+
+def rendition_path(path, size):
+    """Path of a rendition ('thumb' or 'web') of a stored image"""
+    return f'{os.path.splitext(path)[0]}_{size}.jpg'
+
+def save_upload(storage, file_type, config):
+    """Stream a werkzeug FileStorage to content-addressed storage
+    
+    Returns a StoredFile; file_path is relative to UPLOAD_FOLDER and ready
+    to be recorded in file_uploads.
+    """
+    if file_type not in TYPE_FOLDERS:
+        raise UploadError(f'Unknown file type: {file_type}')
+    extension = file_extension(storage.filename)
+    if extension not in config['ALLOWED_EXTENSIONS']:
+        raise UploadError('File type not allowed')
+    if file_type in RENDITION_TYPES and extension not in IMAGE_EXTENSIONS:
+        raise UploadError('Workspace photos must be images')
+    
+    folder = config[TYPE_FOLDERS[file_type]]
+    os.makedirs(folder, exist_ok=True)
+    chunk_size = config.get('UPLOAD_CHUNK_SIZE', 64 * 1024)
+    limit = config.get('MAX_CONTENT_LENGTH')
+    
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(prefix=TMP_PREFIX, dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = storage.stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if limit and size > limit:
+                    raise UploadError('File is too large')
+                digest.update(chunk)
+                f.write(chunk)
+        if not size:
+            raise UploadError('File is empty')
+        
+        digest = digest.hexdigest()
+        path = content_path(folder, digest, extension)
+        deduplicated = os.path.exists(path)
+        if deduplicated:
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    
+    if file_type in RENDITION_TYPES:
+        renditions.submit(path)
+    
+    return StoredFile(
+        file_path=os.path.relpath(path, config['UPLOAD_FOLDER']).replace(os.sep, '/'),
+        file_name=secure_filename(storage.filename),
+        sha256=digest,
+        size=size,
+        deduplicated=deduplicated
+    )
+
+def gallery_path(file_path, size='thumb', upload_folder=None):
+    """Path (relative to UPLOAD_FOLDER) to show in a gallery
+    
+    Falls back to the original while the rendition is still being made.
+    """
+    candidate = rendition_path(file_path, size)
+    if upload_folder is None or os.path.exists(os.path.join(upload_folder, candidate)):
+        return candidate
+    return file_path
+
+def content_tag(file_path):
+    """Strong ETag value for a content-addressed file (or its renditions), else None"""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return stem if _CONTENT_NAME.fullmatch(stem) else None
+
+def send_upload(file_path, config, download_name=None, immutable=False):
+    """Response for a stored file; file_path is relative to UPLOAD_FOLDER
+    
+    The body is handed off rather than read through Python: to nginx with
+    X-Accel-Redirect when UPLOAD_ACCEL_REDIRECT names the internal location
+    mapped to UPLOAD_FOLDER, to the front server with X-Sendfile when
+    USE_X_SENDFILE is set, and otherwise through wsgi.file_wrapper, which
+    gunicorn sends with os.sendfile(). send_file answers conditional
+    requests with 304 and serves byte ranges. immutable lets clients cache
+    the response for a year; only pass it for URLs naming the content hash.
+    """
+    path = safe_join(config['UPLOAD_FOLDER'], file_path)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    
+    accel = config.get('UPLOAD_ACCEL_REDIRECT')
+    if accel:
+        # nginx adds its own ETag, Last-Modified and Range handling
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = accel.rstrip('/') + '/' + quote(file_path)
+        if download_name:
+            response.headers.set('Content-Disposition', 'inline', filename=download_name)
+    else:
+        tag = content_tag(file_path)
+        response = send_file(path, download_name=download_name, conditional=True,
+                             etag=tag if tag is not None else True)
+    
+    # Uploads are access-controlled, so shared caches must not keep them
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+    return response
+
+class RenditionWorker:
+    """Background thread pool that renders image thumbnails"""
+    
+    def __init__(self, app=None):
+        self.workers = 1
+        self.sizes = {'thumb': (320, 320), 'web': (1600, 1600)}
+        self.quality = 80
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.failed = 0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.workers = app.config.get('UPLOAD_RENDITION_WORKERS', 1)
+        self.sizes = {
+            'thumb': app.config.get('THUMBNAIL_SIZE', (320, 320)),
+            'web': app.config.get('WEB_IMAGE_SIZE', (1600, 1600))
+        }
+        self.quality = app.config.get('RENDITION_QUALITY', 80)
+        app.extensions['renditions'] = self
+        atexit.register(self.shutdown)
+    
+    def _pool(self):
+        # Created lazily, and again in a forked worker
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='renditions'
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+    
+    def submit(self, path):
+        """Queue rendition of an image unless it already has them"""
+        if all(os.path.exists(rendition_path(path, size)) for size in self.sizes):
+            return None
+        return self._pool().submit(self.render, path)
+    
+    def render(self, path):
+        """Write the missing renditions of one image"""
+        from PIL import Image, ImageOps
+        
+        try:
+            for size, box in sorted(self.sizes.items(), key=lambda item: -item[1][0]):
+                target = rendition_path(path, size)
+                if os.path.exists(target):
+                    continue
+                with Image.open(path) as image:
+                    # Let the JPEG decoder scale down while decoding
+                    image.draft('RGB', box)
+                    image = ImageOps.exif_transpose(image)
+                    if image.mode != 'RGB':
+                        image = image.convert('RGB')
+                    image.thumbnail(box, Image.LANCZOS)
+                    fd, tmp_path = tempfile.mkstemp(prefix=TMP_PREFIX,
+                                                    dir=os.path.dirname(path))
+                    with os.fdopen(fd, 'wb') as f:
+                        image.save(f, 'JPEG', quality=self.quality,
+                                   optimize=True, progressive=True)
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, target)
+            self.rendered += 1
+        except Exception:
+            self.failed += 1
+            logger.exception('Failed to render %s', path)
+    
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+        self._executor = None
+    
+    def stats(self):
+        return {'workers': self.workers, 'rendered': self.rendered, 'failed': self.failed}
+
+# The current app's worker (create_app() makes one per app)
+renditions = LocalProxy(lambda: current_app.extensions['renditions'])
+
+def reconcile(conn, config, min_age=3600, table='file_uploads'):
+    """Compare files on disk with file_uploads
+    
+    Returns (orphans, missing): absolute paths of stored files (and their
+    renditions) no row refers to, and file_path values whose file is gone.
+    Files younger than min_age seconds are skipped so uploads whose row is
+    not committed yet are not reported. table may name a view that also
+    covers archived years.
+    """
+    upload_folder = config['UPLOAD_FOLDER']
+    referenced = set()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT DISTINCT file_path FROM {table}')
+    for row in cursor:
+        path = row[0]
+        if not os.path.isabs(path):
+            path = os.path.join(upload_folder, path)
+        referenced.add(os.path.normpath(path))
+    
+    keep = set(referenced)
+    for path in referenced:
+        keep.update(os.path.normpath(rendition_path(path, size)) for size in renditions.sizes)
+    
+    cutoff = time.time() - min_age
+    orphans = []
+    folders = {config[name] for name in set(TYPE_FOLDERS.values())}
+    for folder in sorted(folders):
+        for root, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.normpath(os.path.join(root, name))
+                if path in keep:
+                    continue
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                except OSError:
+                    continue
+                orphans.append(path)
+    
+    missing = sorted(os.path.relpath(path, upload_folder)
+                     for path in referenced if not os.path.exists(path))
+    return sorted(orphans), missing
\ No newline at end of file
@@ -0,0 +1,11 @@
+"""
+WSGI entry point
+
+The application gunicorn serves (gunicorn wsgi:app). Importing app.py no
+longer builds one, so tests and scripts can call create_app() with their
+own config.
+"""
+
+from app import create_app
+
+app = create_app()